@@ -1,7 +1,15 @@
-import pyvisa as visa
+try:
+    import pyvisa as visa
+    from pyvisa import VisaIOError
+except ImportError:
+    import devices.electrometer_simulator as visa
+    from devices.electrometer_simulator import VisaIOError
 from parameters import Parameters
-from pyvisa import VisaIOError
+from devices.electrometer_simulator import SimulatedResourceManager
 import time
+import math
+import numpy
+from devices.session_arbiter import SessionArbiter, arbitrated
 
 
 class InterlockError(Exception):
@@ -23,7 +31,13 @@ class ElectrometerControl:
     get_idn_response()      Returns the electrometer idn response (system information and identification)
     get_voltage()           Reads the voltage of the internal voltage source in V
     set_voltage()           Set the voltage of the internal voltage source in V
-    get_current()           Reads the current in A
+    get_current()           Reads the current in A (trigger and fetch, completion detected via status byte)
+    trigger_current()       Starts a current measurement (returns immediately)
+    is_current_ready()      Returns if the triggered current measurement is completed (status byte poll)
+    fetch_current()         Waits for the triggered current measurement and returns the current in A
+    abort_current()         Aborts the triggered current measurement
+    get_all_values()        Reads current, temperature, source voltage and interlock state (one exchange)
+    fetch_all_values()      Like get_all_values(), but for a triggered current measurement (see trigger_current())
     get_temperature()       Reads the temperature in °C
     get_interlock_state()   Reads the current state of the interlock (True/False)
     enable_source_output()  Enables the source output (internal relay)
@@ -31,11 +45,43 @@ class ElectrometerControl:
     enable_current_input()  Enables the ammeter (internal relay)
     disable_current_input() Disables the ammeter (i.e. internally connected to gnd)
     set_voltage_range()     Sets the voltage output range to -1 kV or to + 1 kV
-    set_speed()             Sets the measurement speed ('quick', 'normal', 'stable')
+    set_speed()             Sets the measurement speed ('quick', 'normal', 'stable', 'adaptive')
+    set_aperture()          Sets a fixed aperture time in s
+    select_aperture()       Returns the shortest aperture meeting the noise target for a given current
+    update_adaptive_aperture()  Updates the aperture based on the measured current (speed 'adaptive' only)
+    get_sample_rate()       Returns the effective sample rate of the last measurement in Hz
+    set_filter()            Sets the instrument filters (averaging count and mode, median rank)
+    get_filter_description()    Returns the active filter settings as short string (e.g. for logging)
     set_range()             Sets the current measurement range
+    set_autorange_limits()  Sets the lower and upper limit of the hardware auto range
+    get_range_changes()     Returns the recorded range changes with their latency
+    start_buffered_acquisition()    Starts a hardware timed acquisition (trigger timer) into the trace buffer
+    fetch_buffered_block()          Returns the new readings of the trace buffer with instrument timestamps
+    stop_buffered_acquisition()     Aborts the buffered acquisition and restores the single measurement trigger
+    start_list_sweep()              Uploads a voltage profile (source list) and starts it with a synchronized acquisition
+    get_list_sweep_timing()         Returns the step times of a list sweep read back from the recorded source voltages
+    abort_list_sweep()              Aborts the list sweep and sets the source back to fixed mode (0 V)
+    set_data_format()               Sets the transfer format of multi-value fetches ('ascii' or 'binary')
+    parse_ieee_block()              Decodes an IEEE 488.2 definite length block (REAL,64) to a numpy array
     close_connection()      Closes the usb connection and resets the state variables
+
+    All methods accessing the session are serialized by the session arbiter (self.arbiter). Use
+    'with electrometer.arbiter.transaction(priority):' to execute a sequence of short commands without interruption by
+    other threads. Never hold a transaction while a measurement is converting: trigger_current() and fetch_current()
+    are separate short transactions and the session is released during the aperture time (e.g. for safety actions).
     """
 
+    # upper limit in A of the measurement ranges (index is the range number, 0 is auto)
+    RANGE_VALUES = [None, '2E-12', '2E-11', '2E-10', '2E-9', '2E-8', '2E-7', '2E-6', '2E-5', '2E-4', '2E-3', '2E-2']
+
+    # measurement settings (range, aperture, filter) which are skipped by _write_settings() if they match the shadow.
+    # All other commands (output, input, source voltage) are always sent, the instrument state may differ from the
+    # shadow (e.g. front panel operation or interlock trip) and safety commands must never be dropped.
+    COALESCED_HEADERS = [':SENS:CURR:RANG:AUTO', ':SENS:CURR:RANG:UPP', ':SENS:CURR:RANG:AUTO:LLIM',
+                         ':SENS:CURR:RANG:AUTO:ULIM', ':SENS:CURR:APER:AUTO', ':SENS:CURR:APER:AUTO:MODE',
+                         ':SENS:CURR:APER', ':SENS:CURR:AVER:COUN', ':SENS:CURR:AVER:TCON', ':SENS:CURR:AVER:STAT',
+                         ':SENS:CURR:MED:RANK', ':SENS:CURR:MED:STAT']
+
     def __init__(self):
         """ Constructor of the class ElectrometerControl with initialization of class vars.
 
@@ -44,6 +90,9 @@ class ElectrometerControl:
         # electrometer session (default: None. If connected: electrometer session instance)
         self.session = None
 
+        # arbiter serializing the session access of several threads (safety, measurement, gui status priority)
+        self.arbiter = SessionArbiter()
+
         # electrometer connection state (default: None, connection_error: False, connected: True)
         self.connection_state = False
 
@@ -60,15 +109,52 @@ class ElectrometerControl:
         self.range = 0
         self.range_mode = 'auto'
 
-        # measurement speed variable, default must be 'normal'. options are ('quick', 'normal', 'stable')
+        # hardware auto range limits [lower, upper] (range numbers) and recorded range changes (see set_range())
+        self.autorange_limits = [1, 11]
+        self.range_changes = []
+
+        # measurement speed variable, default must be 'normal'. options are ('quick', 'normal', 'stable', 'adaptive')
         self.speed = 'normal'
 
+        # fixed aperture time in s (None if the aperture is set automatically by the speed presets)
+        self.aperture = None
+
+        # instrument filter settings (averaging count 1 and median rank 0 means disabled)
+        self.filter_settings = {'average_count': 1, 'average_mode': 'repeat', 'median_rank': 0}
+
+        # time.perf_counter() of the last trigger and duration from trigger to completion of the last measurement
+        self.trigger_time = None
+        self.conversion_time = None
+
         # store previous voltage
         self.previous_voltage = 0
 
+        # flag for a triggered current measurement which is not fetched yet
+        self.trigger_pending = False
+
+        # time.perf_counter() of the last successful response (used to skip redundant connection checks)
+        self.last_response_time = 0
+
+        # shadow of the instrument settings {scpi header: value} written by this class, cleared on (re)connect
+        self.shadow = {}
+
+        # buffered acquisition: number of readings, index of the next reading to fetch, host time.time() at start
+        self.buffered_count = 0
+        self.buffered_index = 0
+        self.buffered_start_time = None
+        self.buffered_elements = 2
+
+        # list sweep: source voltage of each list point and step interval in s
+        self.sweep_voltages = []
+        self.sweep_interval = None
+
+        # transfer format of multi-value fetches: 'ascii' or 'binary' (REAL,64)
+        self.data_format = Parameters.EM_DATA_FORMAT
+
         # Try to connect
         self.connect()
 
+    @arbitrated(SessionArbiter.PRIORITY_MEASUREMENT)
     def connect(self):
         """ Function used for connecting to Keysight electrometer with address specified in Parameters class.
 
@@ -83,8 +169,11 @@ class ElectrometerControl:
 
         # setup a connection
         try:
-            # create a connection (session) to the instrument
-            self.rm = visa.ResourceManager()
+            # create a connection (session) to the instrument (or to the simulation for addresses 'SIM::...')
+            if Parameters.KEYSIGHT_VISA_ADDRESS.startswith("SIM::"):
+                self.rm = SimulatedResourceManager(Parameters.EM_SIMULATION_TIME_SCALE)
+            else:
+                self.rm = visa.ResourceManager()
             self.session = self.rm.open_resource(Parameters.KEYSIGHT_VISA_ADDRESS)
         except visa.Error:
             if Parameters.DEBUG:
@@ -96,10 +185,29 @@ class ElectrometerControl:
                 print("Successful! Created visa session.")
                 print(self.get_idn_response())
             self.connection_state = True
-            return True
+            self.trigger_pending = False
+            self.shadow = {}
+
+        # enable operation complete bit (*OPC) in the status byte (event summary bit) for completion detection
+        try:
+            self.session.write('*CLS;*ESE 1')
+        except visa.Error:
+            self.connection_state = False
+            self.close_connection()
+            return False
+
+        return True
 
     def check_connection(self):
         """ This method checks if the connection is still alive and if not, a reconnection attempt is made.
+        Concurrent checks of several threads are coalesced to a single query (gui status priority).
+
+        :return: False if connection is not alive, True otherwise
+        """
+        return self.arbiter.coalesce('check_connection', SessionArbiter.PRIORITY_GUI, self._check_connection)
+
+    def _check_connection(self):
+        """ Connection check executed by check_connection().
 
         :return: False if connection is not alive, True otherwise
         """
@@ -108,16 +216,31 @@ class ElectrometerControl:
         if not self.connection_state:
             return False
 
+        # skip the check if the instrument responded recently (e.g. during a measurement)
+        if time.perf_counter() - self.last_response_time < Parameters.EM_CONNECTION_CHECK_INTERVAL:
+            return True
+
         # try to ask if the usb connection is enabled. If an error occurs, the connection is down.
+        # The response is always read, otherwise it would remain in the output queue and be read by the next query.
         try:
             self.session.write('SYST:COMM:ENAB? USB')
+            response = self.session.read()
         except visa.Error:
             self.connection_state = False
             self.close_connection()
             return False
 
+        # check for a valid response (0 or 1), otherwise the communication is out of sync
+        if response.strip() not in ['0', '1']:
+            if Parameters.DEBUG:
+                print("Function electrometer_control.check_connection: invalid response: ", response)
+            return False
+
+        self.last_response_time = time.perf_counter()
+
         return True
 
+    @arbitrated(SessionArbiter.PRIORITY_GUI)
     def get_idn_response(self):
         """ Returns the electrometer idn response (system information).
 
@@ -139,6 +262,7 @@ class ElectrometerControl:
 
         return idn
 
+    @arbitrated(SessionArbiter.PRIORITY_MEASUREMENT)
     def get_voltage(self):
         """ Reads the voltage of the internal voltage source in V.
 
@@ -161,9 +285,12 @@ class ElectrometerControl:
 
         return voltage
 
+    @arbitrated(SessionArbiter.PRIORITY_SAFETY)
     def set_voltage(self, voltage):
         """
         Sets the voltage of the internal voltage source immediately.
+        If the polarity changes, the output is disabled while the voltage output range is switched. All commands are
+        sent with one coalesced write. The voltage is always sent, even if it equals the previously set voltage.
 
         :param voltage: Voltage to set
         :exception ValueError: If voltage is out of range (<0 V or > 1000 V)
@@ -181,23 +308,23 @@ class ElectrometerControl:
             raise ValueError
 
         # set voltage output range (electrometer parameter) to - 1 kV or + 1 kV respectively
-        if self.previous_voltage < 5 and voltage >= 0:
-            self.disable_source_output()
-            time.sleep(0.1)
-            self.set_voltage_range(1)
-            time.sleep(0.1)
-            self.enable_source_output()
-        elif self.previous_voltage > -5 and voltage < 0:
-            self.disable_source_output()
-            time.sleep(0.1)
-            self.set_voltage_range(-1)
-            time.sleep(0.1)
-            self.enable_source_output()
+        if voltage >= 0:
+            volt_range = 'MAX'
+        else:
+            volt_range = 'MIN'
+
+        settings = []
+        if self.shadow.get(':SOUR:VOLT:RANG') != volt_range:
+            settings += [[':OUTP:STAT', 'OFF'], [':SOUR:VOLT:RANG', volt_range], [':OUTP:STAT', 'ON']]
+            self.ampmeter_state = False
 
         # set given voltage
+        settings.append([':SOUR:VOLT', str(voltage)])
+
+        # try to check the interlock and write the settings
         try:
-            query = str(':SOUR:VOLT ' + str(voltage))
-            self.session.write(query)
+            self._check_interlock(voltage)
+            self._write_settings(settings)
             self.user_voltage = voltage
         except visa.Error:
             self.connection_state = False
@@ -207,7 +334,8 @@ class ElectrometerControl:
         self.previous_voltage = voltage
 
     def get_current(self):
-        """ Read and return measured current in A.
+        """ Read and return measured current in A. The measurement is triggered and fetched as soon as it is completed,
+        i.e. the duration depends on the configured aperture (speed) only.
 
         :return: current in A
         """
@@ -225,9 +353,15 @@ class ElectrometerControl:
         # This helps to keep the gui responsive when a communication error occurs. Don't change!
         while i < 2:
             try:
-                self.session.write('MEAS:CURR:DC?')
-                time.sleep(0.5)
-                result = self.session.read()
+                with self.arbiter.transaction(SessionArbiter.PRIORITY_MEASUREMENT):
+                    self._trigger()
+                if not self._poll_ready(Parameters.EM_FETCH_TIMEOUT):
+                    self.abort_current()
+                    raise VisaIOError(visa.constants.StatusCode.error_timeout)
+                with self.arbiter.transaction(SessionArbiter.PRIORITY_MEASUREMENT):
+                    if not self.connection_state:
+                        return False
+                    result = self._fetch(0)
                 break
             except VisaIOError:
                 i += 1
@@ -236,6 +370,279 @@ class ElectrometerControl:
 
         return result
 
+    @arbitrated(SessionArbiter.PRIORITY_MEASUREMENT)
+    def trigger_current(self):
+        """ Starts a current measurement and returns immediately. Use fetch_current() to collect the result.
+        This allows doing other work (e.g. labjack reads) while the electrometer integrates.
+
+        :return: True if the measurement was triggered, False if an error occurred
+        """
+
+        # check if connection is alive. If not, try to connect.
+        if not self.connection_state:
+            if not self.connect():
+                return False
+
+        # try to trigger the measurement
+        try:
+            self._trigger()
+        except visa.Error:
+            self.connection_state = False
+            self.close_connection()
+            return False
+
+        return True
+
+    @arbitrated(SessionArbiter.PRIORITY_MEASUREMENT)
+    def is_current_ready(self):
+        """ Returns if the triggered current measurement is completed (operation complete, status byte poll).
+
+        :return: True if completed, False otherwise
+        """
+
+        # check if connection is alive
+        if not self.connection_state:
+            return False
+
+        # try to read the status byte
+        try:
+            return self._is_ready()
+        except visa.Error:
+            self.connection_state = False
+            self.close_connection()
+            return False
+
+    def fetch_current(self, timeout=None):
+        """ Waits until the triggered current measurement is completed and returns the current in A.
+        If no measurement was triggered, a new measurement is triggered first. The session is not held while waiting,
+        the measurement is aborted if it is not completed within the timeout.
+
+        :param timeout: maximum waiting time in s (including the trigger), default Parameters.EM_FETCH_TIMEOUT
+        :return: current in A, False if an error or timeout occurred
+        """
+
+        # check if connection is alive. If not, try to connect.
+        if not self.connection_state:
+            if not self.connect():
+                return False
+
+        if timeout is None:
+            timeout = Parameters.EM_FETCH_TIMEOUT
+        t_end = time.perf_counter() + timeout
+
+        # trigger a new measurement if none is pending
+        if not self.trigger_pending:
+            if not self.trigger_current():
+                return False
+
+        # wait for completion without blocking the session for other threads, abort after the timeout
+        if not self._poll_ready(t_end - time.perf_counter()):
+            if Parameters.DEBUG:
+                print("Function electrometer_control.fetch_current: timeout")
+            self.abort_current()
+            return False
+
+        # try to fetch the completed result
+        with self.arbiter.transaction(SessionArbiter.PRIORITY_MEASUREMENT):
+            if not self.connection_state:
+                return False
+            try:
+                return self._fetch(0)
+            except visa.Error:
+                self.connection_state = False
+                self.close_connection()
+                return False
+
+    @arbitrated(SessionArbiter.PRIORITY_SAFETY)
+    def abort_current(self):
+        """ Aborts the triggered current measurement (e.g. after a timeout of the caller).
+
+        :return: True if aborted, False if an error occurred
+        """
+
+        # check if connection is alive
+        if not self.connection_state:
+            return False
+
+        # try to abort the acquisition
+        try:
+            self.session.write(':ABOR:ACQ')
+            self.trigger_pending = False
+        except visa.Error:
+            self.connection_state = False
+            self.close_connection()
+            return False
+
+        return True
+
+    def _trigger(self):
+        """ Clears the status, starts a current measurement and requests the operation complete event.
+
+        :exception VisaIOError: if the communication fails
+        :return: None
+        """
+
+        self.session.write('*CLS;:INIT:ACQ;*OPC')
+        self.trigger_pending = True
+        self.trigger_time = time.perf_counter()
+
+    def _is_ready(self):
+        """ Polls the status byte for the event summary bit (set by *OPC when the acquisition is completed).
+
+        :exception VisaIOError: if the communication fails
+        :return: True if completed, False otherwise
+        """
+        return bool(self.session.read_stb() & 32)
+
+    def _poll_ready(self, timeout):
+        """ Polls the status byte until the triggered measurement is completed. The session is only held during the
+        single polls, i.e. other threads (e.g. safety actions) are not blocked during the aperture time.
+        Communication errors are handled by the subsequent fetch.
+
+        :param timeout: maximum waiting time in s
+        :return: False if the timeout is reached, True otherwise (completed, not pending or communication error)
+        """
+
+        t_end = time.perf_counter() + timeout
+        while self.trigger_pending:
+            with self.arbiter.transaction(SessionArbiter.PRIORITY_MEASUREMENT):
+                try:
+                    if not self.connection_state or self._is_ready():
+                        return True
+                except visa.Error:
+                    return True
+            if time.perf_counter() >= t_end:
+                return False
+            time.sleep(Parameters.EM_POLL_INTERVAL)
+
+        return True
+
+    def _wait_ready(self, timeout):
+        """ Polls the status byte until the triggered measurement is completed.
+
+        :param timeout: maximum waiting time in s
+        :exception VisaIOError: if the communication fails or the timeout is reached
+        :return: None
+        """
+
+        t_end = time.perf_counter() + timeout
+        while not self._is_ready():
+            if time.perf_counter() > t_end:
+                self.trigger_pending = False
+                raise VisaIOError(visa.constants.StatusCode.error_timeout)
+            time.sleep(Parameters.EM_POLL_INTERVAL)
+
+        self.conversion_time = time.perf_counter() - self.trigger_time
+
+    def _fetch(self, timeout):
+        """ Waits for the operation complete event and fetches the current.
+
+        :param timeout: maximum waiting time in s
+        :exception VisaIOError: if the communication fails or the timeout is reached
+        :return: current in A (string)
+        """
+
+        # wait until the measurement is completed
+        self._wait_ready(timeout)
+
+        # fetch result
+        self.session.write(':FETC:CURR?')
+        result = self.session.read()
+        self.trigger_pending = False
+        self.last_response_time = time.perf_counter()
+
+        return result
+
+    def get_all_values(self):
+        """ Triggers a current measurement and reads current, temperature, source voltage and interlock state with
+        a single chained query (one usb turnaround instead of one per value).
+
+        :return: [current in A, temperature in °C, source voltage in V, interlock state (True: closed)],
+                 False if an error occurred
+        """
+
+        # check if connection is alive. If not, try to connect.
+        if not self.connection_state:
+            if not self.connect():
+                return False
+
+        # trigger and read all values (the session is not blocked for other threads during the aperture time)
+        if not self.trigger_current():
+            return False
+
+        return self.fetch_all_values(Parameters.EM_FETCH_TIMEOUT)
+
+    def fetch_all_values(self, timeout=None):
+        """ Waits until the triggered current measurement is completed and reads current, temperature, source voltage
+        and interlock state with a single chained query. If no measurement was triggered, it is triggered first.
+        The session is not held while waiting, the measurement is aborted if it is not completed within the timeout.
+
+        :param timeout: maximum waiting time in s (including the trigger), default Parameters.EM_FETCH_TIMEOUT
+        :return: [current in A, temperature in °C, source voltage in V, interlock state (True: closed)],
+                 False if an error or timeout occurred
+        """
+
+        # check if connection is alive. If not, try to connect.
+        if not self.connection_state:
+            if not self.connect():
+                return False
+
+        if timeout is None:
+            timeout = Parameters.EM_FETCH_TIMEOUT
+        t_end = time.perf_counter() + timeout
+
+        # trigger a new measurement if none is pending
+        if not self.trigger_pending:
+            if not self.trigger_current():
+                return False
+
+        # wait for completion without blocking the session for other threads, abort after the timeout
+        if not self._poll_ready(t_end - time.perf_counter()):
+            if Parameters.DEBUG:
+                print("Function electrometer_control.fetch_all_values: timeout")
+            self.abort_current()
+            return False
+
+        # try to fetch all completed values
+        with self.arbiter.transaction(SessionArbiter.PRIORITY_MEASUREMENT):
+            if not self.connection_state:
+                return False
+            try:
+                return self._fetch_all(0)
+            except visa.Error:
+                self.connection_state = False
+                self.close_connection()
+                return False
+
+    def _fetch_all(self, timeout):
+        """ Waits for the operation complete event and reads all values with one chained query.
+
+        :param timeout: maximum waiting time in s
+        :exception VisaIOError: if the communication fails or the timeout is reached
+        :exception InterlockError: If interlock state result is undefined
+        :return: [current in A, temperature in °C, source voltage in V, interlock state (True: closed)]
+        """
+
+        # wait until the measurement is completed
+        self._wait_ready(timeout)
+
+        # chained query, the responses are separated by ';'
+        self.session.write(':FETC:CURR?;:SYST:TEMP?;:SOUR:VOLT?;:SYST:INT:TRIP?')
+        response = self.session.read().strip().split(';')
+        self.trigger_pending = False
+        self.last_response_time = time.perf_counter()
+
+        # map the interlock result to True (interlock closed) or False (interlock open)
+        if int(response[3]) == 0:
+            interlock_state = True
+        elif int(response[3]) == 1:
+            interlock_state = False
+        else:
+            raise InterlockError
+
+        return [float(response[0]), float(response[1]), float(response[2]), interlock_state]
+
+    @arbitrated(SessionArbiter.PRIORITY_MEASUREMENT)
     def get_temperature(self):
         """ Read the temperature of the K-Sensor in °C.
 
@@ -258,6 +665,7 @@ class ElectrometerControl:
 
         return temp
 
+    @arbitrated(SessionArbiter.PRIORITY_SAFETY)
     def get_interlock_state(self):
         """ Reads the interlock state and returns if open or closed.
 
@@ -287,6 +695,29 @@ class ElectrometerControl:
         else:
             raise InterlockError
 
+    def _check_interlock(self, voltage):
+        """ Checks if the given voltage may be set: voltages > 21 V (absolute value) require a closed interlock.
+        The caller must hold the session arbiter.
+
+        :param voltage: voltage in V which is going to be set
+        :exception VisaIOError: if the communication fails
+        :exception InterlockError: If the voltage is > 21 V and the interlock is open (or the state is undefined)
+        :return: None
+        """
+
+        # low voltages are allowed without interlock
+        if abs(voltage) <= 21:
+            return
+
+        # get interlock state (0: closed, 1: open)
+        self.session.write('SYST:INT:TRIP?')
+        interlock_state = self.session.read()
+        if interlock_state.strip() != '0':
+            if Parameters.DEBUG:
+                print("Function electrometer_control.check_interlock: interlock not closed, voltage ", voltage, " V")
+            raise InterlockError
+
+    @arbitrated(SessionArbiter.PRIORITY_MEASUREMENT)
     def enable_source_output(self):
         """ Enable the voltage source (internal relay).
 
@@ -300,13 +731,13 @@ class ElectrometerControl:
 
         # try to enable the voltage source
         try:
-            query = str(':OUTP:STAT ON')
-            self.session.write(query)
+            self._write_settings([[':OUTP:STAT', 'ON']])
         except visa.Error:
             self.connection_state = False
             self.close_connection()
             return False
 
+    @arbitrated(SessionArbiter.PRIORITY_SAFETY)
     def disable_source_output(self):
         """ Disable the voltage source.
 
@@ -320,13 +751,13 @@ class ElectrometerControl:
 
         # try to disable the voltage source
         try:
-            query = str(':OUTP:STAT OFF')
-            self.session.write(query)
+            self._write_settings([[':OUTP:STAT', 'OFF']])
         except visa.Error:
             self.connection_state = False
             self.close_connection()
             return False
 
+    @arbitrated(SessionArbiter.PRIORITY_MEASUREMENT)
     def enable_current_input(self):
         """ Enables the ammeter input (internal relay).
 
@@ -340,14 +771,14 @@ class ElectrometerControl:
 
         # try to enable the ammeter
         try:
-            query = str('INP:STAT ON')
-            self.session.write(query)
+            self._write_settings([[':INP:STAT', 'ON']])
             self.ampmeter_state = True
         except visa.Error:
             self.connection_state = False
             self.close_connection()
             return False
 
+    @arbitrated(SessionArbiter.PRIORITY_SAFETY)
     def disable_current_input(self):
         """ Disables the ammeter input.
 
@@ -361,14 +792,14 @@ class ElectrometerControl:
 
         # try to disable the amperemter (connect input internally to gnd)
         try:
-            query = str('INP:STAT OFF')
-            self.session.write(query)
+            self._write_settings([[':INP:STAT', 'OFF']])
             self.ampmeter_state = False
         except visa.Error:
             self.connection_state = False
             self.close_connection()
             return False
 
+    @arbitrated(SessionArbiter.PRIORITY_MEASUREMENT)
     def set_voltage_range(self, volt_range):
         """ Set the voltage output range to -1 kV or to +1 kV.
 
@@ -383,26 +814,28 @@ class ElectrometerControl:
                 return False
 
         if volt_range == -1:
-            write = str('SOUR:VOLT:RANG MIN')
+            param = 'MIN'
         elif volt_range == 1:
-            write = str('SOUR:VOLT:RANG MAX')
+            param = 'MAX'
         else:
             raise ValueError
 
         # try to set the voltage range
         try:
-            query = write
-            self.session.write(query)
+            self._write_settings([[':SOUR:VOLT:RANG', param]])
             self.ampmeter_state = False
         except visa.Error:
             self.connection_state = False
             self.close_connection()
             return False
 
+    @arbitrated(SessionArbiter.PRIORITY_MEASUREMENT)
     def set_speed(self, speed):
         """ Method for setting the aperture mode (measurement speed). Choose 'stable' for best resolution.
 
-        :param speed: must be string 'quick', 'normal' or 'stable'
+        'adaptive' uses a fixed aperture which is updated with update_adaptive_aperture() based on the measured current.
+
+        :param speed: must be string 'quick', 'normal', 'stable' or 'adaptive'
         :exception TypeError: If speed is not string
         :exception ValueError: If speed string or not valid
         :return: None
@@ -412,10 +845,17 @@ class ElectrometerControl:
         if not isinstance(speed, str):
             raise TypeError
 
-        speed_strings = ['quick', 'normal', 'stable']
+        speed_strings = ['quick', 'normal', 'stable', 'adaptive']
         if speed not in speed_strings:
             raise ValueError
 
+        # adaptive mode starts with the longest aperture until a current is measured
+        if speed == 'adaptive':
+            if self.set_aperture(Parameters.EM_ADAPTIVE_APERTURES[-1]) is False:
+                return False
+            self.speed = speed
+            return
+
         # prepare parameter for scpi command
         if speed == 'quick':
             param = 'SHOR'
@@ -431,23 +871,186 @@ class ElectrometerControl:
 
         # try to set the speed
         try:
-            query = str('SENS:CURR:APER:AUTO:MODE ' + param)
-            self.session.write(query)
+            self._write_settings([[':SENS:CURR:APER:AUTO', 'ON'], [':SENS:CURR:APER:AUTO:MODE', param]])
             self.speed = speed
+            self.aperture = None
+        except visa.Error:
+            self.connection_state = False
+            self.close_connection()
+            return False
+
+    @arbitrated(SessionArbiter.PRIORITY_MEASUREMENT)
+    def set_aperture(self, aperture):
+        """ Sets a fixed aperture time (integration time) and disables the automatic aperture of the speed presets.
+
+        :param aperture: aperture time in s (8E-6 - 2)
+        :exception ValueError: If aperture is out of range
+        :return: None
+        """
+
+        # check input parameters
+        if aperture < 8e-6 or aperture > 2:
+            raise ValueError
+
+        # check if connection is alive. If not, try to connect.
+        if not self.connection_state:
+            if not self.connect():
+                return False
+
+        # try to set the aperture
+        try:
+            self._write_settings([[':SENS:CURR:APER:AUTO', 'OFF'], [':SENS:CURR:APER', str(aperture)]])
+            self.aperture = aperture
+        except visa.Error:
+            self.connection_state = False
+            self.close_connection()
+            return False
+
+    def select_aperture(self, current):
+        """ Returns the shortest aperture of Parameters.EM_ADAPTIVE_APERTURES which meets the target relative noise
+        (Parameters.EM_ADAPTIVE_NOISE_TARGET) for the given current.
+        Noise model: the rms noise of a range is Parameters.EM_NOISE_RANGE_FRACTION times the range value at the
+        reference aperture (Parameters.EM_NOISE_REFERENCE_APERTURE) and decreases with the square root of the aperture.
+
+        :param current: measured current in A
+        :return: aperture in s
+        """
+
+        # in auto range mode, the smallest range covering the current is used by the instrument
+        if self.range_mode == 'auto' or self.range == 0:
+            range_value = float(self.RANGE_VALUES[-1])
+            for value in self.RANGE_VALUES[1:]:
+                if abs(current) <= float(value):
+                    range_value = float(value)
+                    break
+        else:
+            range_value = float(self.RANGE_VALUES[self.range])
+
+        # shortest aperture meeting the noise target, longest aperture otherwise (e.g. current is 0)
+        noise_reference = Parameters.EM_NOISE_RANGE_FRACTION * range_value
+        for aperture in Parameters.EM_ADAPTIVE_APERTURES:
+            noise = noise_reference * pow(Parameters.EM_NOISE_REFERENCE_APERTURE / aperture, 0.5)
+            if noise <= Parameters.EM_ADAPTIVE_NOISE_TARGET * abs(current):
+                return aperture
+
+        return Parameters.EM_ADAPTIVE_APERTURES[-1]
+
+    def update_adaptive_aperture(self, current):
+        """ Updates the aperture based on the measured current if the speed is 'adaptive' (see select_aperture()).
+        Call this method after every measurement.
+
+        :param current: measured current in A
+        :return: aperture in s, None if the speed is not 'adaptive'
+        """
+
+        if self.speed != 'adaptive':
+            return None
+
+        # only write if the aperture changes
+        aperture = self.select_aperture(current)
+        if aperture != self.aperture:
+            if self.set_aperture(aperture) is False:
+                return None
+            if Parameters.DEBUG:
+                print("Adaptive aperture: ", aperture, " s")
+
+        return aperture
+
+    def get_sample_rate(self):
+        """ Returns the effective sample rate of the last triggered measurement (trigger until completion detected).
+
+        :return: sample rate in Hz, None if no measurement was completed yet
+        """
+
+        if not self.conversion_time:
+            return None
+
+        return 1 / self.conversion_time
+
+    @arbitrated(SessionArbiter.PRIORITY_MEASUREMENT)
+    def set_filter(self, average_count, average_mode='repeat', median_rank=0):
+        """ Sets the instrument filters applied to every reading. The averaging filter averages the given number of
+        conversions, either as moving average ('moving') or as repeating average ('repeat', one reading per count
+        conversions, i.e. the sample rate is divided by the count). The median filter uses 2 * rank + 1 conversions.
+
+        :param average_count: number of averaged conversions (1-100), 1 disables the averaging filter
+        :param average_mode: must be string 'moving' or 'repeat'
+        :param median_rank: rank of the median filter (0-5), 0 disables the median filter
+        :exception TypeError: If average_count or median_rank is not int
+        :exception ValueError: If a parameter is out of range or average_mode is not valid
+        :return: None
+        """
+
+        # check input parameters
+        if not isinstance(average_count, int) or not isinstance(median_rank, int):
+            raise TypeError
+
+        if average_count < 1 or average_count > 100 or median_rank < 0 or median_rank > 5:
+            raise ValueError
+
+        if average_mode == 'moving':
+            mode = 'MOV'
+        elif average_mode == 'repeat':
+            mode = 'REP'
+        else:
+            raise ValueError
+
+        # check if connection is alive. If not, try to connect.
+        if not self.connection_state:
+            if not self.connect():
+                return False
+
+        # prepare settings, count/mode and rank are only written if the filter is enabled
+        settings = []
+        if average_count > 1:
+            settings += [[':SENS:CURR:AVER:COUN', str(average_count)], [':SENS:CURR:AVER:TCON', mode],
+                         [':SENS:CURR:AVER:STAT', 'ON']]
+        else:
+            settings.append([':SENS:CURR:AVER:STAT', 'OFF'])
+        if median_rank > 0:
+            settings += [[':SENS:CURR:MED:RANK', str(median_rank)], [':SENS:CURR:MED:STAT', 'ON']]
+        else:
+            settings.append([':SENS:CURR:MED:STAT', 'OFF'])
+
+        # try to set the filters
+        try:
+            self._write_settings(settings)
+            self.filter_settings = {'average_count': average_count, 'average_mode': average_mode,
+                                    'median_rank': median_rank}
         except visa.Error:
             self.connection_state = False
             self.close_connection()
             return False
 
+    def get_filter_description(self):
+        """ Returns the active filter settings as short string without commas (used in the log files).
+        Examples: 'off', 'avg10rep', 'avg5mov+med2', 'med1'
+
+        :return: filter description
+        """
+
+        description = []
+        if self.filter_settings['average_count'] > 1:
+            description.append('avg' + str(self.filter_settings['average_count'])
+                               + self.filter_settings['average_mode'][:3])
+        if self.filter_settings['median_rank'] > 0:
+            description.append('med' + str(self.filter_settings['median_rank']))
+
+        if len(description) == 0:
+            return 'off'
+
+        return '+'.join(description)
+
+    @arbitrated(SessionArbiter.PRIORITY_MEASUREMENT)
     def set_range(self, range_number):
-        """ Method for setting the measurement range.
+        """ Method for setting the measurement range. The range is set directly by value (no stepping).
         Assignment is as follows:
         range_number:   [  0     1     2      3       4     5      6      7      8      9      10     11 ]
         MAX_Value:      [auto, 2 pA, 20 pA, 200 pA, 2 nA, 20 nA, 200 nA, 2 uA, 20 uA, 200 uA, 2 mA, 20 mA]
 
-        :param range_number: measurement range, must be int 200, string 'quick', 'normal' or 'stable'
-        :exception TypeError: If range is not  is not string
-        :exception ValueError: If speed string or not valid
+        :param range_number: measurement range, int, 0 for auto, 1-11 for 2 pA – 20 mA
+        :exception TypeError: If range_number is not int
+        :exception ValueError: If range_number is out of range (<0 or >11)
         :return: None
         """
 
@@ -467,75 +1070,488 @@ class ElectrometerControl:
             if not self.connect():
                 return False
 
-        # try to set the speed to auto
+        # try to set the range to auto (within the autorange limits, see set_autorange_limits())
         if range_number == 0:
-            try:
-                query = str('SENS:CURR:RANG:AUTO 1')
-                self.session.write(query)
-                self.range_mode = 'auto'
-            except visa.Error:
-                self.connection_state = False
-                self.close_connection()
+            settings = [[':SENS:CURR:RANG:AUTO', 'ON']]
+        # set the range directly by value
+        else:
+            settings = [[':SENS:CURR:RANG:AUTO', 'OFF'], [':SENS:CURR:RANG:UPP', self.RANGE_VALUES[range_number]]]
+
+        try:
+            self._write_range_settings(settings, range_number)
+        except visa.Error:
+            self.connection_state = False
+            self.close_connection()
+            return False
+
+        if range_number == 0:
+            self.range_mode = 'auto'
+            # the range is changed by the instrument in auto mode
+            self.shadow.pop(':SENS:CURR:RANG:UPP', None)
+        else:
+            self.range_mode = 'manual'
+            self.range = range_number
+
+    @arbitrated(SessionArbiter.PRIORITY_MEASUREMENT)
+    def set_autorange_limits(self, lower, upper):
+        """ Sets the lower and upper limit of the hardware auto range (range numbers, see set_range()).
+        In auto mode (range 0), the instrument selects the range within these limits.
+
+        :param lower: lowest range number used by the auto range (1-11)
+        :param upper: highest range number used by the auto range (1-11), must be >= lower
+        :exception TypeError: If lower or upper is not int
+        :exception ValueError: If lower or upper is out of range or lower > upper
+        :return: None
+        """
+
+        # check input parameters
+        if not isinstance(lower, int) or not isinstance(upper, int):
+            raise TypeError
+
+        if lower < 1 or upper > 11 or lower > upper:
+            raise ValueError
+
+        # check if connection is alive. If not, try to connect.
+        if not self.connection_state:
+            if not self.connect():
                 return False
+
+        # try to set the limits and wait for operation complete (no range change, i.e. not recorded)
+        try:
+            if self._write_settings([[':SENS:CURR:RANG:AUTO:LLIM', self.RANGE_VALUES[lower]],
+                                     [':SENS:CURR:RANG:AUTO:ULIM', self.RANGE_VALUES[upper]]]) > 0:
+                self.session.write('*OPC?')
+                self.session.read()
+            self.autorange_limits = [lower, upper]
+        except visa.Error:
+            self.connection_state = False
+            self.close_connection()
+            return False
+
+    def get_range_changes(self):
+        """ Returns the recorded range changes. The latency is measured from sending the range command until the
+        instrument reports operation complete (*OPC?).
+
+        :return: list of dicts {'time': time.time(), 'from': range number, 'to': range number, 'latency': s}
+        """
+        return list(self.range_changes)
+
+    def _write_range_settings(self, settings, range_number):
+        """ Writes range settings, waits until the instrument has completed them and records the latency.
+
+        :param settings: list of [scpi header, value], see _write_settings()
+        :param range_number: new range number (0 for auto)
+        :exception VisaIOError: if the communication fails
+        :return: None
+        """
+
+        t_start = time.perf_counter()
+        if self._write_settings(settings) == 0:
+            return
+
+        # wait for operation complete
+        self.session.write('*OPC?')
+        self.session.read()
+        latency = time.perf_counter() - t_start
+
+        # record range change
+        if self.range_mode == 'auto':
+            previous_range = 0
         else:
-            # detect if mode was auto in the last call, and if so, initialize manual mode range to MAX
-            if self.range_mode == 'auto':
-                try:
-                    query = str('SENS:CURR:RANG:UPP MAX')
-                    self.session.write(query)
-                    self.range = 11
-                    print("reset range to MAX")
-                    self.range_mode = 'manual'
-                except visa.Error:
-                    self.connection_state = False
-                    self.close_connection()
-                    return False
+            previous_range = self.range
+        self.range_changes.append({'time': time.time(), 'from': previous_range, 'to': range_number,
+                                   'latency': latency})
 
-            # disable auto range
-            try:
-                query = str('SENS:CURR:RANG:AUTO 0')
-                self.session.write(query)
-            except visa.Error:
-                self.connection_state = False
-                self.close_connection()
+        if Parameters.DEBUG:
+            print("Range change ", previous_range, " -> ", range_number, ": ", round(latency * 1000, 1), " ms")
+
+    def _write_settings(self, settings):
+        """ Writes the settings with one coalesced write and updates the shadow. Measurement settings (see
+        COALESCED_HEADERS) which match the shadow are skipped, all other settings are always written.
+        The settings are written in the given order, i.e. a header may appear several times (e.g. output off/on).
+
+        :param settings: list of [scpi header, value], e.g. [[':OUTP:STAT', 'ON'], [':SOUR:VOLT', '10']]
+        :exception VisaIOError: if the communication fails
+        :return: number of written settings
+        """
+
+        # collect changed measurement settings and all other settings, the shadow is updated after a successful write
+        shadow = dict(self.shadow)
+        commands = []
+        for header, value in settings:
+            if header not in self.COALESCED_HEADERS or shadow.get(header) != value:
+                commands.append(header + ' ' + value)
+                shadow[header] = value
+
+        if len(commands) > 0:
+            self.session.write(';'.join(commands))
+            self.shadow = shadow
+
+        return len(commands)
+
+    @arbitrated(SessionArbiter.PRIORITY_MEASUREMENT)
+    def start_buffered_acquisition(self, count, interval):
+        """ Starts a hardware timed acquisition. The readings are triggered by the instrument's trigger timer and fed
+        into the trace buffer together with their instrument timestamps. Use fetch_buffered_block() periodically
+        to collect the readings and stop_buffered_acquisition() to abort or after the acquisition is finished.
+
+        :param count: number of readings (1-100000, trace buffer size)
+        :param interval: trigger interval in s (2E-5 - 1E5), must be larger than the aperture time (speed)
+        :exception ValueError: If count or interval is out of range
+        :return: True if started, False if an error occurred
+        """
+
+        # check input parameters
+        if not isinstance(count, int) or count < 1 or count > 100000:
+            raise ValueError
+
+        if interval < 2e-5 or interval > 1e5:
+            raise ValueError
+
+        # check if connection is alive. If not, try to connect.
+        if not self.connection_state:
+            if not self.connect():
                 return False
 
-            if range_number > self.range:
-                # increase range until desired range is reached
-                while range_number > self.range:
-                    try:
-                        query = str('SENS:CURR:RANG:UPP UP')
-                        self.session.write(query)
-                        self.range += 1
-                        time.sleep(0.1)
-                    except visa.Error:
-                        self.connection_state = False
-                        self.close_connection()
-                        return False
+        # try to configure and start the acquisition (current and timestamp of each reading)
+        try:
+            self.session.write(';'.join(self._buffered_queries(count, interval, 'CURR,TIME')))
+            self.session.write(':INIT:ACQ')
+            self.buffered_start_time = time.time()
+        except visa.Error:
+            self.connection_state = False
+            self.close_connection()
+            return False
 
-            elif range_number < self.range:
-                # decrease range until desired range is reached
-                while range_number < self.range:
-                    try:
-                        query = str('SENS:CURR:RANG:UPP DOWN')
-                        self.session.write(query)
-                        self.range -= 1
-                        time.sleep(0.1)
-                    except visa.Error:
-                        self.connection_state = False
-                        self.close_connection()
-                        return False
-            elif range_number == self.range:
-                pass
-            else:
-                raise ValueError
+        self.buffered_count = count
+        self.buffered_index = 0
+        self.buffered_elements = 2
+        self.trigger_pending = False
 
+        return True
+
+    def _buffered_queries(self, count, interval, elements):
+        """ Returns the commands configuring the acquisition trigger timer, the trace buffer and the timestamp reset.
+
+        :param count: number of readings
+        :param interval: trigger interval in s
+        :param elements: data elements of each reading, e.g. 'CURR,TIME'
+        :return: list of scpi commands
+        """
+        return [':TRIG:ACQ:SOUR TIM',
+                ':TRIG:ACQ:TIM ' + str(interval),
+                ':TRIG:ACQ:COUN ' + str(count),
+                ':FORM:ELEM:SENS ' + elements,
+                ':TRAC:FEED:CONT NEV',
+                ':TRAC:CLE',
+                ':TRAC:POIN ' + str(count),
+                ':TRAC:FEED SENS',
+                ':TRAC:FEED:CONT NEXT',
+                ':SYST:TIME:TIM:COUN:RES']
+
+    @arbitrated(SessionArbiter.PRIORITY_MEASUREMENT)
+    def fetch_buffered_block(self, max_size=None):
+        """ Returns all readings which were written to the trace buffer since the last call.
+        The instrument timestamps are in s since the start of the acquisition (see buffered_start_time for the
+        corresponding host time). The acquisition is finished if buffered_index is equal to buffered_count.
+
+        :param max_size: maximum number of readings per call, default Parameters.EM_BUFFER_BLOCK_SIZE
+        :return: [numpy array timestamps in s, numpy array currents in A], during a list sweep additionally the
+                 numpy array source voltages in V, False if an error occurred
+        """
+
+        if max_size is None:
+            max_size = Parameters.EM_BUFFER_BLOCK_SIZE
+
+        # check if connection is alive. If not, try to connect.
+        if not self.connection_state:
+            if not self.connect():
+                return False
+
+        try:
+            # get number of readings in the trace buffer
+            self.session.write(':TRAC:POIN:ACT?')
+            available = int(self.session.read())
+            size = min(available - self.buffered_index, max_size)
+            if size <= 0:
+                return [numpy.zeros(0) for i in range(self.buffered_elements)]
+
+            # read new readings (current, timestamp)
+            values = self._query_values(':TRAC:DATA? ' + str(self.buffered_index) + ',' + str(size))
+        except visa.Error:
+            self.connection_state = False
+            self.close_connection()
+            return False
+
+        # reshape to (readings, elements), elements are returned in the order current, timestamp (, source)
+        values = values.reshape(-1, self.buffered_elements)
+        self.buffered_index += values.shape[0]
+
+        if self.buffered_elements == 3:
+            return [values[:, 1], values[:, 0], values[:, 2]]
+
+        return [values[:, 1], values[:, 0]]
+
+    @arbitrated(SessionArbiter.PRIORITY_MEASUREMENT)
+    def stop_buffered_acquisition(self):
+        """ Aborts the buffered acquisition and restores the trigger configuration for single measurements.
+
+        :return: True if stopped, False if an error occurred
+        """
+
+        # check if connection is alive
+        if not self.connection_state:
+            return False
+
+        # try to abort and restore automatic trigger with count 1
+        try:
+            self.session.write(':ABOR:ACQ;:TRAC:FEED:CONT NEV;:TRIG:ACQ:SOUR AINT;:TRIG:ACQ:COUN 1;'
+                               ':FORM:ELEM:SENS CURR')
+        except visa.Error:
+            self.connection_state = False
+            self.close_connection()
+            return False
+
+        return True
+
+    @arbitrated(SessionArbiter.PRIORITY_MEASUREMENT)
+    def start_list_sweep(self, profile, measurement_interval):
+        """ Uploads a voltage profile as source list and starts it together with a buffered acquisition with a single
+        trigger (INIT:ALL). Source steps and readings are timed by the instrument, t=0 of the instrument timestamps is
+        the start of the profile. Use fetch_buffered_block() to collect [timestamps, currents, source voltages],
+        get_list_sweep_timing() to read back the step times and abort_list_sweep() to stop or after the sweep.
+        Don't use the single measurement methods (e.g. get_current()) while the sweep is running.
+
+        :param profile: list of [voltage in V, dwell time in s], e.g. [[0, 60], [100, 3600], [0, 3600]]
+        :param measurement_interval: interval of the synchronized current readings in s
+        :exception ValueError: If a voltage is out of range, voltages have different polarity, or the profile
+                               requires more than Parameters.EM_LIST_SWEEP_MAX_POINTS list points or more than
+                               100000 readings
+        :exception InterlockError: If a voltage of the profile is > 21 V and the interlock is open
+        :return: True if started, False if an error occurred
+        """
+
+        # check input parameters
+        if len(profile) == 0:
+            raise ValueError
+
+        voltages = [step[0] for step in profile]
+        if min(voltages) < -1000 or max(voltages) > 1000 or (min(voltages) < 0 < max(voltages)):
+            raise ValueError
+
+        # equal list point interval (timer) in ms: greatest common divisor of all dwell times
+        dwell_times = [int(round(step[1] * 1000)) for step in profile]
+        if min(dwell_times) < 1:
+            raise ValueError
+        interval_ms = 0
+        for dwell_time in dwell_times:
+            interval_ms = math.gcd(interval_ms, dwell_time)
+
+        # expand the profile to list points
+        list_voltages = []
+        for step, dwell_time in zip(profile, dwell_times):
+            list_voltages += [step[0]] * (dwell_time // interval_ms)
+        if len(list_voltages) > Parameters.EM_LIST_SWEEP_MAX_POINTS:
+            raise ValueError
+
+        # number of readings covering the whole profile
+        count = int(round(sum(dwell_times) / 1000 / measurement_interval, 6))
+        if count < 1 or count > 100000:
+            raise ValueError
+
+        # check if connection is alive. If not, try to connect.
+        if not self.connection_state:
+            if not self.connect():
+                return False
+
+        # voltage output range (output is disabled while switching) and output enable
+        if min(voltages) >= 0:
+            volt_range = 'MAX'
+        else:
+            volt_range = 'MIN'
+        settings = []
+        if self.shadow.get(':SOUR:VOLT:RANG') != volt_range:
+            settings += [[':OUTP:STAT', 'OFF'], [':SOUR:VOLT:RANG', volt_range]]
+        settings.append([':OUTP:STAT', 'ON'])
+
+        # source list with transient trigger timer, one transient trigger per list point
+        queries = [':SOUR:VOLT:MODE LIST',
+                   ':SOUR:LIST:VOLT ' + ','.join(str(voltage) for voltage in list_voltages),
+                   ':TRIG:TRAN:SOUR TIM',
+                   ':TRIG:TRAN:TIM ' + str(interval_ms / 1000),
+                   ':TRIG:TRAN:COUN ' + str(len(list_voltages))]
+
+        # try to check the interlock for the maximum voltage of the profile before the output is enabled, then
+        # configure and start source and acquisition with a single trigger
+        try:
+            self._check_interlock(max(abs(voltage) for voltage in voltages))
+            self._write_settings(settings)
+            self.session.write(';'.join(queries + self._buffered_queries(count, measurement_interval,
+                                                                         'CURR,TIME,SOUR')))
+            self.session.write(':INIT:ALL')
+            self.buffered_start_time = time.time()
+        except visa.Error:
+            self.connection_state = False
+            self.close_connection()
+            return False
+
+        # the fixed source level is not known anymore
+        self.shadow.pop(':SOUR:VOLT', None)
+
+        self.sweep_voltages = list_voltages
+        self.sweep_interval = interval_ms / 1000
+        self.buffered_count = count
+        self.buffered_index = 0
+        self.buffered_elements = 3
+        self.trigger_pending = False
+
+        if Parameters.DEBUG:
+            print("List sweep started: ", len(list_voltages), " points, interval ", self.sweep_interval, " s")
+
+        return True
+
+    @staticmethod
+    def get_list_sweep_timing(timestamps, sources):
+        """ Returns the step times of a list sweep read back from the source voltages recorded with every reading.
+        The resolution is the measurement interval of the sweep.
+
+        :param timestamps: numpy array instrument timestamps in s (see fetch_buffered_block())
+        :param sources: numpy array source voltages in V (see fetch_buffered_block())
+        :return: list of [timestamp in s of the first reading with the new voltage, voltage in V]
+        """
+
+        if len(sources) == 0:
+            return []
+
+        # first reading and every reading where the source voltage changes
+        changes = numpy.flatnonzero(numpy.diff(sources)) + 1
+        steps = [[float(timestamps[0]), float(sources[0])]]
+        for index in changes:
+            steps.append([float(timestamps[index]), float(sources[index])])
+
+        return steps
+
+    @arbitrated(SessionArbiter.PRIORITY_SAFETY)
+    def abort_list_sweep(self):
+        """ Aborts the list sweep and the acquisition, sets the source back to fixed mode with 0 V and restores the
+        trigger configuration for single measurements.
+
+        :return: True if aborted, False if an error occurred
+        """
+
+        # check if connection is alive
+        if not self.connection_state:
+            return False
+
+        # try to abort, set fixed mode with 0 V and restore automatic triggers with count 1
+        try:
+            self.session.write(':ABOR:ALL;:SOUR:VOLT:MODE FIX;:SOUR:VOLT 0;:TRIG:TRAN:SOUR AINT;:TRIG:TRAN:COUN 1')
+            self.shadow[':SOUR:VOLT'] = '0'
+            self.user_voltage = 0
+            self.previous_voltage = 0
+        except visa.Error:
+            self.connection_state = False
+            self.close_connection()
+            return False
+
+        self.sweep_voltages = []
+        self.buffered_elements = 2
+
+        return self.stop_buffered_acquisition()
+
+    def set_data_format(self, data_format):
+        """ Sets the transfer format of multi-value fetches (e.g. fetch_buffered_block()).
+        'binary' transfers the values as IEEE 754 doubles (FORM:DATA REAL,64) and avoids the formatting on the
+        instrument and the parsing on the host. Single value queries are always transferred as ascii.
+
+        :param data_format: must be string 'ascii' or 'binary'
+        :exception TypeError: If data_format is not string
+        :exception ValueError: If data_format string is not valid
+        :return: None
+        """
+
+        # check input parameters
+        if not isinstance(data_format, str):
+            raise TypeError
+
+        if data_format not in ['ascii', 'binary']:
+            raise ValueError
+
+        self.data_format = data_format
+
+    @staticmethod
+    def parse_ieee_block(raw):
+        """ Decodes an IEEE 488.2 definite length block with big endian doubles (FORM:DATA REAL,64, FORM:BORD NORM).
+        Block format: '#', number of length digits n, n digits data length in bytes, data, optional termination.
+
+        :param raw: bytes as returned by session.read_raw()
+        :exception ValueError: If raw is not a valid definite length block
+        :return: numpy array with the values (float64)
+        """
+
+        # find block start and decode header
+        start = raw.find(b'#')
+        if start < 0 or start + 2 > len(raw):
+            raise ValueError
+        digits = int(raw[start + 1:start + 2])
+        if digits == 0:
+            raise ValueError
+        length = int(raw[start + 2:start + 2 + digits])
+        offset = start + 2 + digits
+        if offset + length > len(raw) or length % 8 != 0:
+            raise ValueError
+
+        # decode without copying, convert to native byte order
+        return numpy.frombuffer(raw, dtype='>f8', count=length // 8, offset=offset).astype(float)
+
+    def _query_values(self, query):
+        """ Sends a query returning multiple values and decodes the response according to the data format.
+        For the binary format, the data format is switched to REAL,64 for this query only.
+
+        :param query: scpi query, e.g. ':TRAC:DATA? 0,100'
+        :exception VisaIOError: if the communication fails
+        :return: numpy array with the values
+        """
+
+        if self.data_format == 'ascii':
+            self.session.write(query)
+            return numpy.array(self.session.read().split(','), dtype=float)
+
+        # switch format for this query only, single value queries stay ascii
+        self.session.write(':FORM:BORD NORM;:FORM:DATA REAL,64;' + query + ';:FORM:DATA ASC')
+        return self.parse_ieee_block(self._read_block())
+
+    def _read_block(self):
+        """ Reads a complete definite length block (several reads if the block is transferred in chunks).
+
+        :exception VisaIOError: if the communication fails
+        :return: bytes
+        """
+
+        raw = self.session.read_raw()
+
+        # read until the number of bytes given in the block header is received
+        start = raw.find(b'#')
+        if start >= 0 and start + 2 <= len(raw):
+            digits = int(raw[start + 1:start + 2])
+            while len(raw) < start + 2 + digits:
+                raw += self.session.read_raw()
+            length = int(raw[start + 2:start + 2 + digits])
+            while len(raw) < start + 2 + digits + length:
+                raw += self.session.read_raw()
+
+        return raw
+
+    @arbitrated(SessionArbiter.PRIORITY_MEASUREMENT)
     def close_connection(self):
         """ Closes the usb connection (session and resource manager) and resets the connection state var.
 
         :return: None
         """
 
+        # the shadow is not valid anymore (the instrument state may change until the next connect)
+        self.shadow = {}
+
         # close the connection to the instrument
         try:
             self.session.close()
@@ -0,0 +1,288 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from parameters import Parameters
+from devices.electrometer_keysight_b2985a import ElectrometerControl
+
+
+class AsyncElectrometerControl:
+    """ This class provides an asyncio interface for the electrometer Keysight B2985A based on ElectrometerControl.
+    All blocking visa calls are executed in a single worker thread per session, i.e. calls of several coroutines
+    (e.g. acquisition, logging and remote monitoring) never access the visa session at the same time.
+    An asyncio lock makes multi-step operations (trigger and fetch) atomic with respect to other coroutines.
+    All methods accept a timeout. If a current measurement is cancelled or times out, the acquisition is aborted.
+
+    Methods
+    ---------
+    connect()               Open a connection (creates the ElectrometerControl instance if not given)
+    check_connection()      Check if connection is alive
+    get_current()           Triggers a current measurement and awaits the result in A
+    trigger_current()       Starts a current measurement (returns immediately)
+    fetch_current()         Awaits the triggered current measurement without blocking the event loop
+    get_all_values()        Awaits current, temperature, source voltage and interlock state
+    get_temperature()       Reads the temperature in °C
+    get_voltage()           Reads the voltage of the internal voltage source in V
+    set_voltage()           Sets the voltage of the internal voltage source in V
+    get_interlock_state()   Reads the current state of the interlock (True/False)
+    enable_source_output()  Enables the source output (internal relay)
+    disable_source_output() Disables the source output
+    enable_current_input()  Enables the ammeter (internal relay)
+    disable_current_input() Disables the ammeter
+    set_speed()             Sets the measurement speed ('quick', 'normal', 'stable', 'adaptive')
+    set_range()             Sets the current measurement range
+    close_connection()      Closes the connection and the worker thread
+
+    Exceptions
+    -----------
+    asyncio.TimeoutError: The call did not complete within the timeout.
+    asyncio.CancelledError: The awaiting task was cancelled.
+    All exceptions of the corresponding ElectrometerControl methods (e.g. ValueError, InterlockError).
+
+    """
+
+    def __init__(self, electrometer=None):
+        """ Constructor of the class AsyncElectrometerControl. Does not connect, use connect().
+
+        :param electrometer: instance of the class ElectrometerControl, default: created by connect()
+        """
+
+        # synchronous driver, all calls are executed in the worker thread
+        self.electrometer = electrometer
+
+        # single worker thread per session (serializes all visa calls, also after a cancellation)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="Electrometer")
+
+        # lock for operations consisting of several calls
+        self.lock = asyncio.Lock()
+
+    async def connect(self, timeout=None):
+        """ Open a connection. The ElectrometerControl instance is created if it was not given.
+
+        :param timeout: timeout in s, default Parameters.EM_FETCH_TIMEOUT
+        :return: True if connection successful, False otherwise
+        """
+
+        async with self.lock:
+            if self.electrometer is None:
+                self.electrometer = await self._run(ElectrometerControl, timeout=timeout)
+                return self.electrometer.connection_state
+            return await self._run(self.electrometer.connect, timeout=timeout)
+
+    async def check_connection(self, timeout=None):
+        """ Check if the connection is alive (see ElectrometerControl.check_connection()).
+
+        :param timeout: timeout in s, default Parameters.EM_FETCH_TIMEOUT
+        :return: False if connection is not alive, True otherwise
+        """
+        return await self._call(self.electrometer.check_connection, timeout=timeout)
+
+    async def get_current(self, timeout=None):
+        """ Triggers a current measurement and awaits the result.
+
+        :param timeout: timeout in s for trigger and measurement, default Parameters.EM_FETCH_TIMEOUT
+        :return: current in A (string), False if an error occurred
+        """
+
+        async with self.lock:
+            return await self._wait_for(self._trigger_and_fetch(self.electrometer.fetch_current), timeout)
+
+    async def trigger_current(self, timeout=None):
+        """ Starts a current measurement and returns immediately. Use fetch_current() to collect the result.
+
+        :param timeout: timeout in s, default Parameters.EM_FETCH_TIMEOUT
+        :return: True if the measurement was triggered, False if an error occurred
+        """
+        return await self._call(self.electrometer.trigger_current, timeout=timeout)
+
+    async def fetch_current(self, timeout=None):
+        """ Awaits the triggered current measurement (status byte is polled without blocking the event loop).
+        If no measurement was triggered, a new measurement is triggered first.
+
+        :param timeout: timeout in s, default Parameters.EM_FETCH_TIMEOUT
+        :return: current in A (string), False if an error occurred
+        """
+
+        async with self.lock:
+            return await self._wait_for(self._fetch(self.electrometer.fetch_current), timeout)
+
+    async def get_all_values(self, timeout=None):
+        """ Triggers a current measurement and awaits current, temperature, source voltage and interlock state
+        (see ElectrometerControl.get_all_values()).
+
+        :param timeout: timeout in s for trigger and measurement, default Parameters.EM_FETCH_TIMEOUT
+        :return: [current in A, temperature in °C, source voltage in V, interlock state (True: closed)],
+                 False if an error occurred
+        """
+
+        async with self.lock:
+            return await self._wait_for(self._trigger_and_fetch(self.electrometer.fetch_all_values), timeout)
+
+    async def get_temperature(self, timeout=None):
+        """ Read the temperature of the K-Sensor in °C.
+
+        :param timeout: timeout in s, default Parameters.EM_FETCH_TIMEOUT
+        :return: Temperature in °C
+        """
+        return await self._call(self.electrometer.get_temperature, timeout=timeout)
+
+    async def get_voltage(self, timeout=None):
+        """ Reads the voltage of the internal voltage source in V.
+
+        :param timeout: timeout in s, default Parameters.EM_FETCH_TIMEOUT
+        :return: False if connection is not alive, voltage in V otherwise
+        """
+        return await self._call(self.electrometer.get_voltage, timeout=timeout)
+
+    async def set_voltage(self, voltage, timeout=None):
+        """ Sets the voltage of the internal voltage source (see ElectrometerControl.set_voltage()).
+
+        :param voltage: Voltage to set
+        :param timeout: timeout in s, default Parameters.EM_FETCH_TIMEOUT
+        :return: None
+        """
+        return await self._call(self.electrometer.set_voltage, voltage, timeout=timeout)
+
+    async def get_interlock_state(self, timeout=None):
+        """ Reads the interlock state.
+
+        :param timeout: timeout in s, default Parameters.EM_FETCH_TIMEOUT
+        :return: True (closed -> HV enabled) or False (open -> HV disabled)
+        """
+        return await self._call(self.electrometer.get_interlock_state, timeout=timeout)
+
+    async def enable_source_output(self, timeout=None):
+        """ Enable the voltage source (internal relay).
+
+        :param timeout: timeout in s, default Parameters.EM_FETCH_TIMEOUT
+        :return: None
+        """
+        return await self._call(self.electrometer.enable_source_output, timeout=timeout)
+
+    async def disable_source_output(self, timeout=None):
+        """ Disable the voltage source.
+
+        :param timeout: timeout in s, default Parameters.EM_FETCH_TIMEOUT
+        :return: None
+        """
+        return await self._call(self.electrometer.disable_source_output, timeout=timeout)
+
+    async def enable_current_input(self, timeout=None):
+        """ Enables the ammeter input (internal relay).
+
+        :param timeout: timeout in s, default Parameters.EM_FETCH_TIMEOUT
+        :return: None
+        """
+        return await self._call(self.electrometer.enable_current_input, timeout=timeout)
+
+    async def disable_current_input(self, timeout=None):
+        """ Disables the ammeter input.
+
+        :param timeout: timeout in s, default Parameters.EM_FETCH_TIMEOUT
+        :return: None
+        """
+        return await self._call(self.electrometer.disable_current_input, timeout=timeout)
+
+    async def set_speed(self, speed, timeout=None):
+        """ Sets the measurement speed (see ElectrometerControl.set_speed()).
+
+        :param speed: must be string 'quick', 'normal', 'stable' or 'adaptive'
+        :param timeout: timeout in s, default Parameters.EM_FETCH_TIMEOUT
+        :return: None
+        """
+        return await self._call(self.electrometer.set_speed, speed, timeout=timeout)
+
+    async def set_range(self, range_number, timeout=None):
+        """ Sets the measurement range (see ElectrometerControl.set_range()).
+
+        :param range_number: measurement range (0: auto, 1-11: 2 pA - 20 mA)
+        :param timeout: timeout in s, default Parameters.EM_FETCH_TIMEOUT
+        :return: None
+        """
+        return await self._call(self.electrometer.set_range, range_number, timeout=timeout)
+
+    async def close_connection(self):
+        """ Closes the connection and shuts down the worker thread (after all pending calls are completed).
+
+        :return: None
+        """
+
+        async with self.lock:
+            if self.electrometer is not None and self.electrometer.connection_state:
+                await self._run(self.electrometer.close_connection)
+                self.electrometer.connection_state = False
+        self.executor.shutdown(wait=False)
+
+    async def _call(self, function, *args, timeout=None):
+        """ Executes a blocking method in the worker thread while holding the lock.
+
+        :param function: method of the ElectrometerControl instance
+        :param args: arguments of the method
+        :param timeout: timeout in s, default Parameters.EM_FETCH_TIMEOUT
+        :return: return value of the method
+        """
+
+        async with self.lock:
+            return await self._run(function, *args, timeout=timeout)
+
+    async def _run(self, function, *args, timeout=None):
+        """ Executes a blocking function in the worker thread. On a timeout or cancellation the awaiting coroutine
+        returns immediately, the function itself is completed by the worker thread before the next call.
+
+        :param function: function to execute
+        :param args: arguments of the function
+        :param timeout: timeout in s, default Parameters.EM_FETCH_TIMEOUT
+        :return: return value of the function
+        """
+
+        loop = asyncio.get_running_loop()
+        return await self._wait_for(loop.run_in_executor(self.executor, function, *args), timeout)
+
+    async def _wait_for(self, awaitable, timeout):
+        """ Awaits with timeout. If a triggered measurement is pending after a timeout or cancellation, it is aborted.
+
+        :param awaitable: coroutine or future
+        :param timeout: timeout in s, default Parameters.EM_FETCH_TIMEOUT
+        :return: result of the awaitable
+        """
+
+        if timeout is None:
+            timeout = Parameters.EM_FETCH_TIMEOUT
+
+        try:
+            return await asyncio.wait_for(awaitable, timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            # abort in the worker thread (executed after a possibly still running call)
+            if self.electrometer is not None and self.electrometer.trigger_pending:
+                self.executor.submit(self.electrometer.abort_current)
+            raise
+
+    async def _trigger_and_fetch(self, fetch_function):
+        """ Triggers a current measurement and awaits the result (lock must be held by the caller).
+
+        :param fetch_function: ElectrometerControl.fetch_current or ElectrometerControl.fetch_all_values
+        :return: return value of the fetch function
+        """
+
+        loop = asyncio.get_running_loop()
+        if not await loop.run_in_executor(self.executor, self.electrometer.trigger_current):
+            return False
+
+        return await self._fetch(fetch_function)
+
+    async def _fetch(self, fetch_function):
+        """ Polls the completion of the triggered measurement without blocking the event loop and fetches the result
+        (lock must be held by the caller).
+
+        :param fetch_function: ElectrometerControl.fetch_current or ElectrometerControl.fetch_all_values
+        :return: return value of the fetch function
+        """
+
+        loop = asyncio.get_running_loop()
+
+        # wait for completion, the event loop is not blocked between the polls
+        if self.electrometer.trigger_pending:
+            while not await loop.run_in_executor(self.executor, self.electrometer.is_current_ready):
+                if not self.electrometer.connection_state:
+                    return False
+                await asyncio.sleep(Parameters.EM_POLL_INTERVAL)
+
+        return await loop.run_in_executor(self.executor, fetch_function)
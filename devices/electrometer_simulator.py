@@ -0,0 +1,947 @@
+"""
+This module provides an in-process simulation of the electrometer Keysight B2985A on scpi level. It replaces the pyvisa
+resource manager and session (same method names) and is selected with a visa address starting with 'SIM::'
+(e.g. Parameters.KEYSIGHT_VISA_ADDRESS = "SIM::B2985A"). It can be used to run and benchmark the gui, the measurement
+functions and the class ElectrometerControl without hardware. If pyvisa is not installed, this module can be used in
+place of pyvisa (same names for ResourceManager, Error, VisaIOError and constants).
+
+Simulated instrument:
+- Scpi subset used by ElectrometerControl: *IDN?, *CLS, *ESE, *OPC, *OPC?, MEAS, INIT, FETC, ABOR, SENS:CURR:RANG,
+  SENS:CURR:APER, SENS:CURR:AVER, SENS:CURR:MED, SOUR:VOLT (fixed and list mode), OUTP, INP, TRIG:ACQ, TRIG:TRAN,
+  TRAC, FORM, SYST:TEMP?, SYST:INT:TRIP?, SYST:COMM:ENAB?, SYST:TIME:TIM:COUN:RES, SYST:ERR?
+- Status byte: event summary bit (32) set by *OPC if enabled with *ESE 1, message available bit (16)
+- Specimen: dc conductance plus Curie-von Schweidler polarization current (A * t^-n) for every voltage step
+  (superposition), applied voltage is the source output voltage plus an external voltage (e.g. hvamp)
+
+Latency model: every write and read costs a command latency (usb turnaround), every reading costs the aperture time
+(speed presets or fixed aperture, multiplied by a repeating average count) plus a range change delay if the range
+changes. All latencies are multiplied by 'time_scale'. With time_scale 0, a virtual clock is used instead of real time
+(all operations complete immediately, but the simulated time, e.g. of the specimen response, advances).
+"""
+
+import random
+import threading
+import time
+import numpy
+
+try:
+    from pyvisa import Error, VisaIOError, constants
+except ImportError:
+    class Error(Exception):
+        """ Replacement of the pyvisa Error if pyvisa is not installed.
+        """
+        pass
+
+    class VisaIOError(Error):
+        """ Replacement of the pyvisa VisaIOError if pyvisa is not installed.
+        """
+
+        def __init__(self, error_code):
+            self.error_code = error_code
+            super().__init__("VI_ERROR " + str(error_code))
+
+    class constants:
+        """ Replacement of the pyvisa constants used in this project if pyvisa is not installed.
+        """
+
+        class StatusCode:
+            error_timeout = -1073807339
+            error_resource_not_found = -1073807343
+
+
+# identification of the simulated instrument
+IDN = "Keysight Technologies,B2985A,SIM00001,1.0 (simulated)"
+
+# upper limit in A of the current ranges 1-11 (2 pA - 20 mA)
+RANGES = [2e-12, 2e-11, 2e-10, 2e-9, 2e-8, 2e-7, 2e-6, 2e-5, 2e-4, 2e-3, 2e-2]
+
+# delay in s of a range change to the current ranges 1-11 (low current ranges need longer settling)
+RANGE_CHANGE_DELAYS = [0.2, 0.1, 0.05, 0.02, 0.01, 0.005, 0.005, 0.005, 0.005, 0.005, 0.005]
+
+# aperture time in s of the automatic aperture modes (speed presets)
+AUTO_APERTURES = {'SHOR': 0.02, 'MED': 0.1, 'LONG': 0.5}
+
+# rms noise as fraction of the range value at the reference aperture in s (noise decreases with 1/sqrt(aperture))
+NOISE_RANGE_FRACTION = 5e-4
+NOISE_REFERENCE_APERTURE = 0.02
+
+# overflow value returned if the current exceeds the range
+OVERFLOW = 9.9e37
+
+
+class SimulatedResourceManager:
+    """ This class simulates the pyvisa resource manager. Simulated instruments are kept per address, i.e. the
+    instrument state is kept if a session is closed and opened again (like a real instrument).
+
+    Methods
+    ---------
+    open_resource()     Returns a session to the simulated instrument of a given address ('SIM::...')
+    list_resources()    Returns the addresses of all simulated instruments
+    close()             Closes the resource manager
+
+    """
+
+    # simulated instruments {address: SimulatedB2985A}
+    instruments = {}
+
+    def __init__(self, time_scale=1.0, command_latency=0.0005):
+        """ Constructor of the class SimulatedResourceManager.
+
+        :param time_scale: factor for all simulated latencies (0: virtual clock, operations complete immediately)
+        :param command_latency: latency of one write or read (usb turnaround) in s
+        """
+
+        self.time_scale = time_scale
+        self.command_latency = command_latency
+
+    def open_resource(self, address):
+        """ Returns a session to the simulated instrument of a given address. The instrument is created if needed.
+
+        :param address: visa address, must start with 'SIM::'
+        :exception VisaIOError: If the address is not a simulated address
+        :return: instance of the class SimulatedB2985A
+        """
+
+        if not str(address).startswith("SIM::"):
+            raise VisaIOError(constants.StatusCode.error_resource_not_found)
+
+        instrument = self.instruments.get(address)
+        if instrument is None:
+            instrument = SimulatedB2985A(self.time_scale, self.command_latency)
+            self.instruments[address] = instrument
+        instrument.open()
+
+        return instrument
+
+    def list_resources(self):
+        """ Returns the addresses of all simulated instruments.
+
+        :return: tuple of addresses
+        """
+        return tuple(self.instruments.keys())
+
+    def close(self):
+        """ Closes the resource manager.
+
+        :return: None
+        """
+        pass
+
+
+def ResourceManager(*args):
+    """ Replacement of pyvisa.ResourceManager if pyvisa is not installed (simulated instruments only).
+
+    :return: instance of the class SimulatedResourceManager
+    """
+    return SimulatedResourceManager()
+
+
+class SimulatedB2985A:
+    """ This class simulates the Keysight B2985A and the methods of a pyvisa session used in this project.
+
+    Methods
+    ---------
+    write()                 Executes a scpi message (several commands separated by ';')
+    read()                  Returns the response of the last query message as string
+    read_raw()              Returns the response of the last query message as bytes
+    read_stb()              Returns the status byte
+    query()                 Write and read
+    close()                 Closes the session
+    open()                  Opens the session (used by the resource manager)
+    set_external_voltage()  Applies an external voltage to the specimen (e.g. hvamp)
+    disconnect()            Simulates a connection loss (all calls fail until the session is opened again)
+
+    """
+
+    def __init__(self, time_scale=1.0, command_latency=0.0005):
+        """ Constructor of the class SimulatedB2985A. Initializes the instrument state (*RST state).
+
+        :param time_scale: factor for all simulated latencies (0: virtual clock, operations complete immediately)
+        :param command_latency: latency of one write or read (usb turnaround) in s
+        """
+
+        # latency model and clock
+        self.time_scale = time_scale
+        self.command_latency = command_latency
+        self.t_origin = time.perf_counter()
+        self.virtual_time = 0.0
+
+        # session state
+        self.is_open = False
+        self.connected = True
+        self.output_queue = None
+        self.timeout = 2000
+
+        # status registers and error queue
+        self.ese = 0
+        self.esr = 0
+        self.opc_pending = False
+        self.errors = []
+
+        # measurement settings
+        self.range_auto = True
+        self.range_index = 10
+        self.auto_llim = 0
+        self.auto_ulim = 10
+        self.aperture_auto = True
+        self.aperture_mode = 'MED'
+        self.aperture = 0.1
+        self.average_state = False
+        self.average_count = 1
+        self.average_mode = 'REP'
+        self.median_state = False
+        self.median_rank = 1
+        self.input_state = False
+
+        # source settings and applied voltage events [time, voltage] (source output and external voltage)
+        self.output_state = False
+        self.source_level = 0.0
+        self.source_range = 'MAX'
+        self.source_mode = 'FIX'
+        self.source_list = [0.0]
+        self.external_voltage = 0.0
+        self.voltage_events = [[0.0, 0.0]]
+
+        # trigger settings (acquisition and transient)
+        self.acq_trigger_source = 'AINT'
+        self.acq_trigger_timer = 0.1
+        self.acq_trigger_count = 1
+        self.tran_trigger_source = 'AINT'
+        self.tran_trigger_timer = 0.1
+        self.tran_trigger_count = 1
+
+        # data format, trace buffer and timestamp origin
+        self.elements = ['CURR']
+        self.data_format = 'ASC'
+        self.byte_order = 'NORM'
+        self.trace_points = 100000
+        self.trace_feed = False
+        self.timestamp_origin = 0.0
+
+        # running or last acquisition (see _start_acquisition())
+        self.acquisition = None
+
+        # environment: k-type sensor temperature in °C, interlock state
+        self.temperature = 23.0
+        self.interlock_closed = True
+
+        # specimen: dc conductance in S, Curie-von Schweidler amplitude in S*s^n and exponent n, minimum time in s
+        self.conductance = 1e-15
+        self.polarization_amplitude = 1e-13
+        self.polarization_exponent = 0.8
+        self.polarization_min_time = 0.01
+
+        # lock, the session may be used by several threads
+        self.lock = threading.RLock()
+
+    # --------------- SESSION --------------- #
+
+    def open(self):
+        """ Opens the session.
+
+        :return: None
+        """
+
+        with self.lock:
+            self.is_open = True
+            self.connected = True
+
+    def close(self):
+        """ Closes the session.
+
+        :return: None
+        """
+
+        with self.lock:
+            self.is_open = False
+
+    def disconnect(self):
+        """ Simulates a connection loss. All calls fail until the session is opened again.
+
+        :return: None
+        """
+
+        with self.lock:
+            self.connected = False
+
+    def write(self, message):
+        """ Executes a scpi message. Commands are separated by ';', the responses of queries are collected.
+
+        :param message: scpi message, e.g. ':SOUR:VOLT 10;:OUTP:STAT ON'
+        :exception VisaIOError: If the session is closed or the connection is lost
+        :return: number of written bytes
+        """
+
+        with self.lock:
+            self._check_session()
+            self._advance(self._now() + self.command_latency)
+
+            # a new message discards an unread response (query interrupted)
+            if self.output_queue is not None:
+                self.errors.append('-410,"Query INTERRUPTED"')
+            self.output_queue = None
+
+            responses = []
+            for command in message.strip().split(';'):
+                command = command.strip()
+                if len(command) > 0:
+                    response = self._execute(command)
+                    if response is not None:
+                        responses.append(response)
+
+            # join responses, binary blocks are kept as bytes
+            if len(responses) > 0:
+                self.output_queue = b';'.join(r if isinstance(r, bytes) else r.encode() for r in responses) + b'\n'
+
+            return len(message)
+
+    def read_raw(self):
+        """ Returns the response of the last query message.
+
+        :exception VisaIOError: If no response is available (timeout) or the connection is lost
+        :return: response as bytes (including termination)
+        """
+
+        with self.lock:
+            self._check_session()
+            self._advance(self._now() + self.command_latency)
+
+            if self.output_queue is None:
+                raise VisaIOError(constants.StatusCode.error_timeout)
+
+            response = self.output_queue
+            self.output_queue = None
+
+            return response
+
+    def read(self):
+        """ Returns the response of the last query message.
+
+        :exception VisaIOError: If no response is available (timeout) or the connection is lost
+        :return: response as string (including termination)
+        """
+        return self.read_raw().decode(errors='replace')
+
+    def query(self, message):
+        """ Writes a message and returns the response.
+
+        :param message: scpi message
+        :return: response as string
+        """
+
+        self.write(message)
+
+        return self.read()
+
+    def read_stb(self):
+        """ Returns the status byte (serial poll): bit 5 event summary, bit 4 message available.
+
+        :exception VisaIOError: If the connection is lost
+        :return: status byte
+        """
+
+        with self.lock:
+            self._check_session()
+
+            # with the virtual clock, a pending acquisition is completed immediately
+            if self.time_scale <= 0 and self.opc_pending and self.acquisition is not None:
+                self._advance(self.acquisition['end'])
+
+            self._update_opc()
+            stb = 0
+            if self.esr & self.ese:
+                stb |= 32
+            if self.output_queue is not None:
+                stb |= 16
+
+            return stb
+
+    def set_external_voltage(self, voltage):
+        """ Applies an external voltage to the specimen (e.g. hvamp, in addition to the source output voltage).
+
+        :param voltage: voltage in V
+        :return: None
+        """
+
+        with self.lock:
+            self.external_voltage = voltage
+            self._add_voltage_event(self._now())
+
+    # --------------- COMMAND EXECUTION --------------- #
+
+    def _execute(self, command):
+        """ Executes a single scpi command.
+
+        :param command: scpi command with parameters, e.g. ':SENS:CURR:RANG:UPP 2E-9'
+        :return: response string/bytes for queries, None otherwise
+        """
+
+        # split header and parameter, headers are handled as absolute paths
+        parts = command.split(None, 1)
+        header = parts[0].upper().lstrip(':')
+        parameter = parts[1].strip() if len(parts) > 1 else ''
+
+        # remove optional nodes, e.g. 'MEAS:VOLT:DC?' -> 'MEAS:VOLT?'
+        header = header.replace(':DC?', '?').replace(':IMM', '').replace(':LEV', '')
+
+        handler = self.COMMANDS.get(header)
+        if handler is None:
+            self.errors.append('-113,"Undefined header; ' + command + '"')
+            return None
+
+        try:
+            return handler(self, parameter)
+        except (ValueError, IndexError):
+            self.errors.append('-224,"Illegal parameter value; ' + command + '"')
+            return None
+
+    # common commands
+
+    def _idn(self, parameter):
+        return IDN
+
+    def _cls(self, parameter):
+        self.esr = 0
+        self.opc_pending = False
+        self.errors = []
+
+    def _ese(self, parameter):
+        self.ese = int(parameter)
+
+    def _ese_query(self, parameter):
+        return str(self.ese)
+
+    def _opc(self, parameter):
+        self.opc_pending = True
+        self._update_opc()
+
+    def _opc_query(self, parameter):
+        # waits until all pending operations are completed
+        if self.acquisition is not None:
+            self._advance(self.acquisition['end'])
+        return '1'
+
+    def _stb_query(self, parameter):
+        self._update_opc()
+        return str(32 if self.esr & self.ese else 0)
+
+    def _error_query(self, parameter):
+        if len(self.errors) == 0:
+            return '+0,"No error"'
+        return self.errors.pop(0)
+
+    # system commands
+
+    def _communication_query(self, parameter):
+        return '1'
+
+    def _temperature_query(self, parameter):
+        return '%+.6E' % (self.temperature + random.gauss(0, 0.02))
+
+    def _interlock_query(self, parameter):
+        return '0' if self.interlock_closed else '1'
+
+    def _timestamp_reset(self, parameter):
+        self.timestamp_origin = self._now()
+
+    # measurement commands
+
+    def _measure_current(self, parameter):
+        self._start_acquisition(with_source=False, count=1, timer=False)
+        return self._fetch_current('')
+
+    def _measure_voltage(self, parameter):
+        return '%+.6E' % self._output_voltage(self._now())
+
+    def _init_acquisition(self, parameter):
+        self._start_acquisition(with_source=False)
+
+    def _init_all(self, parameter):
+        self._start_acquisition(with_source=True)
+
+    def _fetch_current(self, parameter):
+        # waits until the acquisition is completed
+        if self.acquisition is None:
+            self.errors.append('-230,"Data corrupt or stale"')
+            return '%+.6E' % OVERFLOW
+        self._advance(self.acquisition['end'])
+        reading = self._reading(self.acquisition['count'] - 1)
+        return self._format_values([reading['CURR']])
+
+    def _abort_acquisition(self, parameter):
+        self._abort()
+
+    def _abort_all(self, parameter):
+        self._abort()
+
+        # stop list sweep: remove future voltage steps
+        now = self._now()
+        self.voltage_events = [event for event in self.voltage_events if event[0] <= now]
+        self._add_voltage_event(now)
+
+    # sense commands
+
+    def _range_auto(self, parameter):
+        self.range_auto = parameter.upper() in ['ON', '1']
+
+    def _range_upper(self, parameter):
+        value = parameter.upper()
+        if value == 'UP':
+            index = min(self.range_index + 1, len(RANGES) - 1)
+        elif value == 'DOWN':
+            index = max(self.range_index - 1, 0)
+        else:
+            index = self._range_from_value(value)
+        self._change_range(index)
+
+    def _range_llim(self, parameter):
+        self.auto_llim = self._range_from_value(parameter.upper())
+
+    def _range_ulim(self, parameter):
+        self.auto_ulim = self._range_from_value(parameter.upper())
+
+    def _range_query(self, parameter):
+        return '%+.6E' % RANGES[self.range_index]
+
+    def _aperture(self, parameter):
+        aperture = float(parameter)
+        if aperture < 8e-6 or aperture > 2:
+            raise ValueError
+        self.aperture = aperture
+
+    def _aperture_auto(self, parameter):
+        self.aperture_auto = parameter.upper() in ['ON', '1']
+
+    def _aperture_mode(self, parameter):
+        mode = parameter.upper()[:4].rstrip('T')
+        if mode not in AUTO_APERTURES:
+            raise ValueError
+        self.aperture_mode = mode
+
+    def _average_state(self, parameter):
+        self.average_state = parameter.upper() in ['ON', '1']
+
+    def _average_count(self, parameter):
+        self.average_count = int(parameter)
+
+    def _average_mode(self, parameter):
+        self.average_mode = parameter.upper()[:3]
+
+    def _median_state(self, parameter):
+        self.median_state = parameter.upper() in ['ON', '1']
+
+    def _median_rank(self, parameter):
+        self.median_rank = int(parameter)
+
+    def _input_state(self, parameter):
+        self.input_state = parameter.upper() in ['ON', '1']
+
+    # source commands
+
+    def _output_state(self, parameter):
+        self.output_state = parameter.upper() in ['ON', '1']
+        self._add_voltage_event(self._now())
+
+    def _source_level(self, parameter):
+        level = float(parameter)
+        if abs(level) > 21 and not self.interlock_closed:
+            self.errors.append('+810,"Interlock open"')
+            return
+        self.source_level = level
+        self._add_voltage_event(self._now())
+
+    def _source_level_query(self, parameter):
+        return '%+.6E' % self.source_level
+
+    def _source_range(self, parameter):
+        self.source_range = parameter.upper()[:3]
+
+    def _source_mode(self, parameter):
+        self.source_mode = parameter.upper()[:4]
+        self._add_voltage_event(self._now())
+
+    def _source_list(self, parameter):
+        self.source_list = [float(value) for value in parameter.split(',')]
+
+    # trigger commands
+
+    def _acq_trigger_source(self, parameter):
+        self.acq_trigger_source = parameter.upper()
+
+    def _acq_trigger_timer(self, parameter):
+        self.acq_trigger_timer = float(parameter)
+
+    def _acq_trigger_count(self, parameter):
+        self.acq_trigger_count = int(parameter)
+
+    def _tran_trigger_source(self, parameter):
+        self.tran_trigger_source = parameter.upper()
+
+    def _tran_trigger_timer(self, parameter):
+        self.tran_trigger_timer = float(parameter)
+
+    def _tran_trigger_count(self, parameter):
+        self.tran_trigger_count = int(parameter)
+
+    # format and trace commands
+
+    def _format_elements(self, parameter):
+        self.elements = [element.strip().upper()[:4] for element in parameter.split(',')]
+
+    def _format_data(self, parameter):
+        self.data_format = parameter.upper().split(',')[0][:3]
+
+    def _format_byte_order(self, parameter):
+        self.byte_order = parameter.upper()[:4]
+
+    def _trace_feed_control(self, parameter):
+        self.trace_feed = parameter.upper().startswith('NEXT')
+
+    def _trace_clear(self, parameter):
+        if self.acquisition is not None:
+            self.acquisition['trace'] = False
+
+    def _trace_points(self, parameter):
+        self.trace_points = int(parameter)
+
+    def _trace_feed(self, parameter):
+        pass
+
+    def _trace_points_actual(self, parameter):
+        if self.acquisition is None or not self.acquisition['trace']:
+            return '0'
+        # with the virtual clock, the acquisition is completed immediately
+        if self.time_scale <= 0:
+            self._advance(self.acquisition['end'])
+        return str(min(self._completed_readings(), self.trace_points))
+
+    def _trace_data(self, parameter):
+        available = int(self._trace_points_actual(''))
+        if len(parameter) > 0:
+            offset, size = [int(value) for value in parameter.split(',')]
+        else:
+            offset, size = 0, available
+        if offset < 0 or offset + size > available:
+            raise ValueError
+
+        values = []
+        for index in range(offset, offset + size):
+            reading = self._reading(index)
+            values += [reading[element] for element in self._ordered_elements()]
+
+        return self._format_values(values)
+
+    # scpi headers (short form) and handlers
+    COMMANDS = {
+        '*IDN?': _idn, '*CLS': _cls, '*ESE': _ese, '*ESE?': _ese_query, '*OPC': _opc, '*OPC?': _opc_query,
+        '*STB?': _stb_query, 'SYST:ERR?': _error_query, 'SYST:COMM:ENAB?': _communication_query,
+        'SYST:TEMP?': _temperature_query, 'SYST:INT:TRIP?': _interlock_query,
+        'SYST:TIME:TIM:COUN:RES': _timestamp_reset,
+        'MEAS:CURR?': _measure_current, 'MEAS:VOLT?': _measure_voltage,
+        'INIT:ACQ': _init_acquisition, 'INIT:ALL': _init_all, 'INIT': _init_all, 'FETC:CURR?': _fetch_current,
+        'ABOR:ACQ': _abort_acquisition, 'ABOR:ALL': _abort_all, 'ABOR': _abort_all,
+        'SENS:CURR:RANG:AUTO': _range_auto, 'SENS:CURR:RANG:UPP': _range_upper, 'SENS:CURR:RANG': _range_upper,
+        'SENS:CURR:RANG:AUTO:LLIM': _range_llim, 'SENS:CURR:RANG:AUTO:ULIM': _range_ulim,
+        'SENS:CURR:RANG?': _range_query, 'SENS:CURR:RANG:UPP?': _range_query,
+        'SENS:CURR:APER': _aperture, 'SENS:CURR:APER:AUTO': _aperture_auto,
+        'SENS:CURR:APER:AUTO:MODE': _aperture_mode,
+        'SENS:CURR:AVER:STAT': _average_state, 'SENS:CURR:AVER:COUN': _average_count,
+        'SENS:CURR:AVER:TCON': _average_mode, 'SENS:CURR:MED:STAT': _median_state,
+        'SENS:CURR:MED:RANK': _median_rank, 'INP:STAT': _input_state, 'INP': _input_state,
+        'OUTP:STAT': _output_state, 'OUTP': _output_state, 'SOUR:VOLT': _source_level,
+        'SOUR:VOLT?': _source_level_query, 'SOUR:VOLT:RANG': _source_range, 'SOUR:VOLT:MODE': _source_mode,
+        'SOUR:LIST:VOLT': _source_list,
+        'TRIG:ACQ:SOUR': _acq_trigger_source, 'TRIG:ACQ:TIM': _acq_trigger_timer,
+        'TRIG:ACQ:COUN': _acq_trigger_count, 'TRIG:TRAN:SOUR': _tran_trigger_source,
+        'TRIG:TRAN:TIM': _tran_trigger_timer, 'TRIG:TRAN:COUN': _tran_trigger_count,
+        'FORM:ELEM:SENS': _format_elements, 'FORM:DATA': _format_data, 'FORM': _format_data,
+        'FORM:BORD': _format_byte_order,
+        'TRAC:FEED:CONT': _trace_feed_control, 'TRAC:CLE': _trace_clear, 'TRAC:POIN': _trace_points,
+        'TRAC:FEED': _trace_feed, 'TRAC:POIN:ACT?': _trace_points_actual, 'TRAC:DATA?': _trace_data,
+    }
+
+    # --------------- INSTRUMENT MODEL --------------- #
+
+    def _check_session(self):
+        """ Raises a visa error if the session is closed or the connection is lost.
+
+        :exception VisaIOError: If the session is closed or the connection is lost
+        :return: None
+        """
+
+        if not self.is_open or not self.connected:
+            raise VisaIOError(constants.StatusCode.error_timeout)
+
+    def _now(self):
+        """ Returns the simulated time in s (real time divided by time_scale, or the virtual clock).
+
+        :return: time in s
+        """
+
+        if self.time_scale > 0:
+            return (time.perf_counter() - self.t_origin) / self.time_scale
+
+        return self.virtual_time
+
+    def _advance(self, t):
+        """ Waits until the simulated time t is reached (sleeps or advances the virtual clock).
+
+        :param t: simulated time in s
+        :return: None
+        """
+
+        if self.time_scale > 0:
+            duration = (t - self._now()) * self.time_scale
+            if duration > 0:
+                time.sleep(duration)
+        else:
+            self.virtual_time = max(self.virtual_time, t)
+
+    def _update_opc(self):
+        """ Sets the operation complete bit of the event status register if all pending operations are completed.
+
+        :return: None
+        """
+
+        if self.opc_pending and (self.acquisition is None or self._now() >= self.acquisition['end']):
+            self.esr |= 1
+            self.opc_pending = False
+
+    def _conversion_time(self):
+        """ Returns the duration of one reading: aperture time times the repeating average count.
+
+        :return: duration in s
+        """
+
+        if self.aperture_auto:
+            aperture = AUTO_APERTURES[self.aperture_mode]
+        else:
+            aperture = self.aperture
+
+        if self.average_state and self.average_mode == 'REP':
+            aperture *= self.average_count
+
+        return aperture
+
+    def _noise(self, range_index):
+        """ Returns the rms noise of a reading in A for a given range (reduced by the filters).
+
+        :param range_index: range index (0: 2 pA, 10: 20 mA)
+        :return: rms noise in A
+        """
+
+        aperture = AUTO_APERTURES[self.aperture_mode] if self.aperture_auto else self.aperture
+        noise = NOISE_RANGE_FRACTION * RANGES[range_index] * pow(NOISE_REFERENCE_APERTURE / aperture, 0.5)
+        if self.average_state:
+            noise /= pow(self.average_count, 0.5)
+        if self.median_state:
+            noise /= pow(2 * self.median_rank + 1, 0.5)
+
+        return noise
+
+    @staticmethod
+    def _range_from_value(value):
+        """ Returns the index of the smallest range covering a given value.
+
+        :param value: 'MAX', 'MIN', 'DEF' or value in A
+        :return: range index
+        """
+
+        if value.startswith('MAX'):
+            return len(RANGES) - 1
+        if value.startswith('MIN'):
+            return 0
+        if value.startswith('DEF'):
+            return len(RANGES) - 1
+
+        current = abs(float(value))
+        for index, upper in enumerate(RANGES):
+            if current <= upper * 1.0001:
+                return index
+
+        raise ValueError
+
+    def _change_range(self, index):
+        """ Changes the range and waits for the range change delay.
+
+        :param index: new range index
+        :return: None
+        """
+
+        if index != self.range_index:
+            self.range_index = index
+            self._advance(self._now() + RANGE_CHANGE_DELAYS[index])
+
+    def _output_voltage(self, t):
+        """ Returns the source output voltage at a given time (fixed level or list sweep).
+
+        :param t: simulated time in s
+        :return: voltage in V
+        """
+
+        if not self.output_state:
+            return 0.0
+
+        # list sweep: voltage of the list point at time t
+        if self.source_mode == 'LIST' and self.acquisition is not None and self.acquisition['sweep']:
+            elapsed = t - self.acquisition['start']
+            if elapsed >= 0:
+                step = min(int(elapsed / self.tran_trigger_timer), self.tran_trigger_count - 1)
+                return self.source_list[step % len(self.source_list)]
+
+        return self.source_level
+
+    def _add_voltage_event(self, t):
+        """ Records the applied voltage (source output and external voltage) at a given time.
+
+        :param t: simulated time in s
+        :return: None
+        """
+        self.voltage_events.append([t, self._output_voltage(t) + self.external_voltage])
+
+    def _applied_voltage(self, t):
+        """ Returns the voltage applied to the specimen at a given time.
+
+        :param t: simulated time in s
+        :return: voltage in V
+        """
+
+        voltage = 0.0
+        for event in self.voltage_events:
+            if event[0] <= t:
+                voltage = event[1]
+
+        return voltage
+
+    def _specimen_current(self, t):
+        """ Returns the specimen current at a given time: dc conductance current plus the Curie-von Schweidler
+        polarization current of all voltage steps (superposition).
+
+        :param t: simulated time in s
+        :return: current in A
+        """
+
+        times = numpy.array([event[0] for event in self.voltage_events])
+        voltages = numpy.array([event[1] for event in self.voltage_events])
+
+        # voltage steps before t
+        steps = numpy.diff(numpy.concatenate(([0.0], voltages)))
+        valid = (times <= t) & (steps != 0)
+        if not valid.any():
+            return 0.0
+
+        elapsed = numpy.maximum(t - times[valid], self.polarization_min_time)
+        polarization = self.polarization_amplitude * numpy.power(elapsed, -self.polarization_exponent)
+
+        return float(self.conductance * self._applied_voltage(t) + numpy.sum(steps[valid] * polarization))
+
+    def _start_acquisition(self, with_source, count=None, timer=None):
+        """ Starts an acquisition (and a list sweep if requested and the source is in list mode).
+
+        :param with_source: True if started with INIT:ALL (source list sweep)
+        :param count: number of readings, default trigger count
+        :param timer: True for timer triggered readings, default trigger source
+        :return: None
+        """
+
+        now = self._now()
+        if count is None:
+            count = self.acq_trigger_count
+        if timer is None:
+            timer = self.acq_trigger_source.startswith('TIM')
+
+        conversion_time = self._conversion_time()
+        interval = max(self.acq_trigger_timer, conversion_time) if timer else conversion_time
+
+        self.acquisition = {'start': now, 'count': count, 'interval': interval, 'conversion': conversion_time,
+                            'end': now + (count - 1) * interval + conversion_time, 'trace': self.trace_feed,
+                            'sweep': with_source and self.source_mode == 'LIST', 'readings': {}}
+
+        # list sweep: record all voltage steps in advance
+        if self.acquisition['sweep']:
+            for step in range(self.tran_trigger_count):
+                t = now + step * self.tran_trigger_timer
+                self.voltage_events.append([t, self._output_voltage(t) + self.external_voltage])
+
+    def _abort(self):
+        """ Aborts the running acquisition, readings which are not completed are discarded.
+
+        :return: None
+        """
+
+        if self.acquisition is not None and self._now() < self.acquisition['end']:
+            self.acquisition['count'] = self._completed_readings()
+            self.acquisition['end'] = self._now()
+            self.acquisition['sweep'] = False
+        self.opc_pending = False
+
+    def _completed_readings(self):
+        """ Returns the number of completed readings of the acquisition.
+
+        :return: number of readings
+        """
+
+        acquisition = self.acquisition
+        elapsed = self._now() - acquisition['start'] - acquisition['conversion']
+        if elapsed < 0:
+            return 0
+
+        return min(acquisition['count'], int(elapsed / acquisition['interval'] + 1e-9) + 1)
+
+    def _reading(self, index):
+        """ Returns a reading of the acquisition (generated on first access).
+
+        :param index: index of the reading
+        :return: dict {'CURR': current in A, 'TIME': timestamp in s, 'SOUR': source voltage in V}
+        """
+
+        acquisition = self.acquisition
+        reading = acquisition['readings'].get(index)
+        if reading is not None:
+            return reading
+
+        trigger_time = acquisition['start'] + index * acquisition['interval']
+        t = trigger_time + acquisition['conversion'] / 2
+
+        # ammeter input disabled: input is internally connected to gnd
+        current = self._specimen_current(t) if self.input_state else 0.0
+
+        # range: manual or smallest range within the auto range limits covering the current
+        range_index = self.range_index
+        if self.range_auto:
+            range_index = self.auto_llim
+            while range_index < self.auto_ulim and abs(current) > RANGES[range_index]:
+                range_index += 1
+            self.range_index = range_index
+
+        current += random.gauss(0, self._noise(range_index))
+        if abs(current) > RANGES[range_index] * 1.05:
+            current = OVERFLOW
+
+        reading = {'CURR': current, 'TIME': trigger_time - self.timestamp_origin,
+                   'SOUR': self._output_voltage(trigger_time)}
+        acquisition['readings'][index] = reading
+
+        return reading
+
+    def _ordered_elements(self):
+        """ Returns the enabled data elements in the output order of the instrument.
+
+        :return: list of elements
+        """
+        return [element for element in ['CURR', 'TIME', 'SOUR'] if element in self.elements]
+
+    def _format_values(self, values):
+        """ Formats measurement data according to the data format (ascii or definite length block).
+
+        :param values: list of values
+        :return: string (ascii) or bytes (REAL,64)
+        """
+
+        if self.data_format == 'REA':
+            dtype = '>f8' if self.byte_order == 'NORM' else '<f8'
+            data = numpy.asarray(values, dtype=dtype).tobytes()
+            length = str(len(data))
+            return b'#' + str(len(length)).encode() + length.encode() + data
+
+        return ','.join('%+.6E' % value for value in values)
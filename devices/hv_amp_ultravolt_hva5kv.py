@@ -1,5 +1,8 @@
+import threading
+import time
+import numpy
 from parameters import Parameters
-from labjack.ljm import LJMError
+from devices.labjack_t7pro import LJMError
 
 
 class HVAmp:
@@ -11,9 +14,13 @@ class HVAmp:
 
     Methods
     ---------
-    set_voltage()   Setting the high voltage amplifier output voltage in V  (0-5000 V)
-    get_voltage()   Returns the currently applied voltage in V using the voltage monitor output
-    get_current()   Returns the currently applied current in A using the current monitor output
+    set_reference_voltage()     Setting up the 10 V precision reference voltage
+    set_voltage()               Setting the high voltage amplifier output voltage in V  (0-5000 V)
+    get_voltage()               Returns the currently applied voltage in V using the voltage monitor output
+    get_current()               Returns the currently applied current in A using the current monitor output
+    convert_voltage_monitor()   Converts the voltage monitor signal in V to the applied voltage in V
+    convert_current_monitor()   Converts the current monitor signal in V to the applied current in A
+    stop_waveforms()            Stops all waveforms of this amplifier (call before setting the voltage to zero)
     """
 
     def __init__(self, labjack_connection):
@@ -28,7 +35,19 @@ class HVAmp:
         # initialize var for voltage set by user in V
         self.user_voltage = 0
 
+        # waveform generators of this amplifier (instances of HVAmpWaveform register themselves)
+        self.waveforms = []
+
         # set up 10 V precision reference voltage
+        self.set_reference_voltage()
+
+    def set_reference_voltage(self):
+        """ Set up the 10 V precision reference voltage via LJ DAC Tick. Must be repeated after a labjack reconnect.
+
+        :return: None
+        """
+
+        # try to set the reference voltage
         try:
             self.lj_connection.ljtick_dac_set_analog_out(Parameters.LJ_ANALOG_OUT_HVA_REF, 10.0)
         except (TypeError, ValueError, LJMError):
@@ -81,8 +100,7 @@ class HVAmp:
         except (TypeError, ValueError, LJMError):
             pass
         else:
-            # map the measured voltage (0-10V) to real voltage (0-5kV)
-            voltage = result*500
+            voltage = self.convert_voltage_monitor(result)
 
         return voltage
 
@@ -101,7 +119,298 @@ class HVAmp:
         except (TypeError, ValueError, LJMError):
             pass
         else:
-            # map the measured analog current signal (0-10V) to the real current (0-200uA) and convert to A
-            current = result*20*0.001*0.001
+            current = self.convert_current_monitor(result)
 
         return current
+
+    def stop_waveforms(self):
+        """ Stops all running waveforms of this amplifier and waits until their timing threads are finished.
+        Must be called by safety functions before the voltage is set to zero, otherwise the next setpoint of a
+        running waveform would override the zero voltage.
+
+        :return: None
+        """
+
+        for waveform in list(self.waveforms):
+            waveform.stop()
+
+    @staticmethod
+    def convert_voltage_monitor(result):
+        """ Convert the voltage monitor signal (0-10V) to the applied voltage in V.
+
+        :param result: voltage monitor signal in V
+        :return: Applied voltage in V
+        """
+
+        # map the measured voltage (0-10V) to real voltage (0-5kV)
+        return result*500
+
+    @staticmethod
+    def convert_current_monitor(result):
+        """ Convert the current monitor signal (0-10V) to the applied current in A.
+
+        :param result: current monitor signal in V
+        :return: Applied current in A
+        """
+
+        # map the measured analog current signal (0-10V) to the real current (0-200uA) and convert to A
+        return result*20*0.001*0.001
+
+
+class HVAmpWaveform:
+    """ This class provides a timed voltage waveform generator for the high voltage amplifier.
+    A waveform is a list of setpoints [time in s, voltage in V]. The setpoints are applied by a dedicated timing thread
+    which schedules every setpoint on an absolute time base (no accumulating delays), i.e. the GUI thread is not blocked.
+    The achieved timing of every setpoint is recorded and can be compared to the planned timing.
+
+    Note: LJM stream-out is not available for the LJTick-DAC (I2C), the setpoints are written command-response.
+
+    Note to safety: the safety state is checked before every setpoint, the waveform stops if the safety circuit is
+    not closed. Safety functions stop all waveforms with HVAmp.stop_waveforms() before the voltage is set to zero.
+
+    Methods
+    ---------
+    ramp()              Returns the setpoints of a linear ramp with a given slew rate
+    staircase()         Returns the setpoints of a staircase with a given dwell time per level
+    from_points()       Returns the setpoints of an arbitrary point list, optionally with limited slew rate
+    start()             Starts applying a waveform in the timing thread
+    stop()              Stops the waveform (voltage remains at the last applied setpoint)
+    wait()              Waits until the waveform is finished
+    is_running()        Returns if a waveform is running (True/False)
+    get_timing_report() Returns the planned and achieved timing of the last waveform
+
+    """
+
+    def __init__(self, hvamp, relays):
+        """ Constructor of the class HVAmpWaveform. Registers the waveform generator at the amplifier.
+
+        :param hvamp: instance of the class HVAmp
+        :param relays: instance of the class Relays (safety state)
+        """
+
+        # init class vars for the high voltage amplifier and the relays, register at the amplifier
+        self.hvamp = hvamp
+        self.relays = relays
+        self.hvamp.waveforms.append(self)
+
+        # True if the last waveform was stopped because the safety circuit was not closed
+        self.safety_stop = False
+
+        # timing records of the last waveform: planned and achieved time in s (relative to start), voltage in V
+        self.planned_times = []
+        self.actual_times = []
+        self.voltages = []
+
+        # thread handling
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    @staticmethod
+    def _slew(t_start, v_start, v_stop, slew_rate, step_interval):
+        """ Returns the intermediate setpoints of a slew rate limited transition (without the start point).
+
+        :param t_start: start time in s
+        :param v_start: start voltage in V
+        :param v_stop: stop voltage in V
+        :param slew_rate: slew rate in V/s
+        :param step_interval: time between two setpoints in s
+        :return: list of setpoints [time in s, voltage in V], last setpoint is [end time, v_stop]
+        """
+
+        # check input parameters
+        if slew_rate <= 0 or step_interval <= 0:
+            raise ValueError
+
+        # number of steps needed for the transition
+        duration = abs(v_stop - v_start) / slew_rate
+        steps = max(1, int(numpy.ceil(duration / step_interval)))
+
+        return [[t_start + duration * i / steps, v_start + (v_stop - v_start) * i / steps] for i in range(1, steps + 1)]
+
+    @staticmethod
+    def ramp(start_voltage, stop_voltage, slew_rate, step_interval=None):
+        """ Returns the setpoints of a linear ramp starting at t = 0 s.
+
+        :param start_voltage: start voltage in V
+        :param stop_voltage: stop voltage in V
+        :param slew_rate: slew rate in V/s
+        :param step_interval: time between two setpoints in s, default Parameters.HVAMP_WAVEFORM_STEP_INTERVAL
+        :return: list of setpoints [time in s, voltage in V]
+        """
+
+        if step_interval is None:
+            step_interval = Parameters.HVAMP_WAVEFORM_STEP_INTERVAL
+
+        return [[0, start_voltage]] + HVAmpWaveform._slew(0, start_voltage, stop_voltage, slew_rate, step_interval)
+
+    @staticmethod
+    def staircase(levels, dwell_time, slew_rate=None, step_interval=None):
+        """ Returns the setpoints of a staircase starting at t = 0 s with the first level.
+        Each level is held for the dwell time after it is reached.
+
+        :param levels: list of voltages in V
+        :param dwell_time: hold time per level in s
+        :param slew_rate: slew rate in V/s between levels, None for steps
+        :param step_interval: time between two setpoints in s, default Parameters.HVAMP_WAVEFORM_STEP_INTERVAL
+        :return: list of setpoints [time in s, voltage in V]
+        """
+
+        if step_interval is None:
+            step_interval = Parameters.HVAMP_WAVEFORM_STEP_INTERVAL
+
+        # first level at t = 0
+        points = [[0, levels[0]]]
+        t = dwell_time
+
+        # transition to every further level and hold it
+        for level in levels[1:]:
+            if slew_rate is None:
+                points.append([t, level])
+            else:
+                points += HVAmpWaveform._slew(t, points[-1][1], level, slew_rate, step_interval)
+            t = points[-1][0] + dwell_time
+
+        # hold last level until end of dwell time
+        points.append([t, levels[-1]])
+
+        return points
+
+    @staticmethod
+    def from_points(points, slew_rate=None, step_interval=None):
+        """ Returns the setpoints of an arbitrary point list. Each voltage is applied at the given time.
+        If a slew rate is given, every voltage change is replaced by a ramp starting at the given time.
+
+        :param points: list of [time in s, voltage in V], times must be increasing
+        :param slew_rate: slew rate in V/s, None for steps
+        :param step_interval: time between two setpoints in s, default Parameters.HVAMP_WAVEFORM_STEP_INTERVAL
+        :exception ValueError: if times are not increasing or a ramp does not finish before the next point
+        :return: list of setpoints [time in s, voltage in V]
+        """
+
+        if step_interval is None:
+            step_interval = Parameters.HVAMP_WAVEFORM_STEP_INTERVAL
+
+        # check if times are increasing
+        for i in range(1, len(points)):
+            if points[i][0] <= points[i - 1][0]:
+                raise ValueError
+
+        if slew_rate is None:
+            return [list(point) for point in points]
+
+        # replace every voltage change by a ramp
+        result = [list(points[0])]
+        for i in range(1, len(points)):
+            ramp = HVAmpWaveform._slew(points[i][0], result[-1][1], points[i][1], slew_rate, step_interval)
+            if i + 1 < len(points) and ramp[-1][0] > points[i + 1][0]:
+                raise ValueError
+            result += ramp
+
+        return result
+
+    def start(self, points):
+        """ Starts applying a waveform in the timing thread. The first setpoint is applied immediately (t = 0).
+
+        :param points: list of setpoints [time in s, voltage in V], see ramp(), staircase() and from_points()
+        :exception ValueError: if a waveform is already running or a voltage is out of range (-5000 V to 5000 V)
+        :return: None
+        """
+
+        # check if already running
+        if self.is_running():
+            raise ValueError
+
+        # check voltage range before starting
+        for point in points:
+            if point[1] < -5000 or point[1] > 5000:
+                raise ValueError
+
+        # reset timing records and safety stop flag
+        self.planned_times = []
+        self.actual_times = []
+        self.voltages = []
+        self.safety_stop = False
+
+        # start timing thread
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, args=(points,), name="HVAmpWaveform", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """ Stops the waveform. The voltage remains at the last applied setpoint.
+
+        :return: None
+        """
+
+        self.stop_event.set()
+        self.wait()
+
+    def wait(self, timeout=None):
+        """ Waits until the waveform is finished.
+
+        :param timeout: maximum waiting time in s, None for no limit
+        :return: True if the waveform is finished, False if the timeout is reached
+        """
+
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+        return not self.is_running()
+
+    def is_running(self):
+        """ Returns if a waveform is running.
+
+        :return: True if running, False otherwise
+        """
+        return self.thread is not None and self.thread.is_alive()
+
+    def get_timing_report(self):
+        """ Returns the planned and achieved timing of the last (or running) waveform.
+
+        :return: dict with 'planned' and 'actual' times in s, 'voltages' in V, 'deviations' in s (actual - planned),
+                 'max_deviation' and 'mean_deviation' (absolute) in s
+        """
+
+        deviations = numpy.array(self.actual_times) - numpy.array(self.planned_times[:len(self.actual_times)])
+
+        report = {'planned': list(self.planned_times), 'actual': list(self.actual_times),
+                  'voltages': list(self.voltages), 'deviations': deviations.tolist(),
+                  'max_deviation': float(numpy.max(numpy.abs(deviations))) if len(deviations) > 0 else None,
+                  'mean_deviation': float(numpy.mean(numpy.abs(deviations))) if len(deviations) > 0 else None}
+
+        return report
+
+    def _run(self, points):
+        """ Timing thread. Applies all setpoints at their planned time on an absolute time base.
+
+        :param points: list of setpoints [time in s, voltage in V]
+        :return: None
+        """
+
+        t_zero = time.perf_counter()
+
+        for point in points:
+            # wait until planned time, sleep coarse and busy wait for the last milliseconds
+            while True:
+                remaining = t_zero + point[0] - time.perf_counter()
+                if remaining <= 0 or self.stop_event.is_set():
+                    break
+                if remaining > 0.002:
+                    self.stop_event.wait(remaining - 0.002)
+
+            if self.stop_event.is_set():
+                break
+
+            # check safety state before every write -> DON'T REMOVE, SAFETY CRITICAL
+            if not self.relays.safety_state == "closed":
+                self.safety_stop = True
+                if Parameters.DEBUG:
+                    print("waveform stopped: safety circuit is not closed")
+                break
+
+            # apply setpoint and record timing
+            t_actual = time.perf_counter() - t_zero
+            self.hvamp.set_voltage(int(round(point[1])))
+            self.planned_times.append(point[0])
+            self.actual_times.append(t_actual)
+            self.voltages.append(int(round(point[1])))
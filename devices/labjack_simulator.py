@@ -0,0 +1,528 @@
+"""
+This module provides an in-process simulation of the labjack ljm library for a Labjack T7-Pro in the mviss test setup.
+It can be used as backend of the class LabjackConnection (see parameter 'simulated') in order to run and benchmark the
+gui, safety circuit, relays, hvamp and humidity sensor without hardware.
+
+Simulated setup:
+- LJTick-DAC (TDAC6: hvamp reference, TDAC7: hvamp control) -> hvamp output voltage = 500 * control voltage
+- HV probe (AIN0, 1:1000) measures the hvamp output voltage if the HV relay (FIO2) is closed
+- HVAmp voltage and current monitors (AIN2, AIN3), HTM2500LF temperature (AIN10) and humidity (AIN11)
+- Pilz safety switches S1 (FIO4) and S2 (FIO5), relays (FIO0-FIO3), all digital states via DIO_STATE
+- Stream mode (eStreamStart, eStreamRead, eStreamStop) with data generated in real time
+
+Latency model: every transaction costs a command overhead plus the conversion time of every analog input read
+according to its resolution index and settling time (T7-Pro datasheet, e.g. 12-bit resolution -> 159 ms).
+All latencies are multiplied by 'time_scale' (0 disables the latency model).
+"""
+
+import random
+import threading
+import time
+import numpy
+
+try:
+    from labjack.ljm import LJMError
+except Exception:
+    class LJMError(Exception):
+        """ Replacement of the labjack LJMError if the ljm library is not installed.
+        """
+
+        def __init__(self, errorCode=None, errorAddress=None, errorString=None):
+            self.errorCode = errorCode
+            self.errorAddress = errorAddress
+            self.errorString = errorString
+            super().__init__(errorString)
+
+
+# ljm data types
+UINT16 = 0
+UINT32 = 1
+INT32 = 2
+FLOAT32 = 3
+
+# approximate command-response AIN sample times in s of the T7-Pro for resolution index 1-12 (±10 V range)
+# resolution index 0 corresponds to index 8 (T7-Pro default)
+AIN_SAMPLE_TIMES = [0.00066, 0.00004, 0.00004, 0.00005, 0.00007, 0.00011, 0.00019, 0.00034, 0.00066, 0.0035, 0.0134,
+                    0.0662, 0.159]
+
+# approximate rms noise in V of the T7-Pro for resolution index 0-12 (±10 V range)
+AIN_NOISE = [0.00004, 0.0002, 0.00014, 0.0001, 0.00008, 0.00006, 0.00005, 0.00004, 0.00004, 0.000008, 0.000004,
+             0.000002, 0.0000015]
+
+
+def _build_register_table():
+    """ Builds the register table of all simulated registers.
+
+    :return: dict {name: (address, data type)}
+    """
+
+    table = {}
+    for i in range(14):
+        table["AIN" + str(i)] = (2 * i, FLOAT32)
+        table["AIN" + str(i) + "_RANGE"] = (40000 + 2 * i, FLOAT32)
+        table["AIN" + str(i) + "_NEGATIVE_CH"] = (41000 + i, UINT16)
+        table["AIN" + str(i) + "_RESOLUTION_INDEX"] = (41500 + i, UINT16)
+        table["AIN" + str(i) + "_SETTLING_US"] = (42000 + 2 * i, FLOAT32)
+    for i in range(8):
+        table["FIO" + str(i)] = (2000 + i, UINT16)
+        table["EIO" + str(i)] = (2008 + i, UINT16)
+        table["TDAC" + str(i)] = (30000 + 2 * i, FLOAT32)
+    for i in range(4):
+        table["CIO" + str(i)] = (2016 + i, UINT16)
+    for i in range(3):
+        table["MIO" + str(i)] = (2020 + i, UINT16)
+    table["DIO_STATE"] = (2800, UINT32)
+    table["DIO_DIRECTION"] = (2850, UINT32)
+    table["DIO_INHIBIT"] = (2900, UINT32)
+    table["STREAM_SCANRATE_HZ"] = (4002, FLOAT32)
+    table["STREAM_SETTLING_US"] = (4008, FLOAT32)
+    table["STREAM_RESOLUTION_INDEX"] = (4010, UINT32)
+    table["STREAM_CLOCK_SOURCE"] = (4014, UINT32)
+    table["STREAM_TRIGGER_INDEX"] = (4024, UINT32)
+
+    return table
+
+
+# register table {name: (address, data type)} and reverse table {address: name}
+REGISTERS = _build_register_table()
+ADDRESSES = {value[0]: key for key, value in REGISTERS.items()}
+
+# digital port offsets in the DIO_STATE bitmask
+PORT_OFFSETS = {"FIO": 0, "EIO": 8, "CIO": 16, "MIO": 20}
+
+
+class SimulatedLJM:
+    """ This class simulates the subset of the labjack ljm library used in this project (same function signatures).
+    An instance can be used in place of the module labjack.ljm.
+
+    Methods
+    ---------
+    openS()                 Opens the simulated device and returns a handle
+    close()                 Closes the handle
+    getHandleInfo()         Returns the handle information
+    numberToIP()            Converts a number to an IP string
+    namesToAddresses()      Returns addresses and data types of register names
+    eReadName(s)()          Reads register(s) by name
+    eWriteName(s)()         Writes register(s) by name
+    eReadAddress(es)()      Reads register(s) by address
+    eWriteAddress(es)()     Writes register(s) by address
+    eStreamStart()          Starts the stream mode
+    eStreamRead()           Returns the next stream block (blocks until available)
+    eStreamStop()           Stops the stream mode
+    disconnect()            Simulates a connection loss (all calls fail until openS is called again)
+
+    """
+
+    LJMError = LJMError
+
+    def __init__(self, time_scale=1.0, command_latency=0.001, serial_number=470019966):
+        """ Constructor of the class SimulatedLJM.
+
+        :param time_scale: factor for all simulated latencies (0 disables the latency model)
+        :param command_latency: latency of one transaction (usb round trip) in s
+        :param serial_number: serial number of the simulated device
+        """
+
+        # latency model settings
+        self.time_scale = time_scale
+        self.command_latency = command_latency
+
+        # simulated device
+        self.serial_number = serial_number
+        self.handle = None
+        self.next_handle = 1
+        self.connected = True
+
+        # register values {name: value}, all registers start at 0 (device default)
+        self.values = {name: 0 for name in REGISTERS}
+
+        # digital states: inputs (bit = 1 is HIGH), outputs start HIGH (relays off, low-active)
+        self.dio_state = 0x7FFFFF
+        self.dio_direction = 0
+
+        # environment: safety switches closed (S1 HIGH, S2 LOW), test cell temperature in °C and humidity in %
+        self.test_cell_closed = True
+        self.hv_box_closed = True
+        self.temperature = 25.0
+        self.humidity = 45.0
+
+        # specimen current in A measured by the hvamp current monitor
+        self.hvamp_current = 0
+
+        # stream state
+        self.stream_addresses = None
+        self.stream_scan_rate = None
+        self.stream_scans_per_read = None
+        self.stream_start = None
+        self.stream_scans_read = 0
+
+        # lock, the ljm library is thread safe
+        self.lock = threading.RLock()
+
+    # --------------- DEVICE HANDLING --------------- #
+
+    def openS(self, deviceType, connectionType, identifier):
+        """ Opens the simulated device.
+
+        :return: device handle
+        """
+
+        with self.lock:
+            self._sleep(self.command_latency)
+            if not str(identifier) in ["ANY", str(self.serial_number)]:
+                raise LJMError(1227, None, "LJME_DEVICE_NOT_FOUND")
+            self.connected = True
+            self.handle = self.next_handle
+            self.next_handle += 1
+
+            return self.handle
+
+    def close(self, handle):
+        """ Closes the handle.
+
+        :return: None
+        """
+
+        with self.lock:
+            self._check_handle(handle)
+            self.handle = None
+
+    def getHandleInfo(self, handle):
+        """ Returns the handle information.
+
+        :return: (device type, connection type, serial number, ip address, port, max bytes per MB)
+        """
+
+        self._check_handle(handle)
+
+        return 7, 1, self.serial_number, 0, 0, 64
+
+    @staticmethod
+    def numberToIP(number):
+        """ Converts a number to an IP string.
+
+        :return: IP string
+        """
+        return ".".join(str((int(number) >> shift) & 0xFF) for shift in [24, 16, 8, 0])
+
+    def disconnect(self):
+        """ Simulates a connection loss. All calls fail until openS is called again.
+
+        :return: None
+        """
+
+        with self.lock:
+            self.connected = False
+            self.handle = None
+
+    # --------------- REGISTER ACCESS --------------- #
+
+    @staticmethod
+    def namesToAddresses(numFrames, aNames, aNumRegs=None):
+        """ Returns addresses and data types of register names.
+
+        :return: (list of addresses, list of data types)
+        """
+
+        for name in aNames[:numFrames]:
+            if name not in REGISTERS:
+                raise LJMError(1307, None, "LJME_INVALID_NAME: " + str(name))
+
+        return [REGISTERS[name][0] for name in aNames[:numFrames]], [REGISTERS[name][1] for name in aNames[:numFrames]]
+
+    def eReadName(self, handle, name):
+        """ Reads a register by name.
+
+        :return: value
+        """
+        return self.eReadNames(handle, 1, [name])[0]
+
+    def eReadNames(self, handle, numFrames, aNames):
+        """ Reads registers by name within one transaction.
+
+        :return: list of values
+        """
+
+        with self.lock:
+            self._check_handle(handle)
+            self._check_names(aNames[:numFrames])
+            self._sleep(self._transaction_time(aNames[:numFrames]))
+
+            return [self._read(name) for name in aNames[:numFrames]]
+
+    def eWriteName(self, handle, name, value):
+        """ Writes a register by name.
+
+        :return: None
+        """
+        self.eWriteNames(handle, 1, [name], [value])
+
+    def eWriteNames(self, handle, numFrames, aNames, aValues):
+        """ Writes registers by name within one transaction (in the given order).
+
+        :return: None
+        """
+
+        with self.lock:
+            self._check_handle(handle)
+            self._check_names(aNames[:numFrames])
+            self._sleep(self.command_latency)
+            for i in range(numFrames):
+                self._write(aNames[i], aValues[i])
+
+    def eReadAddress(self, handle, address, dataType):
+        """ Reads a register by address.
+
+        :return: value
+        """
+        return self.eReadNames(handle, 1, [self._name(address)])[0]
+
+    def eReadAddresses(self, handle, numFrames, aAddresses, aDataTypes):
+        """ Reads registers by address within one transaction.
+
+        :return: list of values
+        """
+        return self.eReadNames(handle, numFrames, [self._name(address) for address in aAddresses[:numFrames]])
+
+    def eWriteAddress(self, handle, address, dataType, value):
+        """ Writes a register by address.
+
+        :return: None
+        """
+        self.eWriteNames(handle, 1, [self._name(address)], [value])
+
+    def eWriteAddresses(self, handle, numFrames, aAddresses, aDataTypes, aValues):
+        """ Writes registers by address within one transaction (in the given order).
+
+        :return: None
+        """
+        self.eWriteNames(handle, numFrames, [self._name(address) for address in aAddresses[:numFrames]], aValues)
+
+    # --------------- STREAM MODE --------------- #
+
+    def eStreamStart(self, handle, scansPerRead, numAddresses, aScanList, scanRate):
+        """ Starts the stream mode.
+
+        :return: actual scan rate in Hz
+        """
+
+        with self.lock:
+            self._check_handle(handle)
+            if self.stream_start is not None:
+                raise LJMError(2605, None, "STREAM_IS_ACTIVE")
+            self._check_names([self._name(address) for address in aScanList[:numAddresses]])
+            self._sleep(self.command_latency)
+            self.stream_addresses = list(aScanList[:numAddresses])
+            self.stream_scan_rate = float(scanRate)
+            self.stream_scans_per_read = scansPerRead
+            self.stream_scans_read = 0
+            self.stream_start = time.perf_counter()
+
+            return self.stream_scan_rate
+
+    def eStreamRead(self, handle):
+        """ Returns the next stream block, blocks until the block is available (real time).
+
+        :return: (list of interleaved samples, device scan backlog, ljm scan backlog)
+        """
+
+        self._check_handle(handle)
+        if self.stream_start is None:
+            raise LJMError(2620, None, "STREAM_NOT_RUNNING")
+
+        # wait until all scans of the block are sampled
+        scans = self.stream_scans_read + self.stream_scans_per_read
+        remaining = self.stream_start + scans / self.stream_scan_rate - time.perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
+
+        with self.lock:
+            self._check_handle(handle)
+            if self.stream_start is None:
+                raise LJMError(2620, None, "STREAM_NOT_RUNNING")
+            names = [self._name(address) for address in self.stream_addresses]
+            noise = AIN_NOISE[int(self.values["STREAM_RESOLUTION_INDEX"])]
+            block = numpy.empty((self.stream_scans_per_read, len(names)))
+            for i in range(len(names)):
+                block[:, i] = self._analog(names[i]) + numpy.random.normal(0, noise, self.stream_scans_per_read)
+            self.stream_scans_read = scans
+            backlog = max(0, int((time.perf_counter() - self.stream_start) * self.stream_scan_rate) - scans)
+
+            return block.ravel().tolist(), backlog, 0
+
+    def eStreamStop(self, handle):
+        """ Stops the stream mode.
+
+        :return: None
+        """
+
+        with self.lock:
+            self._check_handle(handle)
+            if self.stream_start is None:
+                raise LJMError(2620, None, "STREAM_NOT_RUNNING")
+            self.stream_start = None
+
+    # --------------- SIMULATION MODEL --------------- #
+
+    def _check_handle(self, handle):
+        """ Raises an LJMError if the handle is invalid or the device is disconnected.
+
+        :return: None
+        """
+
+        if not self.connected or handle is None or handle != self.handle:
+            raise LJMError(1224, None, "LJME_DEVICE_NOT_OPEN")
+
+    @staticmethod
+    def _check_names(names):
+        """ Raises an LJMError if a register name is invalid.
+
+        :return: None
+        """
+
+        for name in names:
+            if name not in REGISTERS:
+                raise LJMError(1307, None, "LJME_INVALID_NAME: " + str(name))
+
+    @staticmethod
+    def _name(address):
+        """ Returns the register name of an address.
+
+        :return: register name
+        """
+
+        if address not in ADDRESSES:
+            raise LJMError(1226, address, "LJME_INVALID_ADDRESS")
+
+        return ADDRESSES[address]
+
+    def _sleep(self, duration):
+        """ Sleeps for the given (scaled) duration.
+
+        :return: None
+        """
+
+        if self.time_scale > 0 and duration > 0:
+            time.sleep(duration * self.time_scale)
+
+    def _transaction_time(self, names):
+        """ Returns the duration of a read transaction: command latency plus conversion time of all analog inputs.
+
+        :return: duration in s
+        """
+
+        duration = self.command_latency
+        for name in names:
+            if name[0:3] == "AIN" and name[3:].isdigit():
+                duration += AIN_SAMPLE_TIMES[int(self.values[name + "_RESOLUTION_INDEX"])]
+                duration += self.values[name + "_SETTLING_US"] * 1e-6
+
+        return duration
+
+    def _read(self, name):
+        """ Returns the value of a register.
+
+        :return: value
+        """
+
+        # analog inputs
+        if name[0:3] == "AIN" and name[3:].isdigit():
+            noise = AIN_NOISE[int(self.values[name + "_RESOLUTION_INDEX"])]
+            return self._analog(name) + random.gauss(0, noise)
+
+        # digital states
+        if name == "DIO_STATE":
+            return self._digital_state()
+        if name[0:3] in PORT_OFFSETS and name[3:].isdigit():
+            bit = PORT_OFFSETS[name[0:3]] + int(name[3:])
+            # reading a single digital port configures it as input
+            self.dio_direction &= ~(1 << bit)
+            return (self._digital_state() >> bit) & 1
+        if name == "DIO_DIRECTION":
+            return self.dio_direction
+
+        return self.values[name]
+
+    def _write(self, name, value):
+        """ Writes the value of a register.
+
+        :return: None
+        """
+
+        # single digital port: configure as output and set state
+        if name[0:3] in PORT_OFFSETS and name[3:].isdigit():
+            bit = 1 << (PORT_OFFSETS[name[0:3]] + int(name[3:]))
+            self.dio_direction |= bit
+            self.dio_state = (self.dio_state | bit) if value else (self.dio_state & ~bit)
+            return
+
+        # digital bank: only bits not inhibited are written
+        mask = ~int(self.values["DIO_INHIBIT"]) & 0x7FFFFF
+        if name == "DIO_DIRECTION":
+            self.dio_direction = (self.dio_direction & ~mask) | (int(value) & mask)
+        elif name == "DIO_STATE":
+            self.dio_state = (self.dio_state & ~mask) | (int(value) & mask)
+
+        # range check of the LJTick-DAC
+        if name[0:4] == "TDAC" and (value < -10 or value > 10):
+            raise LJMError(2330, REGISTERS[name][0], "LJME_INVALID_VALUE")
+
+        self.values[name] = value
+
+    def _digital_state(self):
+        """ Returns the DIO_STATE bitmask: outputs as written, inputs from the simulated environment.
+
+        :return: bitmask
+        """
+
+        # S1 (FIO4): HIGH if test cell is closed, S2 (FIO5): LOW if high voltage box is closed
+        inputs = 0x7FFFFF
+        if not self.test_cell_closed:
+            inputs &= ~(1 << 4)
+        if self.hv_box_closed:
+            inputs &= ~(1 << 5)
+
+        return (self.dio_state & self.dio_direction) | (inputs & ~self.dio_direction)
+
+    def _relay_closed(self, port):
+        """ Returns if a low-active relay at a given FIO port is closed.
+
+        :return: True if closed, False otherwise
+        """
+
+        bit = 1 << int(port[3:])
+
+        return bool(self.dio_direction & bit) and not bool(self.dio_state & bit)
+
+    def _analog(self, name):
+        """ Returns the noise free signal of an analog input in V according to the simulated setup.
+
+        :return: signal in V
+        """
+
+        # hvamp output voltage (control voltage TDAC7 0-10 V -> 0-5 kV, needs 10 V reference on TDAC6)
+        hvamp_voltage = 500 * self.values["TDAC7"] * min(1.0, self.values["TDAC6"] / 10)
+
+        if name == "AIN0":
+            # hv probe (1:1000), connected via hv relay (FIO2)
+            if self._relay_closed("FIO2"):
+                return hvamp_voltage / 1000
+            return 0.0
+        elif name == "AIN2":
+            # voltage monitor (0-10 V -> 0-5 kV)
+            return hvamp_voltage / 500
+        elif name == "AIN3":
+            # current monitor (0-10 V -> 0-200 uA)
+            return self.hvamp_current / (20 * 0.001 * 0.001)
+        elif name == "AIN10":
+            # htm2500lf ntc (10 kOhm voltage divider at 5 V), inverse steinhart equation
+            t = self.temperature + 273.15
+            x = (8.54942e-4 - 1 / t) / 1.65368e-7
+            y = numpy.sqrt(pow(2.57305e-4 / (3 * 1.65368e-7), 3) + pow(x / 2, 2))
+            resistance = numpy.exp(numpy.cbrt(y - x / 2) - numpy.cbrt(y + x / 2))
+            return float(5 * resistance / (10000 + resistance))
+        elif name == "AIN11":
+            # htm2500lf humidity (RH = 0.0375 * mV - 37.7)
+            return (self.humidity + 37.7) / 0.0375 / 1000
+
+        return 0.0
@@ -0,0 +1,341 @@
+import threading
+import time
+import numpy
+from parameters import Parameters
+from devices.labjack_t7pro import LJMError
+
+
+class RingBuffer:
+    """ This class provides a preallocated ring buffer for multichannel sample blocks based on a numpy array.
+    The buffer is written by a single producer (stream thread) and can be read by several consumers.
+    Read methods return numpy views into the buffer instead of copies. Views are only valid until the producer
+    overwrites the corresponding rows, i.e. consumers must process (or copy) them before the buffer wraps around.
+
+    Methods
+    ---------
+    write()         Writes a block of scans (rows) to the buffer
+    get_views()     Returns the latest n scans as a list of (at most two) numpy views in chronological order
+    read_since()    Returns all scans written since a given absolute scan index as numpy views
+    latest()        Returns the latest scan as numpy view
+    clear()         Resets the buffer
+
+    """
+
+    def __init__(self, capacity, channels):
+        """ Constructor of the class RingBuffer. Preallocates the buffer array.
+
+        :param capacity: number of scans (rows) the buffer can hold
+        :param channels: number of channels (columns) per scan
+        :exception ValueError: if capacity or channels is smaller than 1
+        """
+
+        # check input parameters
+        if capacity < 1 or channels < 1:
+            raise ValueError
+
+        # preallocate buffer (filled with nan until written)
+        self.capacity = capacity
+        self.channels = channels
+        self.data = numpy.full((capacity, channels), numpy.nan)
+
+        # absolute number of scans written since start (write position is total_written % capacity)
+        self.total_written = 0
+
+        # lock for consistent write position updates
+        self.lock = threading.Lock()
+
+    def write(self, block):
+        """ Writes a block of scans to the buffer. Oldest scans are overwritten if the buffer is full.
+
+        :param block: numpy array with shape (number of scans, channels)
+        :return: None
+        :exception ValueError: if the block has the wrong number of channels
+        """
+
+        # check block shape
+        if block.ndim != 2 or block.shape[1] != self.channels:
+            raise ValueError
+
+        # only the latest scans are kept if the block is larger than the buffer
+        if block.shape[0] > self.capacity:
+            skipped = block.shape[0] - self.capacity
+            block = block[skipped:]
+        else:
+            skipped = 0
+
+        # copy block into buffer, split in two parts if the end of the buffer is reached
+        with self.lock:
+            start = (self.total_written + skipped) % self.capacity
+            end = start + block.shape[0]
+            if end <= self.capacity:
+                self.data[start:end] = block
+            else:
+                first_part = self.capacity - start
+                self.data[start:] = block[:first_part]
+                self.data[:end - self.capacity] = block[first_part:]
+            self.total_written += skipped + block.shape[0]
+
+    def get_views(self, n):
+        """ Returns the latest n scans without copying.
+
+        :param n: number of scans, limited to the number of available scans
+        :return: list with one or two numpy views in chronological order (empty if no data is available)
+        """
+
+        with self.lock:
+            total = self.total_written
+
+        return self._views(total - min(n, total, self.capacity), total)
+
+    def read_since(self, index):
+        """ Returns all scans written since a given absolute scan index without copying.
+        Use the returned index for the next call in order to read the stream continuously.
+
+        :param index: absolute scan index of the first scan to return
+        :return: [list of numpy views in chronological order, next index, number of lost scans]
+        """
+
+        with self.lock:
+            total = self.total_written
+
+        # scans older than the buffer capacity are lost (consumer was too slow)
+        lost = max(0, total - self.capacity - index)
+        start = index + lost
+
+        return [self._views(start, total), total, lost]
+
+    def latest(self):
+        """ Returns the latest scan as numpy view.
+
+        :return: numpy view of the latest scan (all channels), None if no data is available
+        """
+
+        with self.lock:
+            total = self.total_written
+
+        if total == 0:
+            return None
+
+        return self.data[(total - 1) % self.capacity]
+
+    def clear(self):
+        """ Resets the buffer.
+
+        :return: None
+        """
+
+        with self.lock:
+            self.data.fill(numpy.nan)
+            self.total_written = 0
+
+    def _views(self, start, end):
+        """ Returns the scans between two absolute scan indices as numpy views.
+
+        :param start: absolute index of the first scan
+        :param end: absolute index after the last scan
+        :return: list with zero, one or two numpy views in chronological order
+        """
+
+        if end <= start:
+            return []
+
+        # map absolute indices to buffer positions
+        start_pos = start % self.capacity
+        end_pos = end % self.capacity
+
+        if start_pos < end_pos:
+            return [self.data[start_pos:end_pos]]
+        elif end_pos == 0:
+            return [self.data[start_pos:]]
+        else:
+            return [self.data[start_pos:], self.data[:end_pos]]
+
+
+class LabjackStream:
+    """ This class implements a hardware timed stream mode acquisition for the Labjack T7-Pro.
+    The analog inputs given in the scan list are sampled by the labjack at a fixed scan rate. A dedicated thread
+    collects the sample blocks via ljm.eStreamRead and pushes them into a preallocated ring buffer.
+    Consumers (e.g. plots, breakdown analysis) read from the buffer without blocking the GUI thread.
+
+    Note: The stream uses the stream resolution index and settling time (see Parameters), not the command-response
+    configuration of the analog inputs. Samples skipped by the labjack (auto recovery) are stored as nan.
+
+    Methods
+    ---------
+    start()             Configures and starts the stream and the stream thread
+    stop()              Stops the stream and the stream thread
+    is_running()        Returns if the stream is running (True/False)
+    get_channel_index() Returns the buffer column of a given analog input port
+    get_timestamps()    Returns the timestamps in s (time.time() base) for a range of absolute scan indices
+
+    Exceptions
+    -----------
+    LJMError: An error was returned from the LJM library call (stream start).
+    ValueError: Invalid scan list or scan rate
+
+    """
+
+    def __init__(self, labjack, scan_list=None, scan_rate=None, scans_per_read=None, buffer_size=None):
+        """ Constructor of the class LabjackStream. Initializes the class vars and preallocates the ring buffer.
+        All parameters which are not given are taken from the Parameters class.
+
+        :param labjack: instance of the class LabjackConnection
+        :param scan_list: list of analog input ports, e.g. ["AIN0", "AIN2"]
+        :param scan_rate: scan rate in Hz
+        :param scans_per_read: number of scans per stream read (block size)
+        :param buffer_size: ring buffer size in scans
+        """
+
+        # init class var for labjack connection
+        self.labjack = labjack
+
+        # init stream settings
+        self.scan_list = list(scan_list) if scan_list is not None else list(Parameters.LJ_STREAM_SCAN_LIST)
+        self.scan_rate = scan_rate if scan_rate is not None else Parameters.LJ_STREAM_SCAN_RATE
+        self.scans_per_read = scans_per_read if scans_per_read is not None else Parameters.LJ_STREAM_SCANS_PER_READ
+        buffer_size = buffer_size if buffer_size is not None else Parameters.LJ_STREAM_BUFFER_SIZE
+
+        # check stream settings
+        if len(self.scan_list) == 0 or self.scan_rate <= 0 or self.scans_per_read < 1:
+            raise ValueError
+
+        # preallocated ring buffer, one column per scan list entry
+        self.buffer = RingBuffer(buffer_size, len(self.scan_list))
+
+        # actual scan rate returned by the labjack (may differ slightly from the requested scan rate)
+        self.actual_scan_rate = None
+
+        # time.time() of the first scan (used for timestamp calculation)
+        self.start_time = None
+
+        # stream diagnostics: device/ljm backlog of the last read, skipped samples and error of the stream thread
+        self.device_backlog = 0
+        self.ljm_backlog = 0
+        self.skipped_samples = 0
+        self.error = None
+
+        # thread handling
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    def start(self):
+        """ Configures the stream registers, starts the stream and the stream thread.
+
+        :return: True if the stream was started, False if the labjack is not connected or the stream is running
+        :exception LJMError: An error was returned from the LJM library call
+        """
+
+        # check if already running or not connected
+        if self.is_running():
+            if Parameters.DEBUG:
+                print("Function labjack_stream.start: stream already running!")
+            return False
+
+        if not self.labjack.connection_state:
+            return False
+
+        # configure and start the stream while holding the device lock of the labjack connection
+        with self.labjack.lock:
+            handle = self.labjack.get_handler()
+
+            # configure stream: internal clock, no trigger, resolution and settling time
+            names = ["STREAM_TRIGGER_INDEX", "STREAM_CLOCK_SOURCE", "STREAM_RESOLUTION_INDEX", "STREAM_SETTLING_US"]
+            values = [0, 0, Parameters.LJ_STREAM_RESOLUTION_INDEX, Parameters.LJ_STREAM_SETTLING_US]
+            self.labjack.ljm.eWriteNames(handle, len(names), names, values)
+
+            # resolve scan list addresses and start stream
+            addresses = self.labjack.register_map.resolve_many(self.scan_list)[0]
+            self.actual_scan_rate = self.labjack.ljm.eStreamStart(handle, self.scans_per_read, len(addresses),
+                                                                  addresses, self.scan_rate)
+        self.start_time = time.time()
+
+        if Parameters.DEBUG:
+            print("Stream started with scan rate: ", self.actual_scan_rate, " Hz")
+
+        # reset buffer and diagnostics
+        self.buffer.clear()
+        self.skipped_samples = 0
+        self.error = None
+
+        # start stream thread
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="LabjackStream", daemon=True)
+        self.thread.start()
+
+        return True
+
+    def stop(self):
+        """ Stops the stream thread and the stream.
+
+        :return: None
+        """
+
+        # stop stream thread
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.thread = None
+
+        # stop stream on labjack, ignore errors if stream is already stopped
+        try:
+            with self.labjack.lock:
+                self.labjack.ljm.eStreamStop(self.labjack.get_handler())
+        except (TypeError, LJMError):
+            pass
+
+    def is_running(self):
+        """ Returns if the stream thread is running.
+
+        :return: True if running, False otherwise
+        """
+        return self.thread is not None and self.thread.is_alive()
+
+    def get_channel_index(self, port):
+        """ Returns the buffer column of a given analog input port.
+
+        :param port: analog input port, must be in the scan list
+        :return: column index
+        :exception ValueError: if the port is not in the scan list
+        """
+        return self.scan_list.index(port)
+
+    def get_timestamps(self, start, end):
+        """ Returns the timestamps of a range of scans based on the stream start time and the actual scan rate.
+
+        :param start: absolute index of the first scan
+        :param end: absolute index after the last scan
+        :return: numpy array with timestamps in s
+        """
+        return self.start_time + numpy.arange(start, end) / self.actual_scan_rate
+
+    def _run(self):
+        """ Stream thread. Reads sample blocks from the labjack and pushes them into the ring buffer.
+
+        :return: None
+        """
+
+        handle = self.labjack.get_handler()
+        channels = len(self.scan_list)
+
+        # (!) eStreamRead is not done under the device lock, it waits for the next block and would block all other
+        # accesses for the block duration. Stream data is read from the ljm stream buffer, not via command-response
+        while not self.stop_event.is_set():
+            try:
+                data, self.device_backlog, self.ljm_backlog = self.labjack.ljm.eStreamRead(handle)
+            except (TypeError, LJMError) as error:
+                # stop the stream thread, the labjack connection is handled by the class LabjackConnection
+                self.error = error
+                if Parameters.DEBUG:
+                    print("Stream error: ", error)
+                break
+
+            # reshape interleaved samples to (scans, channels)
+            block = numpy.asarray(data, dtype=float).reshape(-1, channels)
+
+            # mark samples skipped by the labjack (value -9999) as nan
+            skipped = block == -9999.0
+            if skipped.any():
+                self.skipped_samples += int(skipped.sum())
+                block[skipped] = numpy.nan
+
+            self.buffer.write(block)
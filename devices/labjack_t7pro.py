@@ -1,6 +1,139 @@
+import time
+import threading
+from collections import namedtuple
 from parameters import Parameters
-from labjack import ljm
-from labjack.ljm import LJMError
+from devices.labjack_simulator import SimulatedLJM
+
+# the ljm library is only needed for real hardware, the simulated backend runs without it
+try:
+    from labjack import ljm
+    from labjack.ljm import LJMError
+except Exception:
+    ljm = None
+    from devices.labjack_simulator import LJMError
+
+
+class RegisterMap:
+    """ This class resolves labjack register names (e.g. "AIN0", "FIO4", "AIN0_RESOLUTION_INDEX") to their modbus
+    addresses and data types. Each name is resolved only once with ljm.namesToAddresses and cached afterwards,
+    so that frequently called read and write methods can use the faster address based ljm functions.
+
+    Methods
+    ---------
+    resolve()       Returns the address and data type of a given register name
+    resolve_many()  Returns the addresses and data types of several register names
+
+    Exceptions
+    -----------
+    LJMError: An error was returned from the LJM library call (e.g. invalid register name).
+
+    """
+
+    def __init__(self, backend=None):
+        """ Constructor of the class RegisterMap. Initializes the empty register cache.
+
+        :param backend: ljm library (module labjack.ljm or instance of SimulatedLJM), default labjack.ljm
+        """
+
+        # ljm backend used for name resolution
+        self.ljm = backend if backend is not None else ljm
+
+        # register cache: {name: (address, data type)}
+        self.registers = {}
+
+    def resolve(self, name):
+        """ Returns the address and data type of a given register name.
+
+        :param name: register name, e.g. "AIN0"
+        :return: (address, data type)
+        :exception LJMError: if the register name is invalid
+        """
+
+        # resolve name only if not cached yet
+        if name not in self.registers:
+            addresses, data_types = self.ljm.namesToAddresses(1, [name])
+            self.registers[name] = (addresses[0], data_types[0])
+
+        return self.registers[name]
+
+    def resolve_many(self, names):
+        """ Returns the addresses and data types of several register names. Unknown names are resolved at once.
+
+        :param names: list of register names
+        :return: [list of addresses, list of data types] in the same order as names
+        :exception LJMError: if a register name is invalid
+        """
+
+        # resolve all unknown names with a single call
+        unknown = [name for name in names if name not in self.registers]
+        if len(unknown) > 0:
+            addresses, data_types = self.ljm.namesToAddresses(len(unknown), unknown)
+            for i in range(len(unknown)):
+                self.registers[unknown[i]] = (addresses[i], data_types[i])
+
+        return [[self.registers[name][0] for name in names], [self.registers[name][1] for name in names]]
+
+
+class DigitalSnapshot(namedtuple('DigitalSnapshot', ['timestamp', 'dio_state'])):
+    """ This class represents an immutable snapshot of all digital I/O states (DIO_STATE bitmask) of the labjack.
+    Bit assignment: FIO0-7 -> bit 0-7, EIO0-7 -> bit 8-15, CIO0-3 -> bit 16-19, MIO0-2 -> bit 20-22.
+
+    Attributes
+    ---------
+    timestamp   time.time() of the read in s
+    dio_state   DIO_STATE bitmask
+
+    Methods
+    ---------
+    state()         Returns the state of a given digital port ("HIGH" or "LOW")
+    relay_state()   Returns the state of a low-active relay at a given digital output port ("closed" or "open")
+    age()           Returns the age of the snapshot in s
+
+    """
+
+    __slots__ = ()
+
+    # offsets of the port groups in the DIO_STATE bitmask
+    PORT_OFFSETS = {"FIO": 0, "EIO": 8, "CIO": 16, "MIO": 20}
+
+    def state(self, port):
+        """ Returns the state of a given digital port.
+
+        :param port: digital port, e.g. "FIO4"
+        :return: "HIGH" or "LOW"
+        :exception ValueError: if port is invalid
+        """
+
+        # get bit position from given port
+        if port[0:3] not in self.PORT_OFFSETS or not port[3:].isdigit():
+            raise ValueError
+        bit = self.PORT_OFFSETS[port[0:3]] + int(port[3:])
+
+        # map bit to "LOW" or "HIGH"
+        if (int(self.dio_state) >> bit) & 1:
+            return "HIGH"
+        else:
+            return "LOW"
+
+    def relay_state(self, port):
+        """ Returns the state of a relay at a given digital output port.
+        (!) note: relays are low-active. 'LOW' corresponds to 'closed' (!)
+
+        :param port: digital output port, e.g. "FIO2"
+        :return: "closed" or "open"
+        """
+
+        if self.state(port) == "LOW":
+            return "closed"
+        else:
+            return "open"
+
+    def age(self):
+        """ Returns the age of the snapshot.
+
+        :return: age in s
+        """
+        return time.time() - self.timestamp
 
 
 class LabjackConnection:
@@ -13,14 +146,36 @@ class LabjackConnection:
     get_handler()               Returns the connection handler
     get_connection_state()      Returns if the connection is alive or not (False/True/None)
     read_analog()               Reads the analog input value from a given port (0-10V)
+    read_analog_many()          Reads the analog input values from several ports in one transaction (0-10V)
     read_digital()              Reads the digital input value from a given port (LOW/HIGH)
     write_digital()             Write a digital value (LOW/HIGH) to a given port
+    write_digital_bank()        Write digital values (LOW/HIGH) to several ports at once (single DIO_STATE write)
+    read_digital_snapshot()     Reads all digital I/O states in one transaction and returns a DigitalSnapshot
+    get_digital_snapshot()      Returns the latest digital snapshot if recent enough, otherwise reads a new one
     ljtick_dac_set_analog_out() Set the analog output voltage of the DAC LJ-Tick (0-10V)
     set_analog_in_resolution()  Set the bit resolution of a specified analog input port (0-12 bit).
+    set_channel_profile()       Set and apply the analog input configuration profile (resolution, range, settling...)
+    apply_channel_profile()     Write all profile registers which differ from the shadow register cache
 
     Note to analog resolution: the higher the resolution, the slower the sampling speed (12 bit -> 159 ms)
     See datasheet for more information.
 
+    Note to backend: the class uses either the ljm library (real labjack) or the in-process simulation SimulatedLJM
+    (see Parameters.LABJACK_SIMULATED). All other classes access the labjack via this class and run unchanged.
+
+    Note to register access: register names are resolved once by the class RegisterMap. All read and write
+    methods use the address based ljm functions afterwards.
+
+    Note to channel configuration: the analog input profile (see Parameters.LJ_ANALOG_IN_PROFILE) is applied in one
+    batch. A shadow copy of all written configuration registers avoids rewriting unchanged registers. The shadow
+    is cleared when the connection is closed and the profile is re-applied automatically after every (re)connect.
+
+    Note to threads: every access to the connection handle (connect, close, all reads and writes) is serialized by
+    the device lock (self.lock), i.e. accesses of several threads (gui, acquisition scheduler, labjack supervisor,
+    concurrent measurement path) do not interleave and a failed access cannot close a handle which was reopened
+    by another thread in the meantime. Other threads can hold the lock for a sequence of accesses
+    ('with labjack.lock: ...').
+
     Exceptions
     -----------
     TypeError: deviceType or connectionType are not strings.
@@ -29,17 +184,51 @@ class LabjackConnection:
 
     """
 
-    def __init__(self):
+    # mapping of channel profile settings to register name suffixes, e.g. AIN0 + _RANGE
+    PROFILE_REGISTERS = {'resolution_index': "_RESOLUTION_INDEX", 'range': "_RANGE", 'settling_us': "_SETTLING_US",
+                         'negative_channel': "_NEGATIVE_CH"}
+
+    def __init__(self, simulated=None):
         """ Constructor of the class LabjackConnection.
          Initialize the class vars and setup a labjack connection handle.
+
+        :param simulated: True for the simulated ljm backend (no hardware needed), False for the real labjack.
+                          Default: Parameters.LABJACK_SIMULATED
+        :exception ImportError: if the real labjack is selected and the ljm library is not installed
         """
 
+        # select ljm backend
+        if simulated is None:
+            simulated = Parameters.LABJACK_SIMULATED
+        if simulated:
+            self.ljm = SimulatedLJM(time_scale=Parameters.LABJACK_SIMULATION_TIME_SCALE)
+        elif ljm is None:
+            raise ImportError("labjack ljm library is not installed. Use the simulated backend.")
+        else:
+            self.ljm = ljm
+
         # labjack connection handle (default: None. If connected: labjack handler instance)
         self.connection_handle = None
 
         # labjack connection state (default: None, connection_error: False, connected: True)
         self.connection_state = False
 
+        # number of successful connects (used to detect reconnects, even if the outage was shorter than a check)
+        self.connection_count = 0
+
+        # register map for cached name to address resolution
+        self.register_map = RegisterMap(self.ljm)
+
+        # latest digital snapshot (instance of DigitalSnapshot, None if not read yet)
+        self.digital_snapshot = None
+
+        # analog input configuration profile {port: {setting: value}} and shadow of written registers {name: value}
+        self.channel_profile = {}
+        self.register_shadow = {}
+
+        # device lock for the access of several threads (re-entrant)
+        self.lock = threading.RLock()
+
         # try to connect
         self.connect()
 
@@ -49,39 +238,46 @@ class LabjackConnection:
         :return: True if connection successful, False if connection error occurred
         """
 
-        # check if already connected
-        if self.connection_state:
-            if Parameters.DEBUG:
-                print("Function labjack_connection.connect: already connected!")
-            return True
-        # if not, try to connect
-        else:
-            # open Labjack connection with given parameters
-            try:
-                self.connection_handle = ljm.openS("ANY", Parameters.LABJACK_CONNECTION, Parameters.LABJACK_SERIAL_NUMBER)
-            except (ValueError, LJMError):
+        # the handle is replaced, no other thread may access it in the meantime
+        with self.lock:
+            # check if already connected
+            if self.connection_state:
                 if Parameters.DEBUG:
-                    print("Couldn't connect to labjack! (part 1)")
-                self.connection_state = False
-                return False
-
-            # check for success
-            if self.connection_handle > 0:
-                if Parameters.DEBUG:
-                    info = ljm.getHandleInfo(self.connection_handle)
-                    print("Function labjack_connection.connect: connection successful!")
-                    print("Opened a LabJack with Device type: %i, Connection type: %i,\n"
-                          "Serial number: %i, IP address: %s, Port: %i,\nMax bytes per MB: %i" %
-                          (info[0], info[1], info[2], ljm.numberToIP(info[3]), info[4], info[5]))
-                self.connection_state = True
+                    print("Function labjack_connection.connect: already connected!")
                 return True
-            # connection not successful
+            # if not, try to connect
             else:
-                if Parameters.DEBUG:
-                    print("Couldn't connect to labjack! (part 2)")
-                    print("Connection handle is: ", self.connection_handle)
-                self.connection_state = False
-                return False
+                # open Labjack connection with given parameters
+                try:
+                    self.connection_handle = self.ljm.openS("ANY", Parameters.LABJACK_CONNECTION, Parameters.LABJACK_SERIAL_NUMBER)
+                except (ValueError, LJMError):
+                    if Parameters.DEBUG:
+                        print("Couldn't connect to labjack! (part 1)")
+                    self.connection_state = False
+                    return False
+
+                # check for success
+                if self.connection_handle > 0:
+                    if Parameters.DEBUG:
+                        info = self.ljm.getHandleInfo(self.connection_handle)
+                        print("Function labjack_connection.connect: connection successful!")
+                        print("Opened a LabJack with Device type: %i, Connection type: %i,\n"
+                              "Serial number: %i, IP address: %s, Port: %i,\nMax bytes per MB: %i" %
+                              (info[0], info[1], info[2], self.ljm.numberToIP(info[3]), info[4], info[5]))
+                    self.connection_state = True
+                    self.connection_count += 1
+                    # re-apply channel configuration (device may have been reset, thus start with an empty shadow)
+                    self.register_shadow = {}
+                    if len(self.channel_profile) > 0:
+                        self.apply_channel_profile()
+                    return True
+                # connection not successful
+                else:
+                    if Parameters.DEBUG:
+                        print("Couldn't connect to labjack! (part 2)")
+                        print("Connection handle is: ", self.connection_handle)
+                    self.connection_state = False
+                    return False
 
     def get_handler(self):
         """ Returns the labjack connection handler
@@ -104,16 +300,47 @@ class LabjackConnection:
         :return: Analog input value in Volt [V]
         """
 
-        # try to read
-        try:
-            result = ljm.eReadName(self.connection_handle, port)
-        except (TypeError, LJMError):
-            self.connection_state = False
-            self.close_connection()
-            return False
+        # try to resolve register address and read
+        with self.lock:
+            try:
+                address, data_type = self.register_map.resolve(port)
+                result = self.ljm.eReadAddress(self.connection_handle, address, data_type)
+            except (TypeError, LJMError):
+                self.connection_state = False
+                self.close_connection()
+                return False
 
         return result
 
+    def read_analog_many(self, ports):
+        """ Read the analog voltage values from several ports within a single labjack transaction.
+        The ports are converted one after another by the device, but only one USB round trip is needed.
+
+        :param ports: list of analog ports to read values from, e.g. ["AIN0", "AIN11"]
+        :return: List of analog input values in Volt [V] (same order as ports), False if the read failed
+        :exception TypeError: if ports is not a list of strings
+        :exception ValueError: if ports is empty
+        """
+
+        # check input parameters
+        if not isinstance(ports, list) or not all(isinstance(port, str) for port in ports):
+            raise TypeError
+
+        if len(ports) == 0:
+            raise ValueError
+
+        # try to resolve register addresses and read all ports at once
+        with self.lock:
+            try:
+                addresses, data_types = self.register_map.resolve_many(ports)
+                results = self.ljm.eReadAddresses(self.connection_handle, len(ports), addresses, data_types)
+            except (TypeError, LJMError):
+                self.connection_state = False
+                self.close_connection()
+                return False
+
+        return results
+
     def read_digital(self, port):
         """ Read a digital value and map to "HIGH", or "LOW"
 
@@ -128,13 +355,15 @@ class LabjackConnection:
         if not isinstance(port, str):
             raise TypeError
 
-        # try to read digital value from given port
-        try:
-            result = ljm.eReadName(self.connection_handle, port)
-        except (TypeError, LJMError):
-            self.connection_state = False
-            self.close_connection()
-            return False
+        # try to resolve register address and read digital value from given port
+        with self.lock:
+            try:
+                address, data_type = self.register_map.resolve(port)
+                result = self.ljm.eReadAddress(self.connection_handle, address, data_type)
+            except (TypeError, LJMError):
+                self.connection_state = False
+                self.close_connection()
+                return False
 
         # map result to "LOW" or "HIGH"
         if result == 0.0:
@@ -144,6 +373,46 @@ class LabjackConnection:
         else:
             raise ValueError
 
+    def read_digital_snapshot(self):
+        """ Read the states of all digital I/O (inputs and relay outputs) with a single DIO_STATE read.
+        The snapshot is stored and can be shared with other callers by get_digital_snapshot().
+
+        :return: instance of DigitalSnapshot, False if the read failed
+        """
+
+        # try to resolve register address and read all digital states at once
+        with self.lock:
+            try:
+                address, data_type = self.register_map.resolve("DIO_STATE")
+                result = self.ljm.eReadAddress(self.connection_handle, address, data_type)
+            except (TypeError, LJMError):
+                self.connection_state = False
+                self.close_connection()
+                return False
+
+        # store and return snapshot
+        self.digital_snapshot = DigitalSnapshot(time.time(), int(result))
+
+        return self.digital_snapshot
+
+    def get_digital_snapshot(self, max_age=None):
+        """ Returns the latest digital snapshot if it is not older than max_age, otherwise a new snapshot is read.
+        This allows several periodic display callers (e.g. gui) to share one read per tick.
+        (!) Safety decisions must not use cached data, use read_digital_snapshot() instead (!)
+
+        :param max_age: maximum age of the snapshot in s, default Parameters.LJ_DIGITAL_SNAPSHOT_MAX_AGE
+        :return: instance of DigitalSnapshot, False if the read failed
+        """
+
+        if max_age is None:
+            max_age = Parameters.LJ_DIGITAL_SNAPSHOT_MAX_AGE
+
+        # reuse latest snapshot if recent enough and still connected
+        if self.connection_state and self.digital_snapshot is not None and self.digital_snapshot.age() <= max_age:
+            return self.digital_snapshot
+
+        return self.read_digital_snapshot()
+
     def write_digital(self, port, value):
         """ Write a digital value ("HIGH" or "LOW") to a given port.
 
@@ -167,13 +436,62 @@ class LabjackConnection:
         else:
             raise ValueError
 
-        # try to write
-        try:
-            ljm.eWriteName(self.connection_handle, port, state)
-        except (TypeError, LJMError):
-            self.connection_state = False
-            self.close_connection()
-            return False
+        # try to resolve register address and write
+        with self.lock:
+            try:
+                address, data_type = self.register_map.resolve(port)
+                self.ljm.eWriteAddress(self.connection_handle, address, data_type, state)
+            except (TypeError, LJMError):
+                self.connection_state = False
+                self.close_connection()
+                return False
+
+    def write_digital_bank(self, values):
+        """ Write digital values ("HIGH" or "LOW") to several ports within a single transaction.
+        All given ports are switched at the same time by one DIO_STATE write. Ports which are not given are
+        protected by the DIO_INHIBIT mask and keep their state. The inhibit mask is reset to 0 at the end of the
+        same packet, otherwise later single port writes (write_digital()) to inhibited ports would be ignored.
+
+        :param values: dict {port: "HIGH" or "LOW"}, e.g. {"FIO1": "HIGH", "FIO2": "LOW"}
+        :return: None, False if the write failed
+        :exception TypeError: if values is not a dict or a port or value is not string
+        :exception ValueError: if a port is invalid or a value is not "HIGH" or "LOW"
+        """
+
+        # check input parameters
+        if not isinstance(values, dict):
+            raise TypeError
+
+        # build bit masks for direction and state, all bits not given are inhibited
+        mask = 0
+        state = 0
+        for port, value in values.items():
+            if not isinstance(value, str) or not isinstance(port, str):
+                raise TypeError
+            if port[0:3] not in DigitalSnapshot.PORT_OFFSETS or not port[3:].isdigit():
+                raise ValueError
+            bit = 1 << (DigitalSnapshot.PORT_OFFSETS[port[0:3]] + int(port[3:]))
+            mask |= bit
+            if value == "HIGH":
+                state |= bit
+            elif not value == "LOW":
+                raise ValueError
+        inhibit = ~mask & 0x7FFFFF
+
+        # try to resolve register addresses and write, the registers are written in the given order within one packet
+        # (inhibit, direction, state, inhibit reset)
+        with self.lock:
+            try:
+                names = ["DIO_INHIBIT", "DIO_DIRECTION", "DIO_STATE", "DIO_INHIBIT"]
+                addresses, data_types = self.register_map.resolve_many(names)
+                self.ljm.eWriteAddresses(self.connection_handle, 4, addresses, data_types, [inhibit, mask, state, 0])
+            except (TypeError, LJMError):
+                self.connection_state = False
+                self.close_connection()
+                return False
+
+        # digital snapshot is outdated
+        self.digital_snapshot = None
 
     def ljtick_dac_set_analog_out(self, port, voltage):
         """ Writes the analog output voltage to the LJTick DAC 0 to 10 V.
@@ -203,13 +521,15 @@ class LabjackConnection:
         else:
             raise ValueError
 
-        # try to write value
-        try:
-            ljm.eWriteName(self.connection_handle, write, voltage)
-        except (TypeError, LJMError):
-            self.connection_state = False
-            self.close_connection()
-            return False
+        # try to resolve register address and write value
+        with self.lock:
+            try:
+                address, data_type = self.register_map.resolve(write)
+                self.ljm.eWriteAddress(self.connection_handle, address, data_type, voltage)
+            except (TypeError, LJMError):
+                self.connection_state = False
+                self.close_connection()
+                return False
 
     def set_analog_in_resolution(self, port, resolution):
         """ Set the measurement resolution of an analog input port.
@@ -248,20 +568,114 @@ class LabjackConnection:
         # prepare write statement
         write = str(port + "_RESOLUTION_INDEX")
 
-        # try to write
-        try:
-            ljm.eWriteName(self.connection_handle, write, resolution)
-        except (TypeError, LJMError):
-            self.connection_state = False
-            self.close_connection()
+        # skip write if register already has the given value
+        if self.register_shadow.get(write) == resolution:
+            return
+
+        # try to resolve register address and write
+        with self.lock:
+            try:
+                address, data_type = self.register_map.resolve(write)
+                self.ljm.eWriteAddress(self.connection_handle, address, data_type, resolution)
+            except (TypeError, LJMError):
+                self.connection_state = False
+                self.close_connection()
+                return False
+
+        # update shadow
+        self.register_shadow[write] = resolution
+
+    def set_channel_profile(self, profile):
+        """ Set the analog input configuration profile and apply it.
+        Example: {"AIN0": {"resolution_index": 12, "range": 10.0, "settling_us": 0, "negative_channel": 199}}
+        Settings which are not given in the profile are not touched (device default).
+
+        :param profile: dict {port: {setting: value}}, settings: 'resolution_index' (0-12), 'range' (10, 1, 0.1,
+                        0.01 V), 'settling_us' (0 is auto, max. 50000), 'negative_channel' (199 is single ended)
+        :exception TypeError: if profile is not a dict of dicts
+        :exception ValueError: if a port, setting or value is invalid
+        :return: Number of written registers, False if an error occurred
+        """
+
+        # check input parameters
+        if not isinstance(profile, dict):
+            raise TypeError
+
+        for port, settings in profile.items():
+            if not isinstance(port, str) or not isinstance(settings, dict):
+                raise TypeError
+            if not port[0:3] == "AIN" or not port[3:].isdigit() or int(port[3:]) > 13:
+                raise ValueError
+            for setting, value in settings.items():
+                if setting not in self.PROFILE_REGISTERS:
+                    raise ValueError
+                if setting == 'resolution_index' and not 0 <= value <= 12:
+                    raise ValueError
+                if setting == 'range' and value not in [10, 1, 0.1, 0.01]:
+                    raise ValueError
+                if setting == 'settling_us' and not 0 <= value <= 50000:
+                    raise ValueError
+
+        # store a copy of the profile and apply it
+        self.channel_profile = {port: dict(settings) for port, settings in profile.items()}
+
+        return self.apply_channel_profile()
+
+    def apply_channel_profile(self, force=False):
+        """ Write all registers of the channel profile which differ from the shadow register cache in one batch.
+
+        :param force: if True, all profile registers are written regardless of the shadow
+        :return: Number of written registers, False if an error occurred
+        """
+
+        # collect all registers which have to be written
+        names = []
+        values = []
+        for port, settings in self.channel_profile.items():
+            for setting, value in settings.items():
+                name = str(port + self.PROFILE_REGISTERS[setting])
+                if force or self.register_shadow.get(name) != value:
+                    names.append(name)
+                    values.append(value)
+
+        # nothing to do if the device configuration matches the profile
+        if len(names) == 0:
+            return 0
+
+        # profile is applied automatically after the next connect
+        if not self.connection_state:
             return False
 
+        # try to write all registers at once
+        with self.lock:
+            try:
+                self.ljm.eWriteNames(self.connection_handle, len(names), names, values)
+            except (TypeError, LJMError):
+                self.connection_state = False
+                self.close_connection()
+                return False
+
+        # update shadow
+        for i in range(len(names)):
+            self.register_shadow[names[i]] = values[i]
+
+        if Parameters.DEBUG:
+            print("Function labjack_connection.apply_channel_profile: written registers: ", names)
+
+        return len(names)
+
     def close_connection(self):
         """ Closes the labjack connection.
 
         :return: None
         """
-        try:
-            ljm.close(self.connection_handle)
-        except LJMError:
-            pass
+
+        with self.lock:
+            # device configuration and digital states are unknown after a connection loss
+            self.register_shadow = {}
+            self.digital_snapshot = None
+
+            try:
+                self.ljm.close(self.connection_handle)
+            except LJMError:
+                pass
@@ -1,5 +1,6 @@
+import time
 from parameters import Parameters
-from labjack.ljm import LJMError
+from devices.labjack_t7pro import LJMError
 import tkinter.messagebox
 
 
@@ -9,7 +10,9 @@ class Relays:
     Methods
     ---------
     switch_relay()          Switch a given relay to "LOW" or "HIGH". Updates automatically the relevant class vars.
+    switch_relays()         Switch several relays at the same time with a single labjack write (e.g. GND off, HV on).
     switch_off_all_relays() Use at safety circuit startup or when labjack reconnects to assure the relay states are correctly set.
+    check_switch_allowed()  Checks the safety conditions for switching a given relay
 
     """
 
@@ -31,6 +34,9 @@ class Relays:
         # init message var for notifying the user via GUI in case of an error
         self.safety_message = ""
 
+        # duration of the last relay bank transition in s (see switch_relays)
+        self.last_transition_time = None
+
     def switch_relay(self, name, state, labjack):
         """ Switch relay to a given state
 
@@ -54,23 +60,9 @@ class Relays:
         if not isinstance(state, str):
             raise TypeError
 
-        # check if safety circuit is closed if hv or gnd relay is intended to switch on -> DON'T REMOVE, SAFETY CRITICAL
-        if self.safety_state == "open":
-            if name == 'HV':
-                if state == "ON":
-                    tkinter.messagebox.showerror("ERROR", "Close safety circuit first.")
-                    return
-
-        # check if safety relay is intended to close while Pilz S1 or Pilz S2 is open
-        if name == "SAFETY" and state == "ON":
-            s1_state = self.labjack.read_digital(Parameters.LJ_DIGITAL_IN_PILZ_S1)
-            s2_state = self.labjack.read_digital(Parameters.LJ_DIGITAL_IN_PILZ_S2)
-            if s1_state == "LOW":
-                self.safety_message = "Error! Close test cell first."
-                return
-            elif s2_state == "HIGH":
-                self.safety_message = "Error! Close high voltage box first"
-                return
+        # check safety conditions -> DON'T REMOVE, SAFETY CRITICAL
+        if not self.check_switch_allowed(name, state):
+            return
 
         # check if state is valid and prepare to switch
         # (!) note: relays are low-active. 'HIGH' corresponds to 'OFF' (!)
@@ -120,27 +112,144 @@ class Relays:
             else:
                 raise ValueError
 
+    def check_switch_allowed(self, name, state):
+        """ Checks the safety conditions for switching a given relay. Informs the user if switching is not allowed.
+
+        :param name: relay to switch (must be "HV", "GND", "SAFETY" or "LAMP")
+        :param state: switch state (must be "ON" or "OFF")
+        :return: True if switching is allowed, False otherwise
+        """
+
+        # check if safety circuit is closed if hv or gnd relay is intended to switch on -> DON'T REMOVE, SAFETY CRITICAL
+        if self.safety_state == "open":
+            if name == 'HV':
+                if state == "ON":
+                    tkinter.messagebox.showerror("ERROR", "Close safety circuit first.")
+                    return False
+
+        # check if safety relay is intended to close while Pilz S1 or Pilz S2 is open
+        # (always read the inputs live, cached snapshots are for display only -> SAFETY CRITICAL)
+        if name == "SAFETY" and state == "ON":
+            snapshot = self.labjack.read_digital_snapshot()
+            if snapshot:
+                s1_state = snapshot.state(Parameters.LJ_DIGITAL_IN_PILZ_S1)
+                s2_state = snapshot.state(Parameters.LJ_DIGITAL_IN_PILZ_S2)
+            else:
+                s1_state = False
+                s2_state = False
+            if s1_state == "LOW":
+                self.safety_message = "Error! Close test cell first."
+                return False
+            elif s2_state == "HIGH":
+                self.safety_message = "Error! Close high voltage box first"
+                return False
+
+        return True
+
+    def switch_relays(self, states):
+        """ Switch several relays at the same time with a single labjack write.
+        There is no intermediate state in which only some of the relays are switched (e.g. both HV and GND closed).
+        The method is also called from non-gui threads (breakdown detection), thus a failed write is not shown in a
+        messagebox. Gui callers notify the user if False is returned and the labjack connection is lost.
+
+        :param states: dict {relay name: switch state}, names must be "HV", "GND", "SAFETY" or "LAMP",
+                       states must be "ON" or "OFF", e.g. {"GND": "OFF", "HV": "ON"}
+        :exception TypeError: if states is not a dict or a name or state is not string
+        :exception ValueError: if a name or state doesn't match keywords
+        :return: True if successful, False if not allowed or an error occurred
+        """
+
+        # print function call if debug mode is on
+        if Parameters.DEBUG:
+            print("Relay class call: ", states)
+
+        # check input parameters
+        if not isinstance(states, dict):
+            raise TypeError
+
+        # map relay names to labjack ports
+        ports = {'SAFETY': Parameters.LJ_DIGITAL_OUT_SAFETY_RELAY, 'HV': Parameters.LJ_DIGITAL_OUT_HV_RELAY,
+                 'GND': Parameters.LJ_DIGITAL_OUT_GND_RELAY, 'LAMP': Parameters.LJ_DIGITAL_OUT_SIGNAL_LAMP}
+
+        # compute target state of all given relays
+        # (!) note: relays are low-active. 'HIGH' corresponds to 'OFF' (!)
+        write = {}
+        states_to_store = {}
+        for name, state in states.items():
+            if not isinstance(name, str) or not isinstance(state, str):
+                raise TypeError
+            if name not in ports:
+                raise ValueError
+            if state == 'ON':
+                write[ports[name]] = 'LOW'
+                states_to_store[name] = "closed"
+            elif state == 'OFF':
+                write[ports[name]] = 'HIGH'
+                states_to_store[name] = "open"
+            else:
+                raise ValueError
+
+        # check safety conditions for all relays -> DON'T REMOVE, SAFETY CRITICAL
+        for name, state in states.items():
+            if not self.check_switch_allowed(name, state):
+                return False
+
+        # try to write all relay states at once and measure transition time
+        try:
+            if Parameters.DEBUG:
+                print("write ports: ", write)
+            t_start = time.perf_counter()
+            result = self.labjack.write_digital_bank(write)
+            self.last_transition_time = time.perf_counter() - t_start
+        except (ValueError, TypeError, LJMError):
+            result = False
+        if result is False:
+            if Parameters.DEBUG:
+                print("Relay bank write failed. Check labjack connection.")
+            return False
+
+        if Parameters.DEBUG:
+            print("relay transition time: ", round(self.last_transition_time * 1000, 2), " ms")
+
+        # if write process is successful, change class relay states
+        for name, state_to_store in states_to_store.items():
+            if name == 'SAFETY':
+                self.safety_state = state_to_store
+            elif name == 'HV':
+                self.hv_relay_state = state_to_store
+            elif name == 'GND':
+                self.gnd_relay_state = state_to_store
+            elif name == 'LAMP':
+                self.lamp_state = state_to_store
+
+        return True
+
     def switch_off_all_relays(self):
         """ Use at safety circuit startup or when labjack reconnects to assure the relay states are correctly set.
 
         :return: True if successful, False if an error occurred.
         """
 
-        # switch off all relays
+        # switch off all relays at once
         try:
             # (!) note: relays are low-active. 'HIGH' corresponds to 'OFF' (!)
-            self.labjack.write_digital(Parameters.LJ_DIGITAL_OUT_SAFETY_RELAY, "HIGH")
-            self.labjack.write_digital(Parameters.LJ_DIGITAL_OUT_GND_RELAY, "HIGH")
-            self.labjack.write_digital(Parameters.LJ_DIGITAL_OUT_HV_RELAY, "HIGH")
-            self.labjack.write_digital(Parameters.LJ_DIGITAL_OUT_SIGNAL_LAMP, "HIGH")
+            t_start = time.perf_counter()
+            result = self.labjack.write_digital_bank({Parameters.LJ_DIGITAL_OUT_SAFETY_RELAY: "HIGH",
+                                                      Parameters.LJ_DIGITAL_OUT_GND_RELAY: "HIGH",
+                                                      Parameters.LJ_DIGITAL_OUT_HV_RELAY: "HIGH",
+                                                      Parameters.LJ_DIGITAL_OUT_SIGNAL_LAMP: "HIGH"})
+            self.last_transition_time = time.perf_counter() - t_start
         except (ValueError, TypeError, LJMError):
+            result = False
+        # a failed write is reported by the return value False, the relay states are not changed
+        if result is False:
             if Parameters.DEBUG:
                 print("CRITICAL ERROR. ASSURE ALL RELAYS ARE SWITCHED OFF BEFORE GUI STARTUP")
             return False
-        else:
-            # init relay states if no error occurred
-            self.safety_state = "open"
-            self.gnd_relay_state = "open"
-            self.hv_relay_state = "open"
-            self.lamp_state = "open"
-            return True
+
+        # init relay states if no error occurred
+        self.safety_state = "open"
+        self.gnd_relay_state = "open"
+        self.hv_relay_state = "open"
+        self.lamp_state = "open"
+        return True
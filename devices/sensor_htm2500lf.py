@@ -7,8 +7,10 @@ class SensorHtm2500lf:
 
     Methods
     ---------
-    read_humidity()     Get and return relative humidity in %
-    read_temperature()  Get and return temperature in °C
+    read_humidity()         Get and return relative humidity in %
+    read_temperature()      Get and return temperature in °C
+    convert_humidity()      Convert the analog humidity signal in V to relative humidity in %
+    convert_temperature()   Convert the analog temperature signal in V to temperature in °C
 
     """
 
@@ -31,6 +33,27 @@ class SensorHtm2500lf:
         # read analog IN at humidity sensor port
         result = self.lj_connection.read_analog(Parameters.LJ_ANALOG_IN_HUMIDITY_SENSOR)
 
+        return self.convert_humidity(result)
+
+    def read_temperature(self):
+        """ Read the temperature and convert to degree celsius according to formula from datasheet.
+
+        :return: Temperature in °C
+        """
+
+        # read analog input at temp sensor port
+        result = self.lj_connection.read_analog(Parameters.LJ_ANALOG_IN_TEMP_SENSOR)
+
+        return self.convert_temperature(result)
+
+    @staticmethod
+    def convert_humidity(result):
+        """ Convert the analog humidity signal to the relative humidity according to formula from datasheet.
+
+        :param result: analog humidity signal in V
+        :return: Relative humidity in %
+        """
+
         # convert from V to RH in % with linear equation according to datasheet
         convert = 0.0375*result*1000 - 37.7
 
@@ -40,14 +63,16 @@ class SensorHtm2500lf:
 
         return convert
 
-    def read_temperature(self):
-        """ Read the temperature and convert to degree celsius according to formula from datasheet.
+    @staticmethod
+    def convert_temperature(result):
+        """ Convert the analog temperature signal to degree celsius according to formula from datasheet.
 
+        :param result: analog temperature signal in V
         :return: Temperature in °C
         """
 
-        # read analog input at temp sensor port
-        result = self.lj_connection.read_analog(Parameters.LJ_ANALOG_IN_TEMP_SENSOR) * 1000
+        # convert from V to mV
+        result = result * 1000
 
         # convert from mV to degree celsius with steinhart equations according to datasheet
         resistance = (10000 * result) / (5000 - result)
@@ -0,0 +1,222 @@
+import threading
+import heapq
+import time
+import functools
+
+
+class SessionArbiter:
+    """ This class serializes the access of several threads to a single instrument session (e.g. visa session).
+    Waiting threads are served by priority (safety, then measurement, then gui status) and first come first served
+    within the same priority. A transaction is re-entrant for the owning thread, i.e. methods holding a transaction
+    can call other methods using the arbiter. Duplicate status queries can be coalesced: callers requesting a query
+    which is already queued or in progress wait for its result instead of issuing another one.
+    The queue wait time is recorded per priority.
+
+    Methods
+    ---------
+    acquire()           Waits until the session is granted to the calling thread
+    release()           Releases the session
+    transaction()       Context manager for acquire() and release()
+    coalesce()          Executes a status query or returns the result of an identical query in progress
+    get_statistics()    Returns the wait time statistics per priority
+    reset_statistics()  Resets the wait time statistics
+
+    """
+
+    # priorities (lower value is served first)
+    PRIORITY_SAFETY = 0
+    PRIORITY_MEASUREMENT = 1
+    PRIORITY_GUI = 2
+
+    def __init__(self):
+        """ Constructor of the class SessionArbiter.
+
+        """
+
+        # condition protecting all class vars below
+        self.condition = threading.Condition()
+
+        # owning thread id and re-entrance depth
+        self.owner = None
+        self.depth = 0
+
+        # waiting threads as heap of (priority, sequence number)
+        self.queue = []
+        self.sequence = 0
+
+        # coalesced queries in progress {key: {'event', 'result', 'error'}}
+        self.coalesced = {}
+
+        # wait time statistics
+        self.statistics = {}
+        self.coalesced_count = 0
+        self.reset_statistics()
+
+    def acquire(self, priority):
+        """ Waits until the session is granted to the calling thread.
+
+        :param priority: PRIORITY_SAFETY, PRIORITY_MEASUREMENT or PRIORITY_GUI
+        :return: None
+        """
+
+        thread = threading.get_ident()
+
+        with self.condition:
+            # re-entrance of the owning thread
+            if self.owner == thread:
+                self.depth += 1
+                return
+
+            # queue and wait until first in queue and session is free
+            t_start = time.perf_counter()
+            entry = (priority, self.sequence)
+            self.sequence += 1
+            heapq.heappush(self.queue, entry)
+            while self.owner is not None or self.queue[0] != entry:
+                self.condition.wait()
+            heapq.heappop(self.queue)
+            self.owner = thread
+            self.depth = 1
+
+            # record wait time
+            wait_time = time.perf_counter() - t_start
+            statistics = self.statistics.setdefault(priority, {'count': 0, 'total_wait': 0.0, 'max_wait': 0.0})
+            statistics['count'] += 1
+            statistics['total_wait'] += wait_time
+            statistics['max_wait'] = max(statistics['max_wait'], wait_time)
+
+    def release(self):
+        """ Releases the session (after the last release of a re-entered transaction).
+
+        :exception RuntimeError: If the calling thread does not own the session
+        :return: None
+        """
+
+        with self.condition:
+            if self.owner != threading.get_ident():
+                raise RuntimeError
+
+            self.depth -= 1
+            if self.depth == 0:
+                self.owner = None
+                self.condition.notify_all()
+
+    def transaction(self, priority):
+        """ Context manager for acquire() and release(), e.g. 'with arbiter.transaction(priority): ...'
+
+        :param priority: PRIORITY_SAFETY, PRIORITY_MEASUREMENT or PRIORITY_GUI
+        :return: context manager
+        """
+        return _Transaction(self, priority)
+
+    def coalesce(self, key, priority, function):
+        """ Executes a status query within a transaction. If a query with the same key is already queued or in
+        progress (other thread), its result is returned instead of executing the query again.
+
+        :param key: identifier of the query, e.g. 'check_connection'
+        :param priority: PRIORITY_SAFETY, PRIORITY_MEASUREMENT or PRIORITY_GUI
+        :param function: function executing the query (without arguments)
+        :return: return value of the function
+        """
+
+        with self.condition:
+            # the owning thread executes directly (waiting would block the query in progress)
+            entry = self.coalesced.get(key)
+            if self.owner == threading.get_ident():
+                entry = None
+                executing = True
+            elif entry is None:
+                entry = {'event': threading.Event(), 'result': None, 'error': None}
+                self.coalesced[key] = entry
+                executing = True
+            else:
+                self.coalesced_count += 1
+                executing = False
+
+        # wait for the result of the query in progress
+        if not executing:
+            entry['event'].wait()
+            if entry['error'] is not None:
+                raise entry['error']
+            return entry['result']
+
+        if entry is None:
+            with self.transaction(priority):
+                return function()
+
+        # execute query and publish result
+        try:
+            with self.transaction(priority):
+                entry['result'] = function()
+        except Exception as error:
+            entry['error'] = error
+            raise
+        finally:
+            with self.condition:
+                del self.coalesced[key]
+            entry['event'].set()
+
+        return entry['result']
+
+    def get_statistics(self):
+        """ Returns the wait time statistics per priority and the number of coalesced queries.
+
+        :return: {priority: {'count', 'mean_wait' in s, 'max_wait' in s}, 'coalesced': number of coalesced queries}
+        """
+
+        with self.condition:
+            statistics = {}
+            for priority, values in self.statistics.items():
+                mean_wait = values['total_wait'] / values['count'] if values['count'] > 0 else 0.0
+                statistics[priority] = {'count': values['count'], 'mean_wait': mean_wait,
+                                        'max_wait': values['max_wait']}
+            statistics['coalesced'] = self.coalesced_count
+
+        return statistics
+
+    def reset_statistics(self):
+        """ Resets the wait time statistics.
+
+        :return: None
+        """
+
+        with self.condition:
+            self.statistics = {}
+            for priority in [self.PRIORITY_SAFETY, self.PRIORITY_MEASUREMENT, self.PRIORITY_GUI]:
+                self.statistics[priority] = {'count': 0, 'total_wait': 0.0, 'max_wait': 0.0}
+            self.coalesced_count = 0
+
+
+class _Transaction:
+    """ Context manager returned by SessionArbiter.transaction().
+
+    """
+
+    def __init__(self, arbiter, priority):
+        self.arbiter = arbiter
+        self.priority = priority
+
+    def __enter__(self):
+        self.arbiter.acquire(self.priority)
+        return self.arbiter
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.arbiter.release()
+        return False
+
+
+def arbitrated(priority):
+    """ Decorator executing an instrument method within a transaction of the instance's arbiter (self.arbiter).
+
+    :param priority: SessionArbiter.PRIORITY_SAFETY, PRIORITY_MEASUREMENT or PRIORITY_GUI
+    :return: decorator
+    """
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.arbiter.transaction(priority):
+                return method(self, *args, **kwargs)
+        return wrapper
+
+    return decorator
@@ -0,0 +1,71 @@
+"""
+Benchmark comparing ascii and binary (REAL,64) transfer of the electrometer trace buffer for 1k, 10k and 100k readings.
+Part 1 measures the host side decoding only (no device needed).
+Part 2 fills the trace buffer with a buffered acquisition and measures complete fetches (transfer and decoding).
+"""
+
+import time
+import numpy
+from devices.electrometer_keysight_b2985a import ElectrometerControl
+
+# number of readings per fetch
+SIZES = [1000, 10000, 100000]
+
+# number of repetitions per measurement
+N = 5
+
+# --------------- PART 1: DECODING ONLY --------------- #
+
+for size in SIZES:
+    # two values (current, timestamp) per reading, ascii formatted like the instrument response
+    values = numpy.random.normal(1e-12, 1e-13, 2 * size)
+    ascii_data = ','.join('%+.6E' % value for value in values) + '\n'
+    binary_data = values.astype('>f8').tobytes()
+    length = str(len(binary_data))
+    binary_data = b'#' + str(len(length)).encode() + length.encode() + binary_data + b'\n'
+
+    # ascii decoding
+    t_start = time.perf_counter()
+    for i in range(N):
+        numpy.array(ascii_data.split(','), dtype=float)
+    t_ascii = (time.perf_counter() - t_start) / N
+
+    # binary decoding
+    t_start = time.perf_counter()
+    for i in range(N):
+        ElectrometerControl.parse_ieee_block(binary_data)
+    t_binary = (time.perf_counter() - t_start) / N
+
+    print("Decoding %6i readings: ascii %8.2f ms (%7i bytes), binary %8.2f ms (%7i bytes)"
+          % (size, t_ascii * 1000, len(ascii_data), t_binary * 1000, len(binary_data)))
+
+# --------------- PART 2: DEVICE TRANSFER --------------- #
+
+electrometer = ElectrometerControl()
+if not electrometer.connection_state:
+    print("Electrometer not connected. Skipping device benchmark.")
+    exit()
+
+# fill trace buffer with the maximum number of readings
+electrometer.set_speed('quick')
+interval = 0.001
+electrometer.start_buffered_acquisition(max(SIZES), interval)
+print("Filling trace buffer...")
+time.sleep(max(SIZES) * interval + 5)
+
+for size in SIZES:
+    results = []
+    for data_format in ['ascii', 'binary']:
+        electrometer.set_data_format(data_format)
+        t_start = time.perf_counter()
+        for i in range(N):
+            # fetch the same readings again (from the beginning of the trace buffer)
+            electrometer.buffered_index = 0
+            electrometer.fetch_buffered_block(size)
+        results.append((time.perf_counter() - t_start) / N)
+
+    print("Fetching %6i readings: ascii %8.2f ms, binary %8.2f ms, speedup %.1f"
+          % (size, results[0] * 1000, results[1] * 1000, results[0] / results[1]))
+
+electrometer.stop_buffered_acquisition()
+electrometer.close_connection()
@@ -0,0 +1,94 @@
+"""
+Micro-benchmark comparing name based and address based register access of the Labjack T7-Pro.
+Part 1 measures the host side name resolution only (no device needed).
+Part 2 measures complete reads/writes on a connected labjack (eReadName/eWriteName vs. eReadAddress/eWriteAddress).
+"""
+
+import time
+from devices.labjack_t7pro import LabjackConnection, RegisterMap
+from parameters import Parameters
+
+# number of calls per measurement
+N = 1000
+
+# registers used by the safety loop and the gui frames
+analog_port = Parameters.LJ_ANALOG_IN_HV_PROBE
+digital_in_port = Parameters.LJ_DIGITAL_IN_PILZ_S1
+
+# spare digital output (not wired in the relay box), the relay and signal lamp outputs are never written
+digital_out_port = "EIO0"
+
+# connect to labjack (or simulation, see Parameters.LABJACK_SIMULATED) and get ljm backend
+labjack = LabjackConnection()
+ljm = labjack.ljm
+
+# --------------- PART 1: NAME RESOLUTION ONLY --------------- #
+
+# resolve name on every call
+t_start = time.perf_counter()
+for i in range(N):
+    ljm.namesToAddresses(1, [analog_port])
+t_names = (time.perf_counter() - t_start) / N
+
+# resolve name once and use cache afterwards
+register_map = RegisterMap(ljm)
+t_start = time.perf_counter()
+for i in range(N):
+    register_map.resolve(analog_port)
+t_cached = (time.perf_counter() - t_start) / N
+
+print("Name resolution per call:   %.2f us" % (t_names * 1e6))
+print("Cached lookup per call:     %.2f us" % (t_cached * 1e6))
+
+# --------------- PART 2: DEVICE ACCESS --------------- #
+
+if not labjack.connection_state:
+    print("Labjack not connected. Skipping device benchmark.")
+    exit()
+
+handle = labjack.get_handler()
+
+# use the fastest resolution for the analog input in order to measure the communication overhead
+# (the original resolution is restored at the end)
+resolution_register = str(analog_port + "_RESOLUTION_INDEX")
+original_resolution = int(ljm.eReadName(handle, resolution_register))
+labjack.set_analog_in_resolution(analog_port, 1)
+
+# original state of the spare output (restored at the end)
+original_state = labjack.read_digital(digital_out_port)
+
+# init benchmark list: [description, name based function, address based function]
+address, data_type = labjack.register_map.resolve(analog_port)
+address_in, data_type_in = labjack.register_map.resolve(digital_in_port)
+address_out, data_type_out = labjack.register_map.resolve(digital_out_port)
+benchmarks = [
+    ["analog read", lambda: ljm.eReadName(handle, analog_port),
+     lambda: ljm.eReadAddress(handle, address, data_type)],
+    ["digital read", lambda: ljm.eReadName(handle, digital_in_port),
+     lambda: ljm.eReadAddress(handle, address_in, data_type_in)],
+    ["digital write", lambda: ljm.eWriteName(handle, digital_out_port, 1),
+     lambda: ljm.eWriteAddress(handle, address_out, data_type_out, 1)],
+    ["LabjackConnection.read_analog", lambda: ljm.eReadName(handle, analog_port),
+     lambda: labjack.read_analog(analog_port)],
+]
+
+for benchmark in benchmarks:
+    # name based access
+    t_start = time.perf_counter()
+    for i in range(N):
+        benchmark[1]()
+    t_name = (time.perf_counter() - t_start) / N
+
+    # address based access
+    t_start = time.perf_counter()
+    for i in range(N):
+        benchmark[2]()
+    t_address = (time.perf_counter() - t_start) / N
+
+    print("%s: name %.1f us, address %.1f us, difference %.1f us"
+          % (benchmark[0], t_name * 1e6, t_address * 1e6, (t_name - t_address) * 1e6))
+
+# restore spare output state and original resolution
+labjack.write_digital(digital_out_port, original_state)
+labjack.set_analog_in_resolution(analog_port, original_resolution)
+labjack.close_connection()
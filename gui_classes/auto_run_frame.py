@@ -5,8 +5,10 @@ import time
 import matplotlib.pyplot as plt
 import matplotlib.backends.backend_tkagg as tkagg
 from matplotlib.backends.backend_tkagg import NavigationToolbar2Tk
-import utilities.measure_module as measure
 import utilities.log_module as log
+from utilities.acquisition_scheduler import get_fresh_flags
+from parameters import Parameters
+from devices.electrometer_keysight_b2985a import InterlockError
 
 
 class AutoRunFrame:
@@ -23,17 +25,19 @@ class AutoRunFrame:
     record()                Initialize and start the recording process
     stop_record()           Stop/Interrupt the recording process
     stop_auto_range()       Stops the auto ranging process
+    set_electrometer_voltage() Enables the electrometer source and sets the voltage, aborts if interlock is open
     abort_measurement()     Aborts the measurement runtime
     stop_measurement()      Stops the measurement runtime
     switch_hv()             Switch to high voltage potential (used for manual mode)
     switch_gnd()            Switch to ground potential (used for manual mode)
-    speed_update()          Sets the electrometer speed based on user input ('quick', 'normal', 'stable')
+    switch_relays()         Switch several relays at once, informs the user if the labjack connection is lost
+    speed_update()          Sets the electrometer speed based on user input ('quick', 'normal', 'stable', 'adaptive')
     range_update()          Updates the electrometer measurement range
     range_auto()            Starts the auto ranging process
 
     """
 
-    def __init__(self, root, electrometer, hvamp, hum_sensor, labjack, relays, filename):
+    def __init__(self, root, electrometer, hvamp, hum_sensor, labjack, relays, filename, scheduler):
         """ Constructor of the class RecordingFrame.
 
         For the following device parameters, use the corresponding class in the package 'devices'
@@ -41,6 +45,7 @@ class AutoRunFrame:
         :param electrometer: object for controlling the electrometer
         :param hvamp: object for controlling the high voltage amplifier
         :param hum_sensor: object for controlling the humidity sensor
+        :param scheduler: instance of the class AcquisitionScheduler (recording and auto ranging use its samples)
         """
 
         # Initialize class vars from given parameters
@@ -51,6 +56,11 @@ class AutoRunFrame:
         self.labjack = labjack
         self.relays = relays
         self.filename = filename
+        self.scheduler = scheduler
+
+        # init class vars for subscriptions to the acquisition scheduler
+        self.subscription_record = None
+        self.subscription_auto_range = None
 
         # init class vars for after ids
         self.after_id_plot = None
@@ -248,7 +258,7 @@ class AutoRunFrame:
 
             # init speed dropdown
             tk.Label(self.autorun_main_window, text="Speed", font="Helvetica 12 bold").place(x=1020, y=250)
-            speed_choices = ['quick', 'normal', 'stable']
+            speed_choices = ['quick', 'normal', 'stable', 'adaptive']
             self.speed_dropdown = ttk.Combobox(self.autorun_main_window, values=speed_choices, width=10)
             self.speed_dropdown.current(2)
             self.speed_update("")
@@ -347,8 +357,8 @@ class AutoRunFrame:
             self.switched_t_three_flag = False
             # Create log file with data information (DO NOT CHANGE)
             log.create_logfile(self.filename)
-            log.log_message("Params: date, time, absolute_time, voltage, current, temperature, humidity, measurement_range_id, measurement_speed")
-            log.log_message("Units: -,-,s,V,pA,°C,RHin%,-,-")
+            log.log_message("Params: date, time, absolute_time, voltage, current, temperature, humidity, measurement_range_id, measurement_speed, measurement_filter, fresh_flags")
+            log.log_message("Units: -,-,s,V,pA,°C,RHin%,-,-,-,-")
             # start log process
             self.record()
             # start plot
@@ -372,17 +382,14 @@ class AutoRunFrame:
         # GND relay is opened, HV relay is closed until t2 is reached
         elif step == 2:
             print("STARTED SECOND STEP: POLARIZATION")
-            # open GND relay
-            self.relays.switch_relay("GND", "OFF", self.labjack)
-            # set voltage
+            # set voltage (HV relay is still open)
             if self.source_dropdown_result == 0:
                 self.hvamp.set_voltage(int(self.voltage_result))
             elif self.source_dropdown_result == 1:
-                self.electrometer.enable_source_output()
-                time.sleep(0.1)
-                self.electrometer.set_voltage(int(self.voltage_result))
-            # switch on HV relay
-            self.relays.switch_relay("HV", "ON", self.labjack)
+                if not self.set_electrometer_voltage(int(self.voltage_result)):
+                    return
+            # open GND relay and switch on HV relay at the same time
+            self.switch_relays({"GND": "OFF", "HV": "ON"})
             # step 3 if 'pdc' is selected or finish measurement (step 4) if 'p only' is selected
             if self.type_dropdown == 0:
                 next_step = 3
@@ -397,8 +404,8 @@ class AutoRunFrame:
             print("STARTED THIRD STEP: DEPOLARIZATION")
             self.hvamp.set_voltage(0)
             self.electrometer.set_voltage(0)
-            self.relays.switch_relay("HV", "OFF", self.labjack)
-            self.relays.switch_relay("GND", "ON", self.labjack)
+            # switch off HV relay and close GND relay at the same time
+            self.switch_relays({"HV": "OFF", "GND": "ON"})
             # finish measurement (step 4) after t3 is reached
             self.after_id_measurement = self.root.after(int(self.t_three_result) * 1000, lambda: self.measurement_runtime(4))
 
@@ -431,36 +438,43 @@ class AutoRunFrame:
         self.electrometer.set_voltage(0)
 
         # switch hv relay off, switch gnd relay on
-        self.relays.switch_relay("HV", "OFF", self.labjack)
-        self.relays.switch_relay("GND", "ON", self.labjack)
+        self.switch_relays({"HV": "OFF", "GND": "ON"})
 
     def record(self):
-        """ Periodically logs all sensor values
+        """ Periodically logs all new samples of the acquisition scheduler
 
         :return: None
         """
 
-        # get all sensor values
-        timenow = time.time()
-        self.values = measure.measure_all_values(self.electrometer, self.hvamp, self.hum_sensor, self.labjack)
-        print("Time needed for measurement: ", time.time()-timenow)
-
-        # set start time in seconds with 2 decimal places in first iteration of record
+        # set start time in seconds with 2 decimal places and subscribe (all samples are logged) in first iteration
         if self.after_id_record is None:
             self.data_start_time = round(time.time()*1000, 2)
+            self.subscription_record = self.scheduler.subscribe(1, 'queue')
+
+        for sample in self.subscription_record.get():
+            # get all sensor values
+            self.values = [sample.voltage, sample.current, sample.temperature, sample.humidity]
+
+            # update data list
+            self.data_time_x.append(round(sample.timestamp*1000-self.data_start_time, 2)/1000)
+            self.data_current_y.append(self.values[1])
 
-        # update data list
-        self.data_time_x.append(round(time.time()*1000-self.data_start_time, 2)/1000)
-        self.data_current_y.append(self.values[1])
+            # append measurement range, speed and filter of the sample
+            self.values.append(sample.range)
+            self.values.append(sample.speed)
+            self.values.append(sample.filter)
 
-        # append measurement range
-        self.values.append(self.electrometer.range)
+            # append fresh flags of voltage, current, temperature, humidity (F: read in this cycle, H: held value)
+            self.values.append(get_fresh_flags(sample))
 
-        # append measurement speed
-        self.values.append(self.electrometer.speed)
+            # log all values with the time of the measurement
+            log.log_values(self.values, sample.timestamp)
 
-        # log all values
-        log.log_values(self.values)
+            # update aperture based on the measured current (adaptive speed only)
+            if self.electrometer.update_adaptive_aperture(self.values[1] * pow(10, -12)) is not None:
+                if Parameters.DEBUG:
+                    print("Aperture: ", self.electrometer.aperture, " s, sample rate: ",
+                          self.electrometer.get_sample_rate(), " Hz")
 
         # setup next record method call after specified measurement interval
         self.after_id_record = self.root.after(1000, self.record)
@@ -476,6 +490,11 @@ class AutoRunFrame:
             self.root.after_cancel(self.after_id_record)
         self.after_id_record = None
 
+        # unsubscribe from the acquisition scheduler
+        if self.subscription_record is not None:
+            self.subscription_record.close()
+        self.subscription_record = None
+
     def stop_auto_range(self):
         """ Stop the auto ranging function
 
@@ -486,6 +505,32 @@ class AutoRunFrame:
             self.root.after_cancel(self.after_id_auto_range)
         self.after_id_auto_range = None
 
+        # unsubscribe from the acquisition scheduler
+        if self.subscription_auto_range is not None:
+            self.subscription_auto_range.close()
+        self.subscription_auto_range = None
+
+    def set_electrometer_voltage(self, voltage):
+        """ Enables the electrometer source output and sets the voltage. If the interlock is open (voltage > 21 V),
+        the user is informed, the source output is disabled and the measurement is aborted.
+
+        :param voltage: voltage in V
+        :return: True if the voltage is set, False if the interlock is open
+        """
+        # enable source output and set voltage
+        self.electrometer.enable_source_output()
+        time.sleep(0.1)
+        try:
+            self.electrometer.set_voltage(voltage)
+        except InterlockError:
+            tkinter.messagebox.showerror("ERROR", "Electrometer Interlock Error. \nHigh Voltage cannot be enabled "
+                                                  "because interlock is not closed.", parent=self.autorun_main_window)
+            self.electrometer.disable_source_output()
+            self.abort_measurement()
+            return False
+
+        return True
+
     def abort_measurement(self):
         """ Abort the measurement process.
 
@@ -521,19 +566,16 @@ class AutoRunFrame:
 
         # select appropriate measurement range
         self.electrometer.set_range(5)
-        time.sleep(0.5)
 
         # set voltage
         if self.source_dropdown_result == 0:
             self.hvamp.set_voltage(int(self.voltage_result))
         elif self.source_dropdown_result == 1:
-            self.electrometer.enable_source_output()
-            time.sleep(0.1)
-            self.electrometer.set_voltage(int(self.voltage_result))
+            if not self.set_electrometer_voltage(int(self.voltage_result)):
+                return
 
         # switch relays
-        self.relays.switch_relay("GND", "OFF", self.labjack)
-        self.relays.switch_relay("HV", "ON", self.labjack)
+        self.switch_relays({"GND": "OFF", "HV": "ON"})
 
     def switch_gnd(self):
         """ Switch to ground in manual mode
@@ -551,11 +593,23 @@ class AutoRunFrame:
 
         # select appropriate measurement range
         self.electrometer.set_range(5)
-        time.sleep(0.5)
 
         # switch relays
-        self.relays.switch_relay("HV", "OFF", self.labjack)
-        self.relays.switch_relay("GND", "ON", self.labjack)
+        self.switch_relays({"HV": "OFF", "GND": "ON"})
+
+    def switch_relays(self, states):
+        """ Switch several relays at the same time (see Relays.switch_relays). Informs the user if the write failed
+        because of a labjack connection error.
+
+        :param states: dict {relay name: switch state}, e.g. {"GND": "OFF", "HV": "ON"}
+        :return: True if successful, False otherwise
+        """
+
+        result = self.relays.switch_relays(states)
+        if not result and not self.labjack.get_connection_state():
+            tk.messagebox.showerror("ERROR", "Check labjack connection.")
+
+        return result
 
     def speed_update(self, event):
         """ Update measurement speed (electrometer parameter)
@@ -570,6 +624,8 @@ class AutoRunFrame:
             self.electrometer.set_speed('normal')
         elif self.speed_dropdown.current() == 2:
             self.electrometer.set_speed('stable')
+        elif self.speed_dropdown.current() == 3:
+            self.electrometer.set_speed('adaptive')
         else:
             raise ValueError
 
@@ -586,8 +642,7 @@ class AutoRunFrame:
             self.electrometer.set_range(5)
             self.range_auto()
         else:
-            if self.after_id_auto_range is not None:
-                self.root.after_cancel(self.after_id_auto_range)
+            self.stop_auto_range()
             self.electrometer.set_range(self.range_dropdown.current())
 
     def range_auto(self):
@@ -601,8 +656,19 @@ class AutoRunFrame:
         ranges_in_p = [2, 20, 200, 2000, 2*pow(10, 4), 2*pow(10, 5), 2*pow(10, 6), 2*pow(10, 7), 2*pow(10, 8),
                        2*pow(10, 9), 2*pow(10, 10)]
 
+        # subscribe to the acquisition scheduler in the first iteration (only the latest sample is used)
+        if self.subscription_auto_range is None:
+            self.subscription_auto_range = self.scheduler.subscribe(1, 'latest')
+
+        # evaluate each sample only once, repeat after 1 second if there is no new sample
+        samples = self.subscription_auto_range.get()
+        if len(samples) == 0:
+            self.after_id_auto_range = self.root.after(1000, self.range_auto)
+            return
+        current = samples[-1].current
+
         # switch to higher range if two overflow occured
-        if self.values[1] == 0 and self.electrometer.range < 11:
+        if current == 0 and self.electrometer.range < 11:
             print("OVERFLOW OCCURRED! (method range_auto in auto_run_frame)")
             if self.overflow_flag:
                 self.electrometer.set_range(self.electrometer.range + 1)
@@ -613,9 +679,9 @@ class AutoRunFrame:
             self.overflow_flag = False
 
         # switch to lower range if two measurement values in a row are below half of the next lower range
-        print("Current value", self.values[1])
+        print("Current value", current)
         print("Range value", ranges_in_p[self.electrometer.range - 1])
-        if abs(self.values[1]) < ranges_in_p[self.electrometer.range - 2]/2 and self.electrometer.range > 1 and not self.values[1] == 0 and not self.values[1] == -1:
+        if abs(current) < ranges_in_p[self.electrometer.range - 2]/2 and self.electrometer.range > 1 and not current == 0 and not current == -1:
             if self.switch_lower_flag:
                 self.electrometer.set_range(self.electrometer.range - 1)
                 self.switch_lower_flag = False
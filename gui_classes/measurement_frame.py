@@ -3,7 +3,6 @@ import tkinter.messagebox
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 import matplotlib.ticker as ticker
-import utilities.measure_module as measure
 from parameters import Parameters
 
 
@@ -16,11 +15,13 @@ class MeasurementFrame:
     update_overview()       Automatically updates the overview plots
     start_current_plot()    Start the current plot with asking the user if ammeter should be switched on if not already
     update_plot()           Automatically updates the plots in the respective subframes. Plot specified in arguments.
+    stop_plot()             Stops the automatic update of a plot and its subscription to the acquisition scheduler
+    get_subscription()      Returns the subscription of a plot to the acquisition scheduler (created if needed)
     update_meas_interval_x  Updates the plot measurement intervals, x can be voltage, current, temperature, or humidity
     show_sub_frame_y        Show/Hide the subframes, y can be overview, voltage, current, temperature, or humidity
     """
 
-    def __init__(self, root, electrometer, hvamp, hum_sensor, labjack):
+    def __init__(self, root, electrometer, hvamp, hum_sensor, labjack, scheduler):
         """ Constructor of the class MeasurementFrame
 
         For the following device parameters, use the corresponding class in the package 'devices'
@@ -29,6 +30,7 @@ class MeasurementFrame:
         :param hvamp: object for controlling the high voltage amplifier
         :param hum_sensor: object for controlling the humidity sensor
         :param labjack: object for controlling the labjack
+        :param scheduler: instance of the class AcquisitionScheduler (all plot data is taken from its samples)
         """
 
         # initialize class vars given in class parameters
@@ -37,6 +39,10 @@ class MeasurementFrame:
         self.electrometer = electrometer
         self.hum_sensor = hum_sensor
         self.labjack = labjack
+        self.scheduler = scheduler
+
+        # initialize subscriptions to the acquisition scheduler for each plot {plot: subscription}
+        self.subscriptions = {}
 
         # initialize after_id variables for each subframe
         self.after_id_overview = None
@@ -131,7 +137,7 @@ class MeasurementFrame:
 
         # add buttons for starting and stopping the plotting process
         tk.Button(self.sub_frame_overview, text="Start", command=self.update_overview).grid(row=1, padx=(10, 0), pady=(400, 0), sticky="W")
-        tk.Button(self.sub_frame_overview, text="Stop", command=lambda: self.root.after_cancel(self.after_id_overview)).grid(row=1, column=1, pady=(400, 0), padx=5, sticky="W")
+        tk.Button(self.sub_frame_overview, text="Stop", command=lambda: self.stop_plot("overview")).grid(row=1, column=1, pady=(400, 0), padx=5, sticky="W")
 
         #####################################################
         # --------------- Sub Frame: Voltage -------------- #
@@ -161,7 +167,7 @@ class MeasurementFrame:
 
         # place buttons for start/stop plot, lin/log mode and measurement interval settings
         tk.Button(self.sub_frame_voltage, text="Start", command=lambda: self.update_plot("volt", [])).grid(row=1, padx=(10, 0), pady=(400, 0), sticky="W")
-        tk.Button(self.sub_frame_voltage, text="Stop", command=lambda: self.root.after_cancel(self.after_id_volt)).grid(row=1, column=1, pady=(400, 0), padx=5, sticky="W")
+        tk.Button(self.sub_frame_voltage, text="Stop", command=lambda: self.stop_plot("volt")).grid(row=1, column=1, pady=(400, 0), padx=5, sticky="W")
         tk.Button(self.sub_frame_voltage, text="Lin mode", command=lambda: self.linlogmode_voltage.set("lin")).grid(row=1, column=2, padx=(15, 0), pady=(400, 0), sticky="W")
         tk.Button(self.sub_frame_voltage, text="Log mode", command=lambda: self.linlogmode_voltage.set("log")).grid(row=1, column=3, padx=5, pady=(400, 0), sticky="W")
         tk.Label(self.sub_frame_voltage, text="Set interval in ms:").grid(row=1, column=4, pady=(400, 0), padx=5, sticky="W")
@@ -197,7 +203,7 @@ class MeasurementFrame:
 
         # place buttons for start/stop plot, lin/log mode and measurement interval settings
         tk.Button(self.sub_frame_current, text="Start", command=lambda: self.start_current_plot("current", [])).grid(row=1, padx=(10, 0), pady=(400, 0), sticky="W")
-        tk.Button(self.sub_frame_current, text="Stop", command=lambda: self.root.after_cancel(self.after_id_current)).grid(row=1, column=1, pady=(400, 0), padx=5, sticky="W")
+        tk.Button(self.sub_frame_current, text="Stop", command=lambda: self.stop_plot("current")).grid(row=1, column=1, pady=(400, 0), padx=5, sticky="W")
         tk.Button(self.sub_frame_current, text="Lin mode", command=lambda: self.linlogmode_current.set("lin")).grid(row=1, column=2, padx=(15, 0), pady=(400, 0), sticky="W")
         tk.Button(self.sub_frame_current, text="Log mode", command=lambda: self.linlogmode_current.set("log")).grid(row=1, column=3, padx=5, pady=(400, 0), sticky="W")
         tk.Label(self.sub_frame_current, text="Set interval in ms:").grid(row=1, column=4, pady=(400, 0), padx=5, sticky="W")
@@ -233,7 +239,7 @@ class MeasurementFrame:
 
         # place buttons for start/stop plot, lin/log mode and measurement interval settings
         tk.Button(self.sub_frame_temp, text="Start", command=lambda: self.update_plot("temp", [])).grid(row=1, padx=(10, 0), pady=(400, 0), sticky="W")
-        tk.Button(self.sub_frame_temp, text="Stop",command=lambda: self.root.after_cancel(self.after_id_temp)).grid(row=1, column=1, pady=(400, 0), padx=5, sticky="W")
+        tk.Button(self.sub_frame_temp, text="Stop",command=lambda: self.stop_plot("temp")).grid(row=1, column=1, pady=(400, 0), padx=5, sticky="W")
         tk.Button(self.sub_frame_temp, text="Lin mode", command=lambda: self.linlogmode_temp.set("lin")).grid(row=1, column=2, padx=(15, 0), pady=(400, 0), sticky="W")
         tk.Button(self.sub_frame_temp, text="Log mode", command=lambda: self.linlogmode_temp.set("log")).grid(row=1, column=3, padx=5, pady=(400, 0), sticky="W")
         tk.Label(self.sub_frame_temp, text="Set interval in ms:").grid(row=1, column=4, pady=(400, 0), padx=5,sticky="W")
@@ -269,7 +275,7 @@ class MeasurementFrame:
 
         # place buttons for start/stop plot, lin/log mode and measurement interval settings
         tk.Button(self.sub_frame_humidity, text="Start", command=lambda: self.update_plot("humidity", [])).grid(row=1, padx=(10, 0), pady=(400, 0), sticky="W")
-        tk.Button(self.sub_frame_humidity, text="Stop", command=lambda: self.root.after_cancel(self.after_id_humidity)).grid(row=1, column=1, pady=(400, 0),padx=5, sticky="W")
+        tk.Button(self.sub_frame_humidity, text="Stop", command=lambda: self.stop_plot("humidity")).grid(row=1, column=1, pady=(400, 0),padx=5, sticky="W")
         tk.Button(self.sub_frame_humidity, text="Lin mode", command=lambda: self.linlogmode_humidity.set("lin")).grid(row=1, column=2, padx=(15, 0), pady=(400, 0), sticky="W")
         tk.Button(self.sub_frame_humidity, text="Log mode", command=lambda: self.linlogmode_humidity.set("log")).grid(row=1, column=3, padx=5, pady=(400, 0), sticky="W")
         tk.Label(self.sub_frame_humidity, text="Set interval in ms:").grid(row=1, column=4, pady=(400, 0), padx=5, sticky="W")
@@ -290,15 +296,16 @@ class MeasurementFrame:
         titles = ["Voltage in V", "Current in pA", "Temperature in °C", "Relative humidity in %"]
         x_labels = ["Datapoints", "Datapoints", "Datapoints", "Datapoints"]
 
-        # get new sensor values
-        values = measure.measure_all_values(self.electrometer, self.hvamp, self.hum_sensor, self.labjack)
-        for i in range(len(self.overview_data)):
-            # shorten data lists to a maximum of 50 elements
-            if len(self.overview_data[i]) >= 50:
-                self.overview_data[i] = self.overview_data[i][1:len(self.overview_data[i])]
+        # get new samples of the acquisition scheduler
+        for sample in self.get_subscription("overview", 500).get():
+            values = [sample.voltage, sample.current, sample.temperature, sample.humidity]
+            for i in range(len(self.overview_data)):
+                # shorten data lists to a maximum of 50 elements
+                if len(self.overview_data[i]) >= 50:
+                    self.overview_data[i] = self.overview_data[i][1:len(self.overview_data[i])]
 
-            # append new values
-            self.overview_data[i].append(values[i])
+                # append new values
+                self.overview_data[i].append(values[i])
 
         if Parameters.DEBUG:
             print(self.overview_data)
@@ -348,32 +355,34 @@ class MeasurementFrame:
         # initialize lists for objects (figures and plots), data, and settings (lin/log, labels)
         objects, data, settings = [], [], []
 
-        # add correct list elements depending on plot
+        # add correct list elements depending on plot, data: [datapoints, new samples of the acquisition scheduler]
         if plot == "volt":
             objects = [self.graph_volt, self.ax_volt]
-            data = [datapoints, measure.measure_voltage(self.labjack)]
+            samples = self.get_subscription(plot, self.meas_interval_voltage).get()
+            data = [datapoints, [sample.voltage for sample in samples]]
             settings = [self.linlogmode_voltage.get(), "Datapoints", "Voltage in V"]
         elif plot == "current":
             objects = [self.graph_current, self.ax_current]
-            data = [datapoints, measure.measure_current(self.electrometer)]
+            samples = self.get_subscription(plot, self.meas_interval_current).get()
+            data = [datapoints, [sample.current for sample in samples]]
             settings = [self.linlogmode_current.get(), "Datapoints", "Current in pA"]
         elif plot == "temp":
             objects = [self.graph_temp, self.ax_temp]
-            data = [datapoints, measure.measure_temperature(self.electrometer)]
+            samples = self.get_subscription(plot, self.meas_interval_temp).get()
+            data = [datapoints, [sample.temperature for sample in samples]]
             settings = [self.linlogmode_temp.get(), "Datapoints", "Temperature in °C"]
         elif plot == "humidity":
             objects = [self.graph_humidity, self.ax_humidity]
-            data = [datapoints, measure.measure_humidity(self.hum_sensor)]
+            samples = self.get_subscription(plot, self.meas_interval_humidity).get()
+            data = [datapoints, [sample.humidity for sample in samples]]
             settings = [self.linlogmode_humidity.get(), "Datapoints", "RH in %"]
         else:
             raise ValueError
 
-        # limit data list to 50 elements. Drop oldest one if more than 50 elements
-        if len(data[0]) >= 50:
-            data[0] = data[0][1:len(data[0])]
-
-        # append new data point
-        data[0].append(data[1])
+        # append new data points and limit data list to 50 elements (drop oldest ones)
+        data[0].extend(data[1])
+        if len(data[0]) > 50:
+            data[0] = data[0][len(data[0]) - 50:]
 
         # clear plot, set labels and show grid
         objects[1].cla()
@@ -404,6 +413,43 @@ class MeasurementFrame:
         else:
             raise ValueError
 
+    def stop_plot(self, plot):
+        """ Stops the automatic update of a plot and closes its subscription to the acquisition scheduler.
+
+        :param plot: plot to be stopped, must be 'overview', 'volt', 'current', 'temp', or 'humidity'
+        :return: None
+        """
+
+        # cancel the after task of the plot
+        after_ids = {"overview": self.after_id_overview, "volt": self.after_id_volt,
+                     "current": self.after_id_current, "temp": self.after_id_temp,
+                     "humidity": self.after_id_humidity}
+        if after_ids[plot] is not None:
+            self.root.after_cancel(after_ids[plot])
+
+        # unsubscribe, the scheduler stops reading the devices if no subscription is left
+        subscription = self.subscriptions.pop(plot, None)
+        if subscription is not None:
+            subscription.close()
+
+    def get_subscription(self, plot, interval):
+        """ Returns the subscription of a plot to the acquisition scheduler. The subscription is created at the first
+        call (backlog policy 'queue', i.e. no datapoint is lost) and its interval is updated at every call.
+
+        :param plot: plot name, must be 'overview', 'volt', 'current', 'temp', or 'humidity'
+        :param interval: plot measurement interval in ms
+        :return: instance of the class Subscription
+        """
+
+        subscription = self.subscriptions.get(plot)
+        if subscription is None:
+            subscription = self.scheduler.subscribe(interval / 1000, 'queue')
+            self.subscriptions[plot] = subscription
+        else:
+            subscription.set_interval(interval / 1000)
+
+        return subscription
+
     def update_meas_interval_voltage(self):
         """ Updates the voltage measurement interval depending on user input
 
@@ -1,7 +1,7 @@
 import tkinter as tk
 import tkinter.messagebox
 import utilities.log_module as log
-import utilities.measure_module as measure
+from utilities.acquisition_scheduler import get_fresh_flags
 from parameters import Parameters
 from gui_classes.auto_run_frame import AutoRunFrame
 
@@ -17,7 +17,7 @@ class RecordingFrame:
     stop_recording()    Finish method, task is done once at the end if user stops the recording process
     """
 
-    def __init__(self, root, electrometer, hvamp, hum_sensor, labjack, relays):
+    def __init__(self, root, electrometer, hvamp, hum_sensor, labjack, relays, scheduler):
         """ Constructor of the class RecordingFrame
 
         For the following device parameters, use the corresponding class in the package 'devices'
@@ -25,6 +25,7 @@ class RecordingFrame:
         :param electrometer: object for controlling the electrometer
         :param hvamp: object for controlling the high voltage amplifier
         :param hum_sensor: object for controlling the humidity sensor
+        :param scheduler: instance of the class AcquisitionScheduler (all logged values are taken from its samples)
         """
 
         # initialize class vars
@@ -34,9 +35,11 @@ class RecordingFrame:
         self.hum_sensor = hum_sensor
         self.labjack = labjack
         self.relays = relays
+        self.scheduler = scheduler
 
         # initialize recording vars and set default values
         self.after_id = None
+        self.subscription = None
         self.filename = ""
         self.recording_state = False
         self.interval = 1000
@@ -97,7 +100,7 @@ class RecordingFrame:
         else:
             # start auto run frame
             AutoRunFrame(self.root, self.electrometer, self.hvamp, self.hum_sensor, self.labjack, self.relays,
-                         self.filename.get())
+                         self.filename.get(), self.scheduler)
 
     def start_recording(self):
         """ Setting up various tasks for starting to record. If successful, the method record() is started.
@@ -125,29 +128,35 @@ class RecordingFrame:
 
                 # create log file with data information (DO NOT CHANGE)
                 log.create_logfile(self.filename.get())
-                log.log_message("Params: date, time, absolute_time, voltage, current, temperature, humidity, measurement_range_id, measurement_speed")
-                log.log_message("Units: -,-,s,V,pA,°C,RHin%,-,-")
+                log.log_message("Params: date, time, absolute_time, voltage, current, temperature, humidity, measurement_range_id, measurement_speed, measurement_filter, fresh_flags")
+                log.log_message("Units: -,-,s,V,pA,°C,RHin%,-,-,-,-")
+
+                # subscribe to the acquisition scheduler, all samples are logged (queue)
+                self.subscription = self.scheduler.subscribe(self.interval / 1000, 'queue')
 
                 # start to record
                 self.record()
 
     def record(self):
-        """ Periodically logs all sensor values
+        """ Periodically logs all new samples of the acquisition scheduler
 
         :return: None
         """
 
-        # get all sensor values
-        values = measure.measure_all_values(self.electrometer, self.hvamp, self.hum_sensor, self.labjack)
+        for sample in self.subscription.get():
+            # get all sensor values
+            values = [sample.voltage, sample.current, sample.temperature, sample.humidity]
 
-        # append measurement range
-        values.append(self.electrometer.range)
+            # append measurement range, speed and filter of the sample
+            values.append(sample.range)
+            values.append(sample.speed)
+            values.append(sample.filter)
 
-        # append measurement speed
-        values.append(self.electrometer.speed)
+            # append fresh flags of voltage, current, temperature, humidity (F: read in this cycle, H: held value)
+            values.append(get_fresh_flags(sample))
 
-        # log all values
-        log.log_values(values)
+            # log all values with the time of the measurement
+            log.log_values(values, sample.timestamp)
 
         # setup next record method call after specified measurement interval
         self.after_id = self.root.after(self.interval, self.record)
@@ -170,5 +179,9 @@ class RecordingFrame:
             # stop recording process
             self.root.after_cancel(self.after_id)
 
+            # unsubscribe from the acquisition scheduler
+            self.subscription.close()
+            self.subscription = None
+
             # reset after_id, var is also used for checking if a logging process is in progress (in start_recording())
             self.after_id = None
@@ -75,9 +75,14 @@ class SafetyCircuitFrame:
         :return: None
         """
 
-        # get states
-        s1_state = self.labjack.read_digital(Parameters.LJ_DIGITAL_IN_PILZ_S1)
-        s2_state = self.labjack.read_digital(Parameters.LJ_DIGITAL_IN_PILZ_S2)
+        # get states (reuses the digital snapshot of the safety circuit if recent enough)
+        snapshot = self.labjack.get_digital_snapshot()
+        if snapshot:
+            s1_state = snapshot.state(Parameters.LJ_DIGITAL_IN_PILZ_S1)
+            s2_state = snapshot.state(Parameters.LJ_DIGITAL_IN_PILZ_S2)
+        else:
+            s1_state = False
+            s2_state = False
         relay_state_text = self.relays.safety_state
 
         # handle error messages (remember no/nc switch mechanisms HIGH/LOW)
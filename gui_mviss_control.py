@@ -15,25 +15,34 @@ from gui_classes.recording_frame import RecordingFrame
 
 import utilities.safety_circuit as safety
 import utilities.breakdown_detection as bd
+import utilities.labjack_ain_tuner as ain_tuner
+from utilities.labjack_supervisor import LabjackSupervisor
+from utilities.acquisition_scheduler import AcquisitionScheduler
 
 from parameters import Parameters
 
 
-def on_closing(root, electrometer, relays, hvamp):
+def on_closing(root, electrometer, relays, hvamp, supervisor, scheduler):
     """ Method which is called if the user explicitly quits the gui, i.e. clicks on the "X" button on top right corner.
 
     :param root: tkinter root instance
     :param electrometer: instance of the class Electrometer
     :param relays: instance of the class Relays
     :param hvamp: instance of the class HVAmp
+    :param supervisor: instance of the class LabjackSupervisor
+    :param scheduler: instance of the class AcquisitionScheduler
     :return: None
     """
 
     # ask user for confirmation
     if tk.messagebox.askokcancel("Quit", "Do you want to quit?"):
+        # stop acquisition scheduler and labjack reconnect supervisor
+        scheduler.stop()
+        supervisor.stop()
         # switch off all relays
         relays.switch_off_all_relays()
-        # set LJ-Tick voltage to zero (hvamp control voltage)
+        # stop running hvamp waveforms and set LJ-Tick voltage to zero (hvamp control voltage)
+        hvamp.stop_waveforms()
         hvamp.set_voltage(0)
         # set Electrometer voltage to zero, disable ammeter and source
         electrometer.set_voltage(0)
@@ -58,11 +67,16 @@ def gui():
     hvamp = HVAmp(labjack)
     humidity_sensor = SensorHtm2500lf(labjack)
 
-    # define basic labjack parameters
-    labjack.set_analog_in_resolution(Parameters.LJ_ANALOG_IN_HV_PROBE, 12)  # 12-bit adc resolution
+    # define basic labjack parameters (analog input profile, re-applied automatically after reconnect)
+    labjack.set_channel_profile(ain_tuner.load_profile())
 
     # define basic electrometer parameters
-    electrometer.set_speed('stable')
+    electrometer.set_speed(Parameters.EM_SPEED)
+    electrometer.set_filter(Parameters.EM_AVERAGE_COUNT, Parameters.EM_AVERAGE_MODE, Parameters.EM_MEDIAN_RANK)
+
+    # start acquisition scheduler (all periodic device reads, devices are only read if there are subscriptions)
+    scheduler = AcquisitionScheduler(electrometer, hvamp, humidity_sensor, labjack)
+    scheduler.start()
 
     # initialize tkinter instance
     root = tk.Tk()
@@ -70,8 +84,15 @@ def gui():
     # start safety circuit
     safety.start_safety_circuit(root, labjack, relays, electrometer, hvamp)
 
+    # start labjack reconnect supervisor (re-applies the hvamp reference voltage after reconnect on the tkinter
+    # thread, the relays are re-initialized by the safety circuit)
+    supervisor = LabjackSupervisor(root, labjack)
+    supervisor.add_reconnect_action(hvamp.set_reference_voltage)
+    supervisor.start()
+
     # start breakdown detection
-    #bd.breakdown_detection(root, labjack, relays, electrometer, hvamp, False)
+    #bd.breakdown_detection(root, labjack, relays, electrometer, hvamp, False,
+    #                       scheduler.subscribe(Parameters.BD_INTERVAL, 'latest'))
 
     # set gui name
     root.title("MVISS Control")
@@ -87,11 +108,11 @@ def gui():
     DevicesFrame(root, labjack, electrometer)
     SafetyCircuitFrame(root, labjack, relays)
     ControlFrame(root, labjack, relays, electrometer, hvamp)
-    MeasurementFrame(root, electrometer, hvamp, humidity_sensor, labjack)
-    RecordingFrame(root, electrometer, hvamp, humidity_sensor, labjack, relays)
+    MeasurementFrame(root, electrometer, hvamp, humidity_sensor, labjack, scheduler)
+    RecordingFrame(root, electrometer, hvamp, humidity_sensor, labjack, relays, scheduler)
 
     # introduce closing action with protocol handler
-    root.protocol("WM_DELETE_WINDOW", lambda: on_closing(root, electrometer, relays, hvamp))
+    root.protocol("WM_DELETE_WINDOW", lambda: on_closing(root, electrometer, relays, hvamp, supervisor, scheduler))
 
     # execute GUI
     root.mainloop()
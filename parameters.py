@@ -24,9 +24,64 @@ class Parameters:
     # Breakdown interval in seconds specifies how often the routine checks for a breakdown
     BD_INTERVAL = 2
 
+    # Acquisition scheduler sampling interval in s (all periodic device reads, subscriptions are decimated from it)
+    ACQ_INTERVAL = 0.5
+
+    # Acquisition scheduler maximum number of queued samples per subscription (backlog policy 'queue')
+    ACQ_QUEUE_SIZE = 1000
+
+    # Acquisition scheduler sampling interval in s of slow channels, the last value is held in between
+    # (channels which are not listed, i.e. voltage, current and hvamp current, are read at ACQ_INTERVAL.
+    # The hvamp current is used by the breakdown detection and read in the same labjack transaction as the voltage)
+    ACQ_CHANNEL_INTERVALS = {'temperature': 10, 'humidity': 10, 'hvamp_voltage': 5}
+
     # Keysight VISA address
     KEYSIGHT_VISA_ADDRESS = "USB0::0x0957::0xD518::MY54321380::0::INSTR"
 
+    # Electrometer simulation: a visa address starting with "SIM::" (e.g. "SIM::B2985A") selects the in-process
+    # scpi simulation of the electrometer, factor for all simulated latencies (1 is real time, 0 virtual clock)
+    EM_SIMULATION_TIME_SCALE = 1.0
+
+    # Electrometer status byte poll interval in s (completion detection of triggered measurements)
+    EM_POLL_INTERVAL = 0.005
+
+    # Electrometer maximum waiting time for a triggered measurement in s
+    EM_FETCH_TIMEOUT = 10
+
+    # Electrometer maximum number of readings per buffered block fetch
+    EM_BUFFER_BLOCK_SIZE = 5000
+
+    # Electrometer transfer format of multi-value fetches: 'ascii' or 'binary' (REAL,64)
+    EM_DATA_FORMAT = 'binary'
+
+    # Electrometer connection check is skipped if the last response is more recent than this interval in s
+    EM_CONNECTION_CHECK_INTERVAL = 1
+
+    # Electrometer filters at startup: averaging count (1: off), averaging mode ('moving', 'repeat'), median rank (0: off)
+    EM_AVERAGE_COUNT = 1
+    EM_AVERAGE_MODE = 'repeat'
+    EM_MEDIAN_RANK = 0
+
+    # Electrometer maximum number of source list points (list sweep)
+    EM_LIST_SWEEP_MAX_POINTS = 2500
+
+    # Electrometer measurement speed at startup: 'quick', 'normal', 'stable' or 'adaptive'
+    EM_SPEED = 'stable'
+
+    # Electrometer adaptive aperture: selectable aperture times in s (ascending) and target relative noise
+    EM_ADAPTIVE_APERTURES = [0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5]
+    EM_ADAPTIVE_NOISE_TARGET = 0.005
+
+    # Electrometer noise model: rms noise as fraction of the range value at the reference aperture in s
+    EM_NOISE_RANGE_FRACTION = 5e-4
+    EM_NOISE_REFERENCE_APERTURE = 0.02
+
+    # Labjack simulation: if True, the in-process simulated ljm backend is used instead of the real labjack
+    LABJACK_SIMULATED = False
+
+    # Labjack simulation: factor for all simulated latencies (1 is real time, 0 disables the latency model)
+    LABJACK_SIMULATION_TIME_SCALE = 1.0
+
     # Labjack serial number
     LABJACK_SERIAL_NUMBER = "470019966"
 
@@ -36,6 +91,12 @@ class Parameters:
     # Labjack model
     LABJACK_MODEL = "T7"
 
+    # Labjack reconnect supervisor: check interval, first retry delay and maximum retry delay in s
+    # (the retry delay is doubled after every failed reconnect attempt)
+    LJ_SUPERVISOR_INTERVAL = 0.2
+    LJ_RECONNECT_INITIAL_DELAY = 0.5
+    LJ_RECONNECT_MAX_DELAY = 30
+
     # Location for logfiles
     LOCATION_LOG_FILES = "C:/Users/eliasl/Documents/logfiles/"
 
@@ -52,6 +113,40 @@ class Parameters:
     LJ_ANALOG_IN_HVAMP_VOLTAGE = "AIN2"
     LJ_ANALOG_IN_HVAMP_CURRENT = "AIN3"
 
+    # Labjack analog input channel profile, applied at startup and after every reconnect
+    # resolution_index: 0-12 (0 is device default), range: 10, 1, 0.1 or 0.01 V, settling_us: 0 is auto,
+    # negative_channel: 199 is single ended (GND)
+    LJ_ANALOG_IN_PROFILE = {
+        "AIN0": {"resolution_index": 12, "range": 10, "settling_us": 0, "negative_channel": 199},
+        "AIN2": {"resolution_index": 0, "range": 10, "settling_us": 0, "negative_channel": 199},
+        "AIN3": {"resolution_index": 0, "range": 10, "settling_us": 0, "negative_channel": 199},
+        "AIN10": {"resolution_index": 0, "range": 10, "settling_us": 0, "negative_channel": 199},
+        "AIN11": {"resolution_index": 0, "range": 10, "settling_us": 0, "negative_channel": 199},
+    }
+
+    # Labjack analog input profile file written by the auto tuner (utilities/labjack_ain_tuner.py).
+    # If the file exists, it is loaded at startup instead of LJ_ANALOG_IN_PROFILE
+    LJ_ANALOG_IN_PROFILE_FILE = "labjack_ain_profile.json"
+
+    # Labjack analog input rms noise targets in V used by the auto tuner (noise must be below target)
+    LJ_ANALOG_IN_NOISE_TARGETS = {"AIN0": 0.0001, "AIN2": 0.001, "AIN3": 0.001, "AIN10": 0.001, "AIN11": 0.001}
+
+    # Labjack stream mode scan list (analog inputs sampled in each scan)
+    LJ_STREAM_SCAN_LIST = ["AIN0", "AIN2", "AIN3", "AIN10", "AIN11"]
+
+    # Labjack stream mode scan rate in Hz (scans per second, i.e. sample rate per channel)
+    LJ_STREAM_SCAN_RATE = 1000
+
+    # Labjack stream mode scans per read (number of scans collected in one stream read, i.e. block size)
+    LJ_STREAM_SCANS_PER_READ = 500
+
+    # Labjack stream mode ring buffer size in scans (60 s at 1 kHz)
+    LJ_STREAM_BUFFER_SIZE = 60000
+
+    # Labjack stream mode resolution index (0 is default) and settling time in us (0 is auto)
+    LJ_STREAM_RESOLUTION_INDEX = 0
+    LJ_STREAM_SETTLING_US = 0
+
     # Labjack digital output port for hv_enable (part of safety circuit)
     LJ_DIGITAL_OUT_SAFETY_RELAY = "FIO0"
 
@@ -64,6 +159,10 @@ class Parameters:
     # Labjack digital output port for signal lamps
     LJ_DIGITAL_OUT_SIGNAL_LAMP = "FIO3"
 
+    # Maximum age in s of a shared labjack digital snapshot (safety circuit reads a new snapshot every 200 ms,
+    # gui display reuses it if it is not older than this value, safety decisions always read a new snapshot)
+    LJ_DIGITAL_SNAPSHOT_MAX_AGE = 0.25
+
     # Labjack digital input port for Pilz S1 state
     LJ_DIGITAL_IN_PILZ_S1 = "FIO4"
 
@@ -78,5 +177,8 @@ class Parameters:
     LJ_ANALOG_OUT_HVA_REF = "A"
     LJ_ANALOG_OUT_HVA_CTRL = "B"
 
+    # High voltage amplifier waveform generator: default time between two setpoints of ramps in s
+    HVAMP_WAVEFORM_STEP_INTERVAL = 0.02
+
     # active source default value. can be either 'h' for high voltage amplifier or 'e' for electrometer
     active_source = 'h'
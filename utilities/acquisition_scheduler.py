@@ -0,0 +1,368 @@
+"""
+This module provides the central acquisition scheduler of the mviss test setup. A single thread owns all periodic
+device reads (measure_channels, labjack and electrometer in parallel) and produces timestamped samples
+at the interval Parameters.ACQ_INTERVAL.
+Consumers (plots, loggers, auto ranging, breakdown detection) do not read the devices themselves but subscribe to
+the scheduler with their own interval and backlog policy:
+- 'latest': only the most recent sample is kept (e.g. auto ranging, breakdown detection)
+- 'queue': all samples are kept in a bounded queue, the oldest samples are dropped if the queue is full (e.g. logging)
+Tkinter consumers poll their subscription with root.after(), i.e. the gui thread never waits for a device.
+Devices are only read if at least one subscription exists.
+
+Multi-rate sampling: voltage, current and hvamp current (breakdown detection) are read in every cycle. Slow channels
+(temperature, humidity, hvamp voltage monitor) are only read at their own interval (see
+Parameters.ACQ_CHANNEL_INTERVALS) and their last value is held in the samples between two reads. Every sample
+records which values are fresh (read in this cycle) and which are held.
+"""
+
+import threading
+import time
+import collections
+import utilities.measure_module as measure
+from parameters import Parameters
+
+# timestamped sample: time.time() of the measurement, voltage in V, current in pA, temperature in °C, humidity in %,
+# hvamp voltage monitor in V, hvamp current monitor in A, time.time() of the read of each value {channel: t},
+# fresh flags {channel: True if read in this cycle, False if held} and the electrometer settings of the measurement
+# (range number, speed, filter description)
+Sample = collections.namedtuple('Sample', ['timestamp', 'voltage', 'current', 'temperature', 'humidity',
+                                           'hvamp_voltage', 'hvamp_current', 'timestamps', 'fresh', 'range',
+                                           'speed', 'filter'])
+
+# channels of the logged values and their order in the fresh flags (see get_fresh_flags())
+LOGGED_CHANNELS = ['voltage', 'current', 'temperature', 'humidity']
+
+
+def get_fresh_flags(sample, channels=None):
+    """ Returns the fresh flags of a sample as string for logging, one character per channel: 'F' if the value
+    was read in this cycle, 'H' if the value is held from an earlier read. E.g. 'FFHH'.
+
+    :param sample: instance of Sample
+    :param channels: list of channels, default LOGGED_CHANNELS (voltage, current, temperature, humidity)
+    :return: string with one character per channel
+    """
+
+    channels = channels if channels is not None else LOGGED_CHANNELS
+
+    return ''.join('F' if sample.fresh[channel] else 'H' for channel in channels)
+
+
+class Subscription:
+    """ This class implements a subscription to the acquisition scheduler. Samples are delivered by the scheduler
+    thread and fetched by the consumer (e.g. tkinter after loop). A sample is delivered if at least the subscription
+    interval has passed since the last delivered sample (10% tolerance for timing jitter).
+
+    Methods
+    ---------
+    get()           Returns all new samples in chronological order (empty list if there is no new sample)
+    latest()        Returns the last delivered sample without consuming it
+    set_interval()  Sets the interval of the subscription
+    close()         Unsubscribes from the scheduler
+
+    """
+
+    def __init__(self, scheduler, interval, policy, size):
+        """ Constructor of the class Subscription. Use AcquisitionScheduler.subscribe() to create subscriptions.
+
+        :param scheduler: instance of the class AcquisitionScheduler
+        :param interval: minimum time between two delivered samples in s
+        :param policy: backlog policy, 'latest' or 'queue'
+        :param size: maximum number of queued samples (policy 'queue')
+        :exception ValueError: If the policy or size is invalid
+        """
+
+        # check input parameters
+        if policy not in ['latest', 'queue'] or size < 1:
+            raise ValueError
+
+        # init class vars
+        self.scheduler = scheduler
+        self.interval = interval
+        self.policy = policy
+        self.samples = collections.deque(maxlen=1 if policy == 'latest' else size)
+        self.last_sample = None
+
+        # number of samples dropped because the consumer was too slow (policy 'queue' only)
+        self.dropped = 0
+
+        # lock, samples are delivered by the scheduler thread and fetched by the consumer thread
+        self.lock = threading.Lock()
+
+    def get(self):
+        """ Returns all new samples since the last call.
+
+        :return: list of samples (instances of Sample) in chronological order
+        """
+
+        with self.lock:
+            samples = list(self.samples)
+            self.samples.clear()
+
+        return samples
+
+    def latest(self):
+        """ Returns the last delivered sample without consuming it.
+
+        :return: instance of Sample, None if no sample was delivered yet
+        """
+        return self.last_sample
+
+    def set_interval(self, interval):
+        """ Sets the interval of the subscription.
+
+        :param interval: minimum time between two delivered samples in s
+        :return: None
+        """
+        self.interval = interval
+
+    def close(self):
+        """ Unsubscribes from the scheduler. No samples are delivered afterwards.
+
+        :return: None
+        """
+        self.scheduler.unsubscribe(self)
+
+    def _deliver(self, sample):
+        """ Delivers a sample if the subscription interval has passed (called by the scheduler thread).
+
+        :param sample: instance of Sample
+        :return: None
+        """
+
+        # decimate to the subscription interval
+        if self.last_sample is not None and sample.timestamp - self.last_sample.timestamp < self.interval * 0.9:
+            return
+
+        with self.lock:
+            if self.policy == 'queue' and len(self.samples) == self.samples.maxlen:
+                self.dropped += 1
+            self.samples.append(sample)
+            self.last_sample = sample
+
+
+class AcquisitionScheduler:
+    """ This class implements the acquisition scheduler running in its own thread. All device reads are done by the
+    scheduler, consumers subscribe with their own interval and backlog policy.
+
+    Methods
+    ---------
+    subscribe()             Creates a subscription with a given interval and backlog policy
+    unsubscribe()           Removes a subscription
+    start()                 Starts the scheduler thread
+    stop()                  Stops the scheduler thread
+    is_running()            Returns if the scheduler thread is running (True/False)
+    set_interval()          Sets the sampling interval of the scheduler
+    set_channel_interval()  Sets the sampling interval of a channel (slow channels)
+    get_latest()            Returns the latest sample
+
+    """
+
+    def __init__(self, electrometer, hvamp, humidity_sensor, labjack, interval=None, channel_intervals=None):
+        """ Constructor of the class AcquisitionScheduler.
+
+        For the following device parameters, use the corresponding class in the package 'devices'
+        :param electrometer: instance of the class ElectrometerControl
+        :param hvamp: instance of the class HVAmp
+        :param humidity_sensor: instance of the class SensorHtm2500lf
+        :param labjack: instance of the class LabjackConnection
+        :param interval: sampling interval in s, default Parameters.ACQ_INTERVAL
+        :param channel_intervals: sampling interval in s of slow channels {channel: s}, channels which are not given
+                                  are read in every cycle, default Parameters.ACQ_CHANNEL_INTERVALS
+        """
+
+        # init class vars for devices
+        self.electrometer = electrometer
+        self.hvamp = hvamp
+        self.humidity_sensor = humidity_sensor
+        self.labjack = labjack
+
+        # sampling interval in s
+        self.interval = interval if interval is not None else Parameters.ACQ_INTERVAL
+
+        # sampling interval in s of slow channels, held values and time.time() of the last read of each channel
+        if channel_intervals is None:
+            channel_intervals = Parameters.ACQ_CHANNEL_INTERVALS
+        self.channel_intervals = dict(channel_intervals)
+        self.held_values = {channel: None for channel in measure.CHANNELS}
+        self.channel_timestamps = {channel: None for channel in measure.CHANNELS}
+        self.last_read = {channel: None for channel in measure.CHANNELS}
+
+        # subscriptions and latest sample
+        self.subscriptions = []
+        self.latest_sample = None
+        self.lock = threading.Lock()
+
+        # diagnostics: number of samples, intervals missed because a read took longer than the interval, last error
+        self.sample_count = 0
+        self.overruns = 0
+        self.error = None
+
+        # thread handling
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    def subscribe(self, interval=None, policy='latest', size=None):
+        """ Creates a subscription. Intervals shorter than the scheduler interval result in every sample.
+
+        :param interval: minimum time between two delivered samples in s, default scheduler interval
+        :param policy: backlog policy, 'latest' (only the most recent sample) or 'queue' (bounded queue)
+        :param size: maximum number of queued samples (policy 'queue'), default Parameters.ACQ_QUEUE_SIZE
+        :exception ValueError: If the policy or size is invalid
+        :return: instance of the class Subscription
+        """
+
+        interval = interval if interval is not None else self.interval
+        size = size if size is not None else Parameters.ACQ_QUEUE_SIZE
+        subscription = Subscription(self, interval, policy, size)
+
+        with self.lock:
+            self.subscriptions.append(subscription)
+
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """ Removes a subscription. Unknown subscriptions are ignored.
+
+        :param subscription: instance of the class Subscription
+        :return: None
+        """
+
+        with self.lock:
+            if subscription in self.subscriptions:
+                self.subscriptions.remove(subscription)
+
+    def start(self):
+        """ Starts the scheduler thread.
+
+        :return: None
+        """
+
+        if self.is_running():
+            return
+
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="AcquisitionScheduler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """ Stops the scheduler thread (after the read in progress).
+
+        :return: None
+        """
+
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.thread = None
+
+    def is_running(self):
+        """ Returns if the scheduler thread is running.
+
+        :return: True if running, False otherwise
+        """
+        return self.thread is not None and self.thread.is_alive()
+
+    def set_interval(self, interval):
+        """ Sets the sampling interval of the scheduler.
+
+        :param interval: sampling interval in s
+        :exception ValueError: If the interval is not positive
+        :return: None
+        """
+
+        if interval <= 0:
+            raise ValueError
+
+        self.interval = interval
+
+    def set_channel_interval(self, channel, interval):
+        """ Sets the sampling interval of a channel. The channel is read at the next cycle after the interval has
+        passed since its last read.
+
+        :param channel: channel, e.g. 'temperature' (see measure_module.CHANNELS)
+        :param interval: sampling interval in s, None to read the channel in every cycle
+        :exception ValueError: If the channel is unknown
+        :return: None
+        """
+
+        if channel not in measure.CHANNELS:
+            raise ValueError
+
+        if interval is None:
+            self.channel_intervals.pop(channel, None)
+        else:
+            self.channel_intervals[channel] = interval
+
+    def get_latest(self):
+        """ Returns the latest sample.
+
+        :return: instance of Sample, None if no sample was measured yet
+        """
+        return self.latest_sample
+
+    def _run(self):
+        """ Scheduler thread. Reads all devices at the sampling interval and delivers the samples to all subscriptions.
+
+        :return: None
+        """
+
+        next_time = time.perf_counter()
+
+        while not self.stop_event.is_set():
+            with self.lock:
+                subscriptions = list(self.subscriptions)
+
+            # read devices only if there is at least one subscription
+            if len(subscriptions) > 0:
+                try:
+                    timestamp = time.time()
+                    channels = self._due_channels(timestamp)
+                    settings = [self.electrometer.range, self.electrometer.speed,
+                                self.electrometer.get_filter_description()]
+                    values, timestamps = measure.measure_channels(self.electrometer, self.hvamp,
+                                                                  self.humidity_sensor, self.labjack, channels)
+                except Exception as error:
+                    # keep the scheduler alive, the device connections are handled by the device classes
+                    self.error = error
+                    if Parameters.DEBUG:
+                        print("Acquisition error: ", error)
+                else:
+                    # update read channels, hold all other values
+                    for channel in channels:
+                        self.last_read[channel] = timestamp
+                    self.held_values.update(values)
+                    self.channel_timestamps.update(timestamps)
+                    fresh = {channel: channel in values for channel in measure.CHANNELS}
+                    held = self.held_values
+                    sample = Sample(timestamp, held['voltage'], held['current'], held['temperature'],
+                                    held['humidity'], held['hvamp_voltage'], held['hvamp_current'],
+                                    dict(self.channel_timestamps), fresh, *settings)
+                    self.latest_sample = sample
+                    self.sample_count += 1
+                    for subscription in subscriptions:
+                        subscription._deliver(sample)
+
+            # wait for the next interval, skip missed intervals (no burst of reads after a slow read)
+            next_time += self.interval
+            now = time.perf_counter()
+            if next_time < now:
+                self.overruns += 1
+                next_time = now
+            self.stop_event.wait(next_time - now)
+
+    def _due_channels(self, t):
+        """ Returns the channels to read in this cycle: all fast channels and the slow channels whose interval has
+        passed since their last read (10% tolerance for timing jitter).
+
+        :param t: time.time() of the cycle
+        :return: list of channels
+        """
+
+        channels = []
+        for channel in measure.CHANNELS:
+            interval = self.channel_intervals.get(channel)
+            last_read = self.last_read[channel]
+            if interval is None or last_read is None or t - last_read >= interval * 0.9:
+                channels.append(channel)
+
+        return channels
@@ -6,7 +6,6 @@ This module implements the breakdown detection based on two mechanisms:
 
 import time
 import tkinter.messagebox
-import utilities.measure_module as measure
 from parameters import Parameters
 
 
@@ -23,13 +22,13 @@ def breakdown(hvamp, labjack, electrometer, relays, type, values):
     :return:
     """
 
-    # Set voltages to zero
+    # Stop running hvamp waveforms and set voltages to zero
+    hvamp.stop_waveforms()
     hvamp.set_voltage(0)
     electrometer.set_voltage(0)
 
     # open HV relay, close GND relay for safety
-    relays.switch_relay("HV", "OFF", labjack)
-    relays.switch_relay("GND", "ON", labjack)
+    relays.switch_relays({"HV": "OFF", "GND": "ON"})
 
     # Print to console
     print("--------------------------------------------------------------------")
@@ -51,9 +50,11 @@ def breakdown(hvamp, labjack, electrometer, relays, type, values):
         time.sleep(1)
 
 
-def breakdown_detection(root, labjack, relays, electrometer, hvamp, flag):
-    """ Measures the voltage and current at an interval specified in the module parameters. Triggers the
+def breakdown_detection(root, labjack, relays, electrometer, hvamp, flag, subscription):
+    """ Checks the voltage and current at an interval specified in the module parameters. Triggers the
     breakdown method if a breakdown is detected according to the mechanisms described in the introduction of this file.
+    Voltage and current are taken from the latest sample of the acquisition scheduler (each sample is checked once).
+    The hv probe voltage and the hvamp current monitor of a sample are read within a single labjack transaction.
 
     :param root: gui root instance for displaying the popup
     :param labjack: instance of the labjack connection
@@ -61,17 +62,26 @@ def breakdown_detection(root, labjack, relays, electrometer, hvamp, flag):
     :param electrometer: instance of the elctrometer connection
     :param hvamp: instance of the high voltage amplifier class
     :param flag: is either True or False, used for detection of two deviating datapoints in a row
+    :param subscription: subscription to the acquisition scheduler (backlog policy 'latest')
     :return:
     """
 
+    # get latest sample, check again after the interval if there is no new sample
+    samples = subscription.get()
+    if len(samples) == 0:
+        root.after(Parameters.BD_INTERVAL*1000, lambda: breakdown_detection(root, labjack, relays, electrometer, hvamp,
+                                                                            flag, subscription))
+        return
+    sample = samples[-1]
+
     # init temporary flag vars
     flag_voltage = False
     flag_current = False
 
     # --------------- BREAKDOWN DETECTION VIA VOLTAGE --------------- #
 
-    # measure voltage
-    measured_voltage = measure.measure_voltage(labjack)
+    # get measured voltage
+    measured_voltage = sample.voltage
 
     # get voltage currently set by user
     user_voltage_hvamp = hvamp.user_voltage
@@ -102,9 +112,9 @@ def breakdown_detection(root, labjack, relays, electrometer, hvamp, flag):
 
     # --------------- BREAKDOWN DETECTION VIA CURRENT --------------- #
 
-    # measure current
-    measured_current_electrometer_in_pa = measure.measure_current(electrometer)
-    measured_current_hvamp = hvamp.get_current()
+    # get measured current
+    measured_current_electrometer_in_pa = sample.current
+    measured_current_hvamp = sample.hvamp_current
 
     # convert to mA
     measured_current_electrometer_in_ma = measured_current_electrometer_in_pa*0.001*0.001
@@ -131,4 +141,5 @@ def breakdown_detection(root, labjack, relays, electrometer, hvamp, flag):
         flag = True
 
     # check for breakdown periodically
-    root.after(Parameters.BD_INTERVAL*1000, lambda: breakdown_detection(root, labjack, relays, electrometer, hvamp, flag))
+    root.after(Parameters.BD_INTERVAL*1000, lambda: breakdown_detection(root, labjack, relays, electrometer, hvamp, flag,
+                                                                        subscription))
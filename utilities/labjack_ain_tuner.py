@@ -0,0 +1,186 @@
+"""
+This module provides an auto tuner for the speed/noise trade-off of the labjack analog inputs.
+For each channel, the resolution index and the settling time are swept. The conversion time and the rms noise are
+measured on a steady (or shorted) input and the fastest setting meeting the channel's noise target is recommended.
+The resulting profile is saved to a file which is loaded at application startup (see load_profile()).
+
+Usage: run this module directly with steady input signals (e.g. no voltage applied, stable climate)
+-> python -m utilities.labjack_ain_tuner
+"""
+
+import json
+import time
+import numpy
+from pathlib import Path
+from parameters import Parameters
+
+# swept settings: resolution indices (1: fastest, 12: highest resolution) and settling times in us (0 is auto)
+RESOLUTION_INDICES = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12]
+SETTLING_TIMES = [0, 50, 200, 1000]
+
+# number of samples per setting
+SAMPLES = 50
+
+
+def measure_setting(labjack, port, resolution_index, settling_us, samples=SAMPLES):
+    """ Applies the given setting to an analog input and measures conversion time and rms noise.
+
+    :param labjack: instance of the class LabjackConnection
+    :param port: analog input port, e.g. "AIN0"
+    :param resolution_index: resolution index (1-12)
+    :param settling_us: settling time in us (0 is auto)
+    :param samples: number of samples
+    :return: [mean conversion time in s (including communication), rms noise in V], False if the labjack read failed
+    """
+
+    # apply setting, only the changed registers are written due to the shadow register cache
+    profile = {key: dict(value) for key, value in labjack.channel_profile.items()}
+    profile.setdefault(port, {}).update({'resolution_index': resolution_index, 'settling_us': settling_us})
+    if labjack.set_channel_profile(profile) is False:
+        return False
+
+    # read samples and measure time per read
+    values = numpy.zeros(samples)
+    t_start = time.perf_counter()
+    for i in range(samples):
+        result = labjack.read_analog(port)
+        if result is False:
+            return False
+        values[i] = result
+    conversion_time = (time.perf_counter() - t_start) / samples
+
+    # rms noise is the standard deviation of a steady signal
+    noise = float(numpy.std(values))
+
+    return [conversion_time, noise]
+
+
+def tune_channel(labjack, port, noise_target, samples=SAMPLES):
+    """ Sweeps resolution index and settling time of an analog input and recommends the fastest setting
+    which meets the noise target. If no setting meets the target, the setting with the lowest noise is recommended.
+
+    :param labjack: instance of the class LabjackConnection
+    :param port: analog input port, e.g. "AIN0"
+    :param noise_target: maximum rms noise in V
+    :param samples: number of samples per setting
+    :return: [recommended setting {'resolution_index', 'settling_us'}, list of all results
+              [resolution index, settling time in us, conversion time in s, rms noise in V]], False if a read failed
+    """
+
+    # measure all settings
+    results = []
+    for resolution_index in RESOLUTION_INDICES:
+        for settling_us in SETTLING_TIMES:
+            measurement = measure_setting(labjack, port, resolution_index, settling_us, samples)
+            if measurement is False:
+                return False
+            results.append([resolution_index, settling_us, measurement[0], measurement[1]])
+            if Parameters.DEBUG:
+                print("%s: resolution %2i, settling %5i us -> %8.3f ms, noise %.2e V"
+                      % (port, resolution_index, settling_us, measurement[0] * 1000, measurement[1]))
+
+    # choose fastest setting meeting the noise target, otherwise the setting with lowest noise
+    valid = [result for result in results if result[3] <= noise_target]
+    if len(valid) > 0:
+        best = min(valid, key=lambda result: result[2])
+    else:
+        print("Noise target not reached for ", port, ". Using setting with lowest noise.")
+        best = min(results, key=lambda result: result[3])
+
+    return [{'resolution_index': best[0], 'settling_us': best[1]}, results]
+
+
+def tune_all(labjack, noise_targets=None, samples=SAMPLES):
+    """ Tunes all channels given in the noise targets and returns the resulting channel profile.
+    Range and negative channel are taken from the currently applied profile.
+
+    :param labjack: instance of the class LabjackConnection
+    :param noise_targets: dict {port: maximum rms noise in V}, default Parameters.LJ_ANALOG_IN_NOISE_TARGETS
+    :param samples: number of samples per setting
+    :return: channel profile {port: {setting: value}}, False if a read failed
+    """
+
+    if noise_targets is None:
+        noise_targets = Parameters.LJ_ANALOG_IN_NOISE_TARGETS
+
+    # keep original profile, it is restored after tuning
+    original_profile = {key: dict(value) for key, value in labjack.channel_profile.items()}
+
+    # tune channels one after another
+    profile = {key: dict(value) for key, value in original_profile.items()}
+    for port, noise_target in noise_targets.items():
+        result = tune_channel(labjack, port, noise_target, samples)
+        if result is False:
+            labjack.set_channel_profile(original_profile)
+            return False
+        profile.setdefault(port, {}).update(result[0])
+
+    # restore original profile
+    labjack.set_channel_profile(original_profile)
+
+    return profile
+
+
+def save_profile(profile, path=None):
+    """ Saves a channel profile to a json file.
+
+    :param profile: channel profile {port: {setting: value}}
+    :param path: file path, default Parameters.LJ_ANALOG_IN_PROFILE_FILE
+    :return: None
+    """
+
+    if path is None:
+        path = Parameters.LJ_ANALOG_IN_PROFILE_FILE
+
+    with open(path, 'w') as file:
+        json.dump(profile, file, indent=4)
+
+
+def load_profile(path=None):
+    """ Loads the channel profile written by the auto tuner. Channels and settings which are not in the file are
+    taken from Parameters.LJ_ANALOG_IN_PROFILE. If the file does not exist, Parameters.LJ_ANALOG_IN_PROFILE is returned.
+
+    :param path: file path, default Parameters.LJ_ANALOG_IN_PROFILE_FILE
+    :return: channel profile {port: {setting: value}}
+    """
+
+    if path is None:
+        path = Parameters.LJ_ANALOG_IN_PROFILE_FILE
+
+    # start with default profile
+    profile = {key: dict(value) for key, value in Parameters.LJ_ANALOG_IN_PROFILE.items()}
+
+    # update with tuned settings
+    if Path(path).exists():
+        try:
+            with open(path, 'r') as file:
+                tuned_profile = json.load(file)
+        except (OSError, ValueError):
+            print("Couldn't load labjack profile file: ", path)
+        else:
+            for port, settings in tuned_profile.items():
+                profile.setdefault(port, {}).update(settings)
+            if Parameters.DEBUG:
+                print("Loaded labjack profile file: ", path)
+
+    return profile
+
+
+if __name__ == "__main__":
+    from devices.labjack_t7pro import LabjackConnection
+
+    # connect and apply current profile
+    lj = LabjackConnection()
+    if not lj.connection_state:
+        print("Labjack not connected.")
+        exit()
+    lj.set_channel_profile(load_profile())
+
+    # tune all channels and save profile
+    tuned = tune_all(lj)
+    if tuned is False:
+        print("Tuning failed. Check labjack connection.")
+    else:
+        print("Tuned profile: ", tuned)
+        save_profile(tuned)
+    lj.close_connection()
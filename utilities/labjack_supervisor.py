@@ -0,0 +1,230 @@
+"""
+This module provides a background supervisor which automatically reconnects the labjack after a connection loss.
+Reconnect attempts are repeated with exponential backoff. After a successful reconnect, the device configuration
+(channel profile, see LabjackConnection.connect()) is re-applied and all registered reconnect actions (e.g. hvamp
+reference voltage) are executed. Every outage is recorded with start, end and duration.
+
+Threads: the reconnect itself is serialized with all other labjack accesses by the device lock (labjack.lock).
+The supervisor thread never calls tkinter (not thread-safe): finished outages are put on a queue which is drained
+by a root.after() loop started on the tkinter thread. The reconnect actions are executed by this loop, i.e. on the
+tkinter thread like all other device actions of the gui.
+The relays are not touched by the supervisor, the safety circuit (tkinter thread) detects every reconnect and
+switches off all relays (see safety_circuit.auto_update_safety_circuit()).
+"""
+
+import threading
+import time
+import datetime
+import queue
+from parameters import Parameters
+
+
+class LabjackSupervisor:
+    """ This class implements the labjack reconnect supervisor running in its own thread.
+
+    Methods
+    ---------
+    add_reconnect_action()  Registers a function which is called after every successful reconnect
+    start()                 Starts the supervisor thread and the tkinter loop (call on the tkinter thread)
+    stop()                  Stops the supervisor thread and the tkinter loop (call on the tkinter thread)
+    is_running()            Returns if the supervisor thread is running (True/False)
+    get_outages()           Returns all recorded outages
+
+    """
+
+    def __init__(self, root, labjack):
+        """ Constructor of the class LabjackSupervisor.
+
+        :param root: tkinter root instance (reconnect actions are executed on the tkinter thread)
+        :param labjack: instance of the class LabjackConnection
+        """
+
+        # init class vars for tkinter and devices
+        self.root = root
+        self.labjack = labjack
+
+        # functions called after every successful reconnect
+        self.reconnect_actions = []
+
+        # recorded outages, list of dicts {'start': time.time(), 'end': time.time(), 'duration': s}
+        self.outages = []
+        self.outage_start = None
+
+        # finished outages handed over from the supervisor thread to the tkinter thread (reconnect actions)
+        self.finished_outages = queue.Queue()
+        self.after_id = None
+
+        # number of failed reconnect attempts of the current outage
+        self.attempts = 0
+
+        # last error of the supervisor thread or of a reconnect action (diagnostics)
+        self.error = None
+
+        # thread handling
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    def add_reconnect_action(self, action):
+        """ Registers a function which is called (without arguments) on the tkinter thread after every successful
+        reconnect.
+
+        :param action: function to call
+        :return: None
+        """
+        self.reconnect_actions.append(action)
+
+    def start(self):
+        """ Starts the supervisor thread and the tkinter loop executing the reconnect actions.
+        Must be called on the tkinter thread.
+
+        :return: None
+        """
+
+        if self.is_running():
+            return
+
+        # start the tkinter loop (drains the finished outages of the supervisor thread)
+        if self.after_id is None:
+            self.after_id = self.root.after(int(Parameters.LJ_SUPERVISOR_INTERVAL * 1000),
+                                            self._process_finished_outages)
+
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="LabjackSupervisor", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """ Stops the supervisor thread and the tkinter loop. Must be called on the tkinter thread.
+
+        :return: None
+        """
+
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.thread = None
+
+        # stop the tkinter loop
+        if self.after_id is not None:
+            self.root.after_cancel(self.after_id)
+        self.after_id = None
+
+    def is_running(self):
+        """ Returns if the supervisor thread is running.
+
+        :return: True if running, False otherwise
+        """
+        return self.thread is not None and self.thread.is_alive()
+
+    def get_outages(self):
+        """ Returns all recorded outages. An ongoing outage has 'end' and 'duration' set to None.
+
+        :return: list of dicts {'start': time.time(), 'end': time.time(), 'duration': s}
+        """
+
+        outages = list(self.outages)
+        if self.outage_start is not None:
+            outages.append({'start': self.outage_start, 'end': None, 'duration': None})
+
+        return outages
+
+    def _run(self):
+        """ Supervisor thread. Checks the labjack connection state periodically and reconnects if necessary.
+
+        :return: None
+        """
+
+        while not self.stop_event.is_set():
+            try:
+                delay = self._check_connection()
+            except Exception as error:
+                # keep the supervisor alive, retry at the next interval
+                self.error = error
+                delay = Parameters.LJ_SUPERVISOR_INTERVAL
+                if Parameters.DEBUG:
+                    print("labjack supervisor error: ", error)
+            self.stop_event.wait(delay)
+
+    def _check_connection(self):
+        """ Checks the labjack connection state once and tries to reconnect if necessary.
+
+        :return: time to wait until the next check in s
+        """
+
+        # connection alive: finish outage if reconnected by someone else (e.g. connect button)
+        if self.labjack.connection_state:
+            if self.outage_start is not None:
+                self._finish_outage()
+            return Parameters.LJ_SUPERVISOR_INTERVAL
+
+        # connection lost: record outage start
+        if self.outage_start is None:
+            self.outage_start = time.time()
+            self.attempts = 0
+            if Parameters.DEBUG:
+                print("labjack supervisor: connection loss detected")
+
+        # try to reconnect (serialized with all other labjack accesses by the device lock)
+        if self.labjack.connect():
+            self._finish_outage()
+            return Parameters.LJ_SUPERVISOR_INTERVAL
+
+        # exponential backoff
+        delay = min(Parameters.LJ_RECONNECT_INITIAL_DELAY * pow(2, self.attempts), Parameters.LJ_RECONNECT_MAX_DELAY)
+        self.attempts += 1
+        if Parameters.DEBUG:
+            print("labjack supervisor: reconnect failed, next attempt in ", delay, " s")
+
+        return delay
+
+    def _finish_outage(self):
+        """ Records the finished outage and hands it over to the tkinter thread (reconnect actions).
+        Called by the supervisor thread, i.e. tkinter must not be used here.
+
+        :return: None
+        """
+
+        # record outage
+        end = time.time()
+        outage = {'start': self.outage_start, 'end': end, 'duration': end - self.outage_start}
+        self.outages.append(outage)
+        self.outage_start = None
+
+        # the reconnect actions are executed by the tkinter loop
+        self.finished_outages.put(outage)
+
+    def _process_finished_outages(self):
+        """ Tkinter loop: executes the reconnect actions once for every outage finished since the last call.
+
+        :return: None
+        """
+
+        while True:
+            try:
+                outage = self.finished_outages.get_nowait()
+            except queue.Empty:
+                break
+
+            # print outage if debug mode is on (not written to the logfile, data rows must not be interrupted)
+            if Parameters.DEBUG:
+                start_string = datetime.datetime.fromtimestamp(outage['start']).strftime("%d-%m-%Y %H:%M:%S")
+                print("Labjack outage: start ", start_string, ", duration ", round(outage['duration'], 2), " s")
+
+            self._run_reconnect_actions()
+
+        # check again after the interval
+        self.after_id = self.root.after(int(Parameters.LJ_SUPERVISOR_INTERVAL * 1000), self._process_finished_outages)
+
+    def _run_reconnect_actions(self):
+        """ Executes all registered reconnect actions (called on the tkinter thread). A failing action does not
+        prevent the other actions.
+
+        :return: None
+        """
+
+        for action in self.reconnect_actions:
+            try:
+                action()
+            except Exception as error:
+                self.error = error
+                if Parameters.DEBUG:
+                    print("labjack supervisor: reconnect action failed: ", error)
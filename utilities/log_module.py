@@ -74,11 +74,12 @@ def log_all_values(electrometer, hvamp, humidity_sensor):
     log_values(values)
 
 
-def log_values(value_list):
+def log_values(value_list, timestamp=None):
     """ This method logs all values given in the value_list. Location: global var LOCATION.
         Function create_logfile must being called once in order to run this function.
 
     :param value_list: values to log
+    :param timestamp: time.time() of the measurement (e.g. sample of the acquisition scheduler), default now
     :return: None
     """
 
@@ -97,11 +98,13 @@ def log_values(value_list):
     # try to write all sensor values
     try:
         with open(str(LOCATION + filename), 'a') as logfile:
-            # Log date and time
-            dt_now = datetime.datetime.now()
+            # Log date and time of the measurement
+            if timestamp is None:
+                timestamp = time.time()
+            dt_now = datetime.datetime.fromtimestamp(timestamp)
             logfile.write(str(dt_now.strftime("%d-%m-%Y") + ","))
             logfile.write(str(dt_now.strftime("%H:%M:%S") + ","))
-            logfile.write(str(str(int(round(time.time() * 1000))) + ","))
+            logfile.write(str(str(int(round(timestamp * 1000))) + ","))
 
             # Log all values comma separated
             if debug:
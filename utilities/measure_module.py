@@ -4,8 +4,19 @@ The idea of a centralized handling is that the measurement is always done the sa
 -> Always use these methods (instead of directly accessing the class instances of the devices)
 """
 
+import time
+from concurrent.futures import ThreadPoolExecutor
 from parameters import Parameters
 
+# persistent thread pool of the concurrent measurement path (one worker per device: labjack, electrometer)
+executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="measure")
+
+# channels of measure_channels() and analog input ports of the channels read via labjack
+CHANNELS = ['voltage', 'current', 'temperature', 'humidity', 'hvamp_voltage', 'hvamp_current']
+LABJACK_CHANNELS = {'voltage': Parameters.LJ_ANALOG_IN_HV_PROBE, 'humidity': Parameters.LJ_ANALOG_IN_HUMIDITY_SENSOR,
+                    'hvamp_voltage': Parameters.LJ_ANALOG_IN_HVAMP_VOLTAGE,
+                    'hvamp_current': Parameters.LJ_ANALOG_IN_HVAMP_CURRENT}
+
 
 def measure_all_values(electrometer, hvamp, humidity_sensor, labjack):
     """ This method returns the four key measurements of the mviss test setup:
@@ -18,11 +29,161 @@ def measure_all_values(electrometer, hvamp, humidity_sensor, labjack):
     :return: [voltage in V, current in pA, temperature in °C, relative humidity in %]
     """
 
+    # start current measurement, the labjack is read while the electrometer integrates. Trigger and fetch are
+    # separate short electrometer transactions, the session is not held during the aperture time.
+    electrometer.trigger_current()
+
+    # read hv probe and humidity sensor within a single labjack transaction
+    analog_values = labjack.read_analog_many([Parameters.LJ_ANALOG_IN_HV_PROBE,
+                                              Parameters.LJ_ANALOG_IN_HUMIDITY_SENSOR])
+
+    # if the labjack read failed, convert the fail value like a single read would do
+    if not analog_values:
+        analog_values = [analog_values, analog_values]
+
+    # get current and temperature with a single electrometer exchange
+    electrometer_values = electrometer.fetch_all_values()
+
+    # if the electrometer read failed, convert the fail value like the single reads would do
+    if not electrometer_values:
+        electrometer_values = [electrometer_values, electrometer_values]
+
+    return convert_all_values(analog_values, electrometer_values, humidity_sensor)
+
+
+def measure_channels(electrometer, hvamp, humidity_sensor, labjack, channels):
+    """ This method returns the values of the given channels. All labjack channels are read within a single
+    labjack transaction, the electrometer channels with a single electrometer exchange. Both devices are read in
+    parallel on the persistent thread pool of this module, i.e. the cycle time is the latency of the slowest device
+    instead of the sum. The devices are protected by their own locks (labjack.lock, session arbiter of the
+    electrometer), i.e. other threads may use the devices at the same time.
+
+    Channels (see CHANNELS): 'voltage' in V, 'current' in pA, 'temperature' in °C (k-type sensor via electrometer),
+    'humidity' in %, 'hvamp_voltage' in V and 'hvamp_current' in A (hvamp monitors)
+
+    :param electrometer: instance of the class Electrometer
+    :param hvamp: instance of the class HVAmp
+    :param humidity_sensor: instance of the clas HumiditySensor
+    :param labjack: instance of the class Labjack
+    :param channels: list of channels to measure, e.g. ['voltage', 'current']
+    :exception ValueError: If channels is empty or contains an unknown channel
+    :return: [{channel: value}, {channel: time.time() in the middle of the device read}]
+    """
+
+    # check input parameters
+    if len(channels) == 0 or not all(channel in CHANNELS for channel in channels):
+        raise ValueError
+
+    # start the device reads in parallel, only devices with requested channels are read
+    labjack_channels = [channel for channel in CHANNELS if channel in channels and channel in LABJACK_CHANNELS]
+    electrometer_channels = [channel for channel in CHANNELS if channel in channels and channel not in LABJACK_CHANNELS]
+    futures = []
+    if len(labjack_channels) > 0:
+        futures.append(executor.submit(_read_labjack_channels, labjack, labjack_channels))
+    if len(electrometer_channels) > 0:
+        futures.append(executor.submit(_read_electrometer_channels, electrometer, electrometer_channels))
+
+    # wait for all device reads and convert the values
+    values, timestamps = {}, {}
+    for future in futures:
+        raw_values, timestamp = future.result()
+        for channel in raw_values:
+            values[channel] = convert_channel(channel, raw_values[channel], hvamp, humidity_sensor)
+            timestamps[channel] = timestamp
+
+    # print values if debug mode is on
+    if Parameters.DEBUG:
+        print("measured channels: ", values)
+
+    return [values, timestamps]
+
+
+def _read_labjack_channels(labjack, channels):
+    """ Reads the analog inputs of the given channels within a single labjack transaction (worker of the thread pool).
+
+    :param labjack: instance of the class Labjack
+    :param channels: list of labjack channels (see LABJACK_CHANNELS)
+    :return: [{channel: analog signal in V or False}, time.time() of the read]
+    """
+
+    t_start = time.time()
+    analog_values = labjack.read_analog_many([LABJACK_CHANNELS[channel] for channel in channels])
+    timestamp = (t_start + time.time()) / 2
+
+    # if the labjack read failed, convert the fail value like a single read would do
+    if not analog_values:
+        analog_values = [analog_values] * len(channels)
+
+    return [dict(zip(channels, analog_values)), timestamp]
+
+
+def _read_electrometer_channels(electrometer, channels):
+    """ Reads the given electrometer channels with a single exchange (worker of the thread pool).
+
+    :param electrometer: instance of the class Electrometer
+    :param channels: list of electrometer channels ('current', 'temperature')
+    :return: [{channel: raw value or False}, time.time() in the middle of the measurement]
+    """
+
+    t_start = time.time()
+    if 'current' in channels and 'temperature' in channels:
+        # current and temperature with a single chained query
+        electrometer_values = electrometer.get_all_values()
+        if not electrometer_values:
+            electrometer_values = [electrometer_values, electrometer_values]
+        values = {'current': electrometer_values[0], 'temperature': electrometer_values[1]}
+    elif 'current' in channels:
+        values = {'current': electrometer.get_current()}
+    else:
+        values = {'temperature': electrometer.get_temperature()}
+    timestamp = (t_start + time.time()) / 2
+
+    return [values, timestamp]
+
+
+def convert_channel(channel, result, hvamp, humidity_sensor):
+    """ This method converts the raw value of a channel (see measure_channels()) with the methods of this module.
+    Voltage, current, temperature and humidity are rounded to two digits like in measure_all_values().
+
+    :param channel: channel, e.g. 'voltage'
+    :param result: raw value returned by the device (False if the read failed)
+    :param hvamp: instance of the class HVAmp
+    :param humidity_sensor: instance of the clas HumiditySensor
+    :exception ValueError: If the channel is unknown
+    :return: converted value
+    """
+
+    if channel == 'voltage':
+        return round(convert_voltage(result), 2)
+    elif channel == 'current':
+        return round(convert_current(result), 2)
+    elif channel == 'temperature':
+        return round(float(result), 2)
+    elif channel == 'humidity':
+        return round(humidity_sensor.convert_humidity(result), 2)
+    elif channel == 'hvamp_voltage':
+        return hvamp.convert_voltage_monitor(result) if result is not False else -100000
+    elif channel == 'hvamp_current':
+        return hvamp.convert_current_monitor(result) if result is not False else -100000
+
+    raise ValueError
+
+
+def convert_all_values(analog_values, electrometer_values, humidity_sensor):
+    """ This method converts the raw values of measure_all_values() to the four key measurements (rounded to two
+    digits).
+
+    :param analog_values: [hv probe signal in V, humidity sensor signal in V]
+    :param electrometer_values: [current in A, temperature in °C, ...]
+    :param humidity_sensor: instance of the clas HumiditySensor
+    :return: [voltage in V, current in pA, temperature in °C, relative humidity in %]
+    """
+
     # get all sensor values using the methods in this module and round to two digits
-    hv_amp_voltage = round(measure_voltage(labjack), 2)
-    electrometer_current = round(measure_current(electrometer), 2)
-    electrometer_temperature = round(measure_temperature(electrometer), 2)
-    humidity = round(measure_humidity(humidity_sensor), 2)
+    hv_amp_voltage = round(convert_voltage(analog_values[0]), 2)
+    electrometer_current = round(convert_current(electrometer_values[0]), 2)
+    electrometer_temperature = round(float(electrometer_values[1]), 2)
+    humidity = round(humidity_sensor.convert_humidity(analog_values[1]), 2)
 
     # prepare for return
     values = [hv_amp_voltage, electrometer_current, electrometer_temperature, humidity]
@@ -43,7 +204,18 @@ def measure_voltage(labjack):
     """
 
     # get analog value
-    analog_read = labjack.read_analog("AIN0")
+    analog_read = labjack.read_analog(Parameters.LJ_ANALOG_IN_HV_PROBE)
+
+    return convert_voltage(analog_read)
+
+
+def convert_voltage(analog_read):
+    """ This method converts the analog hv probe signal to the voltage in V including voltage correction
+    according to the method described in the master thesis (or separate documentation)
+
+    :param analog_read: analog hv probe signal in V
+    :return: voltage in V
+    """
 
     # map (0-5V to 0-5000V)
     voltage = 1000 * analog_read
@@ -87,8 +259,17 @@ def measure_current(electrometer):
     :return: current in pA
     """
 
-    # get current and convert to pA
-    result = electrometer.get_current()
+    return convert_current(electrometer.get_current())
+
+
+def convert_current(result):
+    """ This method converts the current in A returned by the electrometer to pA and checks for overflow.
+
+    :param result: current in A (string or float)
+    :return: current in pA
+    """
+
+    # convert to pA
     result_in_picoampere = round(float(result)*1000*1000*1000*1000, 5)
 
     # check for overflow (current larger than measure range max limit, in this case 1E50 pA is 'measured')
@@ -25,10 +25,10 @@ def start_safety_circuit(root, labjack, relays, electrometer, hvamp):
     assert relays.switch_off_all_relays()
 
     # start the safety circuit with auto update
-    auto_update_safety_circuit(root, labjack, relays, electrometer, hvamp, labjack.connection_state)
+    auto_update_safety_circuit(root, labjack, relays, electrometer, hvamp, labjack.connection_count)
 
 
-def auto_update_safety_circuit(root, labjack, relays, electrometer, hvamp, labjack_state_before):
+def auto_update_safety_circuit(root, labjack, relays, electrometer, hvamp, connection_count_before):
     """ This method assures the correct operation of the safety circuit.
     It is called and repeated every 200 ms after the first startup.
 
@@ -37,23 +37,30 @@ def auto_update_safety_circuit(root, labjack, relays, electrometer, hvamp, labja
     :param relays: instance of the class relays
     :param electrometer: instance of the class Electrometer
     :param hvamp; instance of the class HVAmp
-    :param labjack_state_before: flag for detecting if the labjack is reconnected after connection loss
+    :param connection_count_before: labjack connection count of the last call, for detecting if the labjack is
+                                    reconnected after connection loss (by the supervisor thread or the gui)
     :return:
     """
 
-    # get labjack state
-    labjack_state_now = labjack.connection_state
+    # get labjack connection count
+    connection_count_now = labjack.connection_count
 
-    # detect labjack reconnection
-    if not labjack_state_before and labjack_state_now:
+    # detect labjack reconnection (the safety circuit is the only one switching off the relays after a reconnect)
+    if connection_count_now != connection_count_before:
         if Parameters.DEBUG:
             print("safety circuit: labjack reconnection detected")
         # switch off all relays to ensure safety and correct label states
         relays.switch_off_all_relays()
 
-    # read states of safety elements
-    state_s1 = labjack.read_digital(Parameters.LJ_DIGITAL_IN_PILZ_S1)
-    state_s2 = labjack.read_digital(Parameters.LJ_DIGITAL_IN_PILZ_S2)
+    # read states of safety elements (one new digital snapshot per tick, shared with gui and relays)
+    snapshot = labjack.read_digital_snapshot()
+    if snapshot:
+        state_s1 = snapshot.state(Parameters.LJ_DIGITAL_IN_PILZ_S1)
+        state_s2 = snapshot.state(Parameters.LJ_DIGITAL_IN_PILZ_S2)
+    else:
+        # labjack read failed (same states as returned by a failing read_digital)
+        state_s1 = False
+        state_s2 = False
     state_safety_relay = relays.safety_state
     state_hv_relay = relays.hv_relay_state
     state_gnd_relay = relays.gnd_relay_state
@@ -101,7 +108,8 @@ def auto_update_safety_circuit(root, labjack, relays, electrometer, hvamp, labja
             # switch lamp to green ('OFF') if red right now
             relays.switch_relay("LAMP", "OFF", labjack)
 
-            # reset hvamp voltage to zero
+            # stop running hvamp waveforms and reset hvamp voltage to zero
+            hvamp.stop_waveforms()
             hvamp.set_voltage(0)
 
             # reset electrometer voltage to zero and switch off voltage source
@@ -112,4 +120,4 @@ def auto_update_safety_circuit(root, labjack, relays, electrometer, hvamp, labja
             electrometer.disable_current_input()
 
     # Check safety circuit periodically (given in ms)
-    root.after(200, lambda: auto_update_safety_circuit(root, labjack, relays, electrometer, hvamp, labjack_state_now))
+    root.after(200, lambda: auto_update_safety_circuit(root, labjack, relays, electrometer, hvamp, connection_count_now))